@@ -0,0 +1,110 @@
+from NoteArray import NoteArray
+
+
+class Arrangement:
+
+    def __init__(self, track=None):
+        """ A track made of sections played one after another, like the verses and choruses of a song. The
+        arrangement only refers to its sections and the time each one starts at, so appending a section takes O(1)
+        time and copies nothing. The notes, controls and chords are copied once, by render. Sections are read when
+        the arrangement is rendered, so changes made to them after they were appended (except to their length)
+        show up in the rendered track.
+
+        Args:
+            track (Track, optional): The start of the arrangement. Its name, device, channel and storage (list or
+                NoteArray) are used for the rendered track. Defaults to an empty track.
+        """
+        if track is None:
+            # Imported here because the Track module imports this one
+            import Track
+            track = Track.Track()
+        self.track = track
+        # (section, time the section starts at) for every appended section, in order
+        self.placements = []
+        # The time the next section will start at: the time the last note ends, or the last control happens
+        self.end_time = track.get_end_time()
+
+    def __len__(self):
+        return len(self.placements)
+
+    def append(self, section):
+        """ Adds a section to the end of the arrangement. It starts when the last note of the arrangement ends (or
+        at its last control, if that is later).
+
+        Args:
+            section (Track): The section to add
+
+        Raises:
+            AttributeError: If section is None
+        """
+        if section is None:
+            raise AttributeError("Track must not be None")
+        self.placements.append((section, self.end_time))
+        self.end_time += max(section.get_end_time(), 0)
+
+    def extend(self, pattern, sections):
+        """ Adds sections to the end of the arrangement in the order given by a pattern
+
+        Args:
+            pattern (int[]): Indexes of the sections to add, in order (Ex. [0, 0, 1, 0])
+            sections (Track[]): The sections the pattern refers to
+        """
+        for index in pattern:
+            self.append(sections[index])
+
+    def render(self):
+        """ Builds the arranged track. Every note, control and chord is copied exactly once.
+
+        The notes are in the order Track.append_tracks has always produced: the notes that aren't in chords, then
+        the notes of the chords, for every section but the last, followed by the same two groups for the last
+        section.
+
+        Returns:
+            Track: A new track with the contents of every section, moved to the times they start at
+        """
+        import Track
+
+        parts = [(self.track, 0)] + self.placements
+        note_groups = []
+        chord_note_groups = []
+        controls = []
+        chords = []
+        for section, start in parts:
+            note_groups.append([_move_note(note, start) for note in section.notes if not note.chord_note])
+
+            for control in section.controls:
+                control = control.duplicate_control()
+                control.time += start
+                controls.append(control)
+
+            chord_notes = []
+            for chord in section.chords:
+                chord = chord.duplicate_chord()
+                chord.time += start
+                for note in chord.notes:
+                    note.time += start
+                chord_notes.extend(chord.notes)
+                chords.append(chord)
+            chord_note_groups.append(chord_notes)
+
+        notes = []
+        for group in note_groups[:-1]:
+            notes.extend(group)
+        for group in chord_note_groups[:-1]:
+            notes.extend(group)
+        notes.extend(note_groups[-1])
+        notes.extend(chord_note_groups[-1])
+
+        return Track.Track(notes=notes, controls=controls, track_name=self.track.track_name,
+                           device_name=self.track.device_name, chords=chords, channel=self.track.channel,
+                           columnar=isinstance(self.track.notes, NoteArray))
+
+
+def _move_note(note, start):
+    """
+    Returns:
+        Note: A copy of the note, moved later by start ticks
+    """
+    note = note.duplicate_note()
+    note.time += start
+    return note
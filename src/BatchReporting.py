@@ -1,15 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from os import walk, path, makedirs
 from Song import Song
 import csv
 
+# Columns of the key detection report. The last three identify the file a row came from, so a later run can tell
+# which files are already in the report, and record why a file could not be analyzed
+REPORT_HEADER = ["Genre", "Artist", "Song", "Detected Tonic", "Detected Mode", "Errors", "% Confidence",
+                 "Detected Tonic by Endings", "Detected Mode by Endings", "% Confidence", "File", "Modified", "Error"]
+FILE_COLUMN = REPORT_HEADER.index("File")
+MODIFIED_COLUMN = REPORT_HEADER.index("Modified")
+DEFAULT_REPORT_PATH = path.join("reports", "key_detection_report.csv")
 
-def generate_batch_key_detection_report(top_directory_path=None):
+
+def generate_batch_key_detection_report(top_directory_path=None, report_path=DEFAULT_REPORT_PATH, processes=None,
+                                        resume=True):
     '''
     This method will generate a CSV report showing the genre, artist, song and detected key
     of each song, as well as number of notes that did not fit the scale of the detected key/scale.
+    Songs are analyzed in parallel by a pool of worker processes, and each row is written to the
+    report as soon as its song is done. A file that can't be read gets a row with the error
+    instead of stopping the report.
 
     :param top_directory_path: This is the path containing your tree of midi files.
             it should have a sub structure that looks like: genre/artist/song
+    :param report_path: Path of the CSV report. Defaults to reports/key_detection_report.csv
+            in the directory this method was called from.
+    :param processes: Number of worker processes. Defaults to the number of CPUs. With 1, every
+            song is analyzed in this process.
+    :param resume: If True, files that are already in the report and haven't been modified since
+            (including files that failed) are not analyzed again, and their rows are kept.
+            Rows of files that were modified or deleted are replaced or dropped.
     :return: No return, but there should be a reports folder in teh directory
             this method was called from which contains the new CSV report
     '''
@@ -18,29 +38,129 @@ def generate_batch_key_detection_report(top_directory_path=None):
         raise SyntaxError("You need to provide the top level directory path.")
 
     # Generate reports directory if it doesn't already exist
-    if not path.exists(path.relpath("reports")):
-        makedirs("reports")
+    report_directory = path.dirname(report_path)
+    if report_directory and not path.exists(report_directory):
+        makedirs(report_directory)
+
+    # Find every midi file in the tree, by its path relative to the top directory
+    file_paths = []
+    for (dirpath, dirnames, filenames) in walk(top_directory_path):
+        dirnames.sort()
+        for file in sorted(filenames):
+            if path.splitext(file)[1] == ".mid":
+                file_paths.append(path.relpath(path.join(dirpath, file), top_directory_path))
+
+    # Keep the rows of files that haven't changed since the last report
+    kept_rows = _read_unchanged_rows(top_directory_path, report_path, set(file_paths)) if resume else []
+    done = {row[FILE_COLUMN] for row in kept_rows}
+    file_paths = [file_path for file_path in file_paths if file_path not in done]
 
     # open the key detection report so that we are able to add rows to it
-    with open(path.relpath("reports/key_detection_report.csv"), "w+", newline="") as outputFile:
+    with open(report_path, "w", newline="") as outputFile:
         writer = csv.writer(outputFile)
-        writer.writerow(["Genre", "Artist", "Song", "Detected Tonic", "Detected Mode", "Errors", "% Confidence",
-                         "Detected Tonic by Endings", "Detected Mode by Endings", "% Confidence"])
-
-        # Iterate through the file structure converting to songs and adding to csv file
-        for (dirpath, dirnames, filenames) in walk(top_directory_path):
-            if filenames.__len__() != 0:
-                for file in filenames:
-                    (fileName, fileExtension) = path.splitext(file)
-                    if fileExtension == ".mid" and file is not None:
-                        file_path = dirpath + "//" + file
-                        song = Song()
-                        song.load(file_path)
-                        detected_tuple = song.detect_key_and_scale()
-                        detect_by_phrase_endings = song.detect_key_by_phrase_endings()
-                        detected_key_by_endings = detect_by_phrase_endings[0]
-                        confidence = detect_by_phrase_endings[2]
-                        (pwd, genre, artist) = dirpath.split("\\")
-                        writer.writerow([genre, artist, fileName, detected_tuple[0].tonic, detected_tuple[0].mode,
-                                         detected_tuple[1], str(detected_tuple[2] * 100) + "%",
-                                         detected_key_by_endings.tonic, detected_key_by_endings.mode, confidence])
+        writer.writerow(REPORT_HEADER)
+        writer.writerows(kept_rows)
+        outputFile.flush()
+
+        if processes == 1:
+            for file_path in file_paths:
+                writer.writerow(_analyze_file(top_directory_path, file_path))
+                outputFile.flush()
+            return
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {executor.submit(_analyze_file, top_directory_path, file_path):
+                       (file_path, _get_modified_time(top_directory_path, file_path)) for file_path in file_paths}
+            for future in as_completed(futures):
+                try:
+                    row = future.result()
+                except Exception as e:
+                    # The worker process itself failed (for example it ran out of memory)
+                    row = _error_row(*futures[future], e)
+                writer.writerow(row)
+                outputFile.flush()
+
+
+def _read_unchanged_rows(top_directory_path, report_path, file_paths):
+    '''
+    Reads the rows of an existing report whose files still exist and have the same modification time.
+
+    :param top_directory_path: The path containing the tree of midi files
+    :param report_path: Path of the CSV report
+    :param file_paths: The paths (relative to top_directory_path) of every midi file in the tree
+    :return: A list of the rows to keep. Empty if there is no report, or it was written in another format.
+    '''
+    if not path.exists(report_path):
+        return []
+    with open(report_path, newline="") as inputFile:
+        reader = csv.reader(inputFile)
+        if next(reader, None) != REPORT_HEADER:
+            return []
+        rows = []
+        for row in reader:
+            if len(row) != len(REPORT_HEADER) or row[FILE_COLUMN] not in file_paths:
+                continue
+            try:
+                modified = float(row[MODIFIED_COLUMN])
+            except ValueError:
+                continue
+            if modified == path.getmtime(path.join(top_directory_path, row[FILE_COLUMN])):
+                rows.append(row)
+        return rows
+
+
+def _analyze_file(top_directory_path, file_path):
+    '''
+    Loads one song and detects its key. This runs in the worker processes of generate_batch_key_detection_report.
+
+    :param top_directory_path: The path containing the tree of midi files
+    :param file_path: Path of the midi file, relative to top_directory_path
+    :return: The row of the report for this song. If the song couldn't be analyzed, the row holds the error.
+    '''
+    # Taken before the file is read, so a file that changes during the analysis is analyzed again next time
+    modified = _get_modified_time(top_directory_path, file_path)
+    try:
+        song = Song()
+        song.load(path.join(top_directory_path, file_path), analyze=False)
+        detected_key, minimum_errors, confidence = song.detect_key_and_scale()
+        detected_key_by_endings, message, confidence_by_endings = song.detect_key_by_phrase_endings()
+    except Exception as e:
+        return _error_row(file_path, modified, e)
+    description = _describe_file(file_path, modified)
+    return description[:3] + [detected_key.tonic, detected_key.mode, minimum_errors, str(confidence * 100) + "%",
+                              detected_key_by_endings.tonic, detected_key_by_endings.mode,
+                              confidence_by_endings] + description[3:] + [""]
+
+
+def _error_row(file_path, modified, error):
+    '''
+    :return: The row of the report for a song that couldn't be analyzed
+    '''
+    description = _describe_file(file_path, modified)
+    return description[:3] + [""] * 7 + description[3:] + [type(error).__name__ + ": " + str(error)]
+
+
+def _describe_file(file_path, modified):
+    '''
+    :param file_path: Path of the midi file, relative to the top directory
+    :param modified: Modification time of the file when it was read (see _get_modified_time)
+    :return: The genre, artist and name of the song (from its genre/artist/song path), followed by the file
+            path and modification time used to find it again
+    '''
+    directories = path.dirname(file_path).split(path.sep)
+    genre = directories[0]
+    artist = "/".join(directories[1:])
+    (fileName, fileExtension) = path.splitext(path.basename(file_path))
+    return [genre, artist, fileName, file_path, modified]
+
+
+def _get_modified_time(top_directory_path, file_path):
+    '''
+    :param top_directory_path: The path containing the tree of midi files
+    :param file_path: Path of the midi file, relative to top_directory_path
+    :return: The modification time of the file, as it is written in the report ("" if it can't be read)
+    '''
+    try:
+        return repr(path.getmtime(path.join(top_directory_path, file_path)))
+    except OSError:
+        return ""
@@ -6,11 +6,80 @@ from Track import Track
 from Key import Key, KEYS
 from Scale import SCALE_TYPES
 from Note import Note, NUM_NOTES
-import FileIO as FileIO
+from NoteArray import NoteView
+from TrackList import TrackList
+import numpy as np
+
+# Chord qualities that chords are named after, with the intervals of their notes above the root. Earlier qualities are
+# preferred when a chord could be named more than one way.
+CHORD_QUALITIES = [
+    ("Major", (0, 4, 7)),
+    ("Minor", (0, 3, 7)),
+    ("Diminished", (0, 3, 6)),
+    ("Augmented", (0, 4, 8)),
+    ("Major Seventh", (0, 4, 7, 11)),
+    ("Minor Seventh", (0, 3, 7, 10)),
+    ("Dominant Seventh", (0, 4, 7, 10)),
+    ("Half-Diminished Seventh", (0, 3, 6, 10)),
+    ("Diminished Seventh", (0, 3, 6, 9)),
+    ("Minor Major Seventh", (0, 3, 7, 11)),
+]
+# Number of possible sets of pitch classes (12-bit masks)
+NUM_MASKS = 1 << NUM_NOTES
+
+
+def _build_chord_names():
+    """ Builds the chord naming table. Every quality on every root gets a name id, followed by one id for each mask
+    that no quality fits, which is named after its pitch classes.
+
+    A mask is named after the largest quality whose notes it contains, so inversions get the name of their root
+    position and extra notes (like an added ninth) don't hide the chord. When more than one root fits (augmented and
+    diminished seventh chords, or masks holding two triads), the root closest to the key on the circle of fifths wins.
+
+    Returns:
+        The names [0], the root pitch class of each name id (-1 for the unnamed masks) [1], and the NUM_MASKS x 12
+        table of name ids by (mask, c based index of the key) [2]
+    """
+    names = []
+    roots = []
+    masks = np.arange(NUM_MASKS)
+    keys = np.arange(NUM_NOTES)
+    best_scores = np.full((NUM_MASKS, NUM_NOTES), -1)
+    table = np.zeros((NUM_MASKS, NUM_NOTES), dtype=np.uint16)
+    for quality_index, (quality, intervals) in enumerate(CHORD_QUALITIES):
+        for root in range(NUM_NOTES):
+            name_id = len(names)
+            names.append(KEYS[root] + " " + quality)
+            roots.append(root)
+            quality_mask = sum(1 << ((root + interval) % NUM_NOTES) for interval in intervals)
+            fifths = (root - keys) * 7 % NUM_NOTES
+            # Ordered by number of notes, then distance from the key on the circle of fifths, then quality, then
+            # distance above the key
+            scores = len(intervals) * 10000 + (6 - np.minimum(fifths, NUM_NOTES - fifths)) * 1000 + \
+                (len(CHORD_QUALITIES) - quality_index) * 100 + (NUM_NOTES - 1 - (root - keys) % NUM_NOTES)
+            contained = ((masks & quality_mask) == quality_mask)[:, np.newaxis]
+            better = contained & (scores > best_scores)
+            best_scores = np.where(better, scores, best_scores)
+            table[better] = name_id
+    unnamed = best_scores[:, 0] < 0
+    for mask in range(NUM_MASKS):
+        if unnamed[mask]:
+            table[mask] = len(names)
+        names.append(" ".join(KEYS[pitch_class] for pitch_class in range(NUM_NOTES) if mask >> pitch_class & 1))
+        roots.append(-1)
+    return names, roots, table
+
+
+# CHORD_NAMES[CHORD_NAME_TABLE[mask, key]] is the name of the chord with the given pitch class mask in the given key
+CHORD_NAMES, CHORD_ROOTS, CHORD_NAME_TABLE = _build_chord_names()
 
 
 class Chord:
 
+    # Fields are stored in slots, like those of Note and Control. '_mask' and '_bass' cache the pitch classes of the
+    # notes, and '_pitches_version' is the version of the notes they were taken from (see _get_pitch_classes)
+    __slots__ = ('_notes', 'name', 'time', '_mask', '_bass', '_pitches_version')
+
     # Constructor, takes all fields as inputs
     def __init__(self, notes=None, name=None, time=0):
         """ Constructor - Takes all fields as inputs
@@ -21,11 +90,96 @@ class Chord:
         """
         if notes is None:
             notes = []
-        self.notes = notes
         notes.sort(key=lambda x: x.pitch)
+        self.notes = notes
         self.name = name
         self.time = time
 
+    def __reduce__(self):
+        # The cached pitch classes are taken again after loading
+        return Chord, (list(self._notes), self.name, self.time)
+
+    @property
+    def notes(self):
+        """
+        Returns:
+            Note[]: The notes in the chord
+        """
+        return self._notes
+
+    @notes.setter
+    def notes(self, notes):
+        self._notes = notes if isinstance(notes, TrackList) else TrackList(notes)
+        self._pitches_version = None
+
+    @property
+    def mask(self):
+        """
+        Returns:
+            int: The pitch classes of the notes in the chord as a 12-bit mask, with bit 0 for C and bit 11 for B
+        """
+        return self._get_pitch_classes()[0]
+
+    @property
+    def root(self):
+        """
+        Returns:
+            int: The c indexed pitch class of the root of the chord, or -1 if it isn't a chord in CHORD_QUALITIES.
+            Chords that could have more than one root (like augmented chords) take the one closest to their lowest
+            note on the circle of fifths, which is the lowest note itself when it is one of them (see get_name_id).
+        """
+        return CHORD_ROOTS[self.get_name_id()]
+
+    def _get_pitch_classes(self):
+        """ Returns the pitch classes of the notes, taking them again only if the notes changed since they were
+        last taken. Notes and the list of notes tell the chord about changes through its TrackList, and views of
+        notes in a NoteArray through the version of the array.
+
+        Returns:
+            The mask of the pitch classes of the notes [0] (int, see mask), and the pitch class of the lowest note
+            [1] (int, 0 if there are no notes)
+        """
+        version = self._pitches_version
+        if version is None or version[0] != self._notes.version or \
+                (version[1] and any(array.version != array_version for array, array_version in version[1])):
+            mask = 0
+            lowest = None
+            arrays = {}
+            for note in self._notes:
+                pitch = note.pitch
+                mask |= 1 << (pitch % NUM_NOTES)
+                if lowest is None or pitch < lowest:
+                    lowest = pitch
+                if type(note) is NoteView:
+                    arrays[id(note.notes)] = note.notes
+            self._mask = mask
+            self._bass = 0 if lowest is None else lowest % NUM_NOTES
+            self._pitches_version = (self._notes.version,
+                                     tuple((array, array.version) for array in arrays.values()))
+        return self._mask, self._bass
+
+    def get_name_id(self, key=None):
+        """ Finds the chord in CHORD_NAME_TABLE
+        Args:
+            key (int): The c based index of the key of the song, which decides the root of chords that could have
+                more than one. Defaults to the pitch class of the lowest note.
+        Returns:
+            int: The index of the name of the chord in CHORD_NAMES
+        """
+        mask, lowest = self._get_pitch_classes()
+        if key is None:
+            key = lowest
+        return int(CHORD_NAME_TABLE[mask, key])
+
+    def get_name(self, key=None):
+        """ Names the chord from its notes, without setting the name field
+        Args:
+            key (int): The c based index of the key of the song. See get_name_id.
+        Returns:
+            string: The name of the chord, like "C Major" or "D Minor Seventh"
+        """
+        return CHORD_NAMES[self.get_name_id(key)]
+
     def to_string(self):
         """ Returns a string with the c indexed pitch classes of all of the notes contained in the chord
         Returns:
@@ -49,3 +203,27 @@ class Chord:
             notes.append(note.duplicate_note())
         return Chord(notes=notes, name=self.name, time=self.time)
 
+
+def mask_to_string(mask):
+    """
+    Args:
+        mask (int): A 12-bit mask of pitch classes, like Chord.mask
+
+    Returns:
+        A string with the c indexed pitch classes in the mask in ascending order, in the format "0 4 7"
+    """
+    return " ".join(str(pitch_class) for pitch_class in range(NUM_NOTES) if mask >> pitch_class & 1)
+
+
+def mask_from_string(string):
+    """
+    Args:
+        string (string): Space separated c indexed pitch classes, like the output of mask_to_string
+
+    Returns:
+        int: The 12-bit mask of the pitch classes
+    """
+    mask = 0
+    for pitch_class in string.split():
+        mask |= 1 << (int(pitch_class) % NUM_NOTES)
+    return mask
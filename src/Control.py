@@ -1,5 +1,11 @@
+from Note import notify_owners
+
+
 class Control:
 
+    # Like Note, '_owners' holds the TrackLists the control is in
+    __slots__ = ('msg_type', 'tempo', 'control', 'value', 'instrument', 'time', '_owners')
+
     def __init__(self, msg_type=None, tempo=None, control=None, value=None, instrument=None, time=None):
         """ Constructor for the Control message class.
 
@@ -24,12 +30,22 @@ class Control:
             time (int, optional): For all control messages. The absolute time (in ticks) from the start of the
                 song where this message occurs. Defaults to None.
         """
-        self.msg_type = msg_type
-        self.tempo = tempo
-        self.control = control
-        self.value = value
-        self.instrument = instrument
-        self.time = time
+        set_field = object.__setattr__
+        set_field(self, '_owners', None)
+        set_field(self, 'msg_type', msg_type)
+        set_field(self, 'tempo', tempo)
+        set_field(self, 'control', control)
+        set_field(self, 'value', value)
+        set_field(self, 'instrument', instrument)
+        set_field(self, 'time', time)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if self._owners is not None:
+            notify_owners(self._owners)
+
+    def __reduce__(self):
+        return Control, (self.msg_type, self.tempo, self.control, self.value, self.instrument, self.time)
 
     def duplicate_control(self):
         """
@@ -1,4 +1,8 @@
+import heapq
+import struct
 import sys
+from collections import deque
+from numbers import Integral
 
 import mido
 from mido import MidiFile
@@ -8,8 +12,87 @@ from Control import Control
 from Track import Track
 from Note import Note
 
-
-def read_midi_file(song, filename, print_file=False):
+# The number of channels a MIDI file can use
+NUM_CHANNELS = 16
+# Order in which order_messages writes events that happen at the same time
+CONTROL_PRIORITY = 0
+NOTE_OFF_PRIORITY = 1
+NOTE_ON_PRIORITY = 2
+# Status bytes of the channel messages the writer uses (the channel is added to the lower 4 bits)
+NOTE_OFF_STATUS = 0x80
+NOTE_ON_STATUS = 0x90
+CONTROL_CHANGE_STATUS = 0xB0
+PROGRAM_CHANGE_STATUS = 0xC0
+# Number of data bytes after the status byte of the system common messages that have any
+SYSTEM_DATA_LENGTHS = {0xf1: 1, 0xf2: 2, 0xf3: 1}
+# Character set mido uses for the text of meta messages
+META_CHARSET = 'latin1'
+
+
+class OpenNotes:
+
+    def __init__(self):
+        """ Notes that have had their note_on message read, but don't yet have a note_off message. Notes are
+        indexed by channel and pitch, so finding the note that a note_off message ends takes constant time no
+        matter how many notes are playing at once.
+        """
+        # Every (channel, pitch) pair maps to a queue of the notes started with that channel and pitch (oldest first)
+        self.notes_by_channel_and_pitch = {}
+        # For each channel, the notes currently playing on that channel in the order they were started
+        self.notes_by_channel = [{} for _ in range(NUM_CHANNELS)]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for channel_notes in self.notes_by_channel:
+            yield from list(channel_notes.values())
+
+    def add(self, note):
+        """ Adds a note that has just started playing
+
+        Args:
+            note (Note): The note to add
+        """
+        key = (note.channel, note.pitch)
+        queue = self.notes_by_channel_and_pitch.get(key)
+        if queue is None:
+            queue = self.notes_by_channel_and_pitch[key] = deque()
+        queue.append(note)
+        self.notes_by_channel[note.channel][id(note)] = note
+        self.size += 1
+
+    def pop(self, channel, pitch):
+        """ Removes and returns the oldest playing note with the given channel and pitch
+
+        Args:
+            channel (int): Channel of the note
+            pitch (int): Pitch of the note
+
+        Returns:
+            Note: The note that was removed, or None if no note with this channel and pitch is playing
+        """
+        queue = self.notes_by_channel_and_pitch.get((channel, pitch))
+        if not queue:
+            return None
+        note = queue.popleft()
+        del self.notes_by_channel[channel][id(note)]
+        self.size -= 1
+        return note
+
+    def get_notes_on_channel(self, channel):
+        """
+        Args:
+            channel (int): Channel to get the notes of
+
+        Returns:
+            Note[]: The notes playing on the given channel, in the order they were started
+        """
+        return list(self.notes_by_channel[channel].values())
+
+
+def read_midi_file(song, filename, print_file=False, streaming=False, columnar=False, clip=False):
     """Takes a song and file name as input, clears the song data and
     overwrites it with the data from the new file. This creates a list
     of tracks, gets the metadata for the song, and created a "song" object
@@ -19,6 +102,13 @@ def read_midi_file(song, filename, print_file=False):
         filename (String): filename of MIDI file
         print_file (bool, optional): Whether or not to print the MIDI file
             after reading it in. Defaults to False.
+        streaming (bool, optional): Whether to decode the file one event at a time
+            (see read_midi_file_streaming) instead of building a full mido MidiFile first.
+            Defaults to False.
+        columnar (bool, optional): Whether to store the notes of each track in a NoteArray
+            (see Track.to_columnar). Defaults to False.
+        clip (bool, optional): Whether to clip data bytes above 127 to 127 instead of raising an
+            error, like mido.MidiFile. Defaults to False.
 
     Raises:
         NotImplementedError: If a Type 2 MIDI file is read
@@ -26,7 +116,11 @@ def read_midi_file(song, filename, print_file=False):
     Returns:
         song: The Song object containing the song in the MIDI file
     """
-    midi = MidiFile(filename)
+    if streaming:
+        return read_midi_file_streaming(song, filename=filename, print_file=print_file, columnar=columnar,
+                                        clip=clip)
+
+    midi = MidiFile(filename, clip=clip)
 
     if print_file:
         print_midi(filename=filename, file=midi)
@@ -39,73 +133,7 @@ def read_midi_file(song, filename, print_file=False):
 
         # For each mido track in the file
         for read_track in midi.tracks:
-
-            # The name of this track
-            track_name = None
-            # The name of the device this track is played on
-            device_name = None
-            # A list of tracks to be added to the song (Will only have one element for type 1 and 2 files)
-            tracks = []
-            # Notes that have had their note_on message read, but don't yet have a note_off message
-            current_notes = []
-            # The current running time of the song (In absolute terms)
-            current_time = 0
-            # Keeps track of number of concurrent notes in a track or channel
-            num_notes_per_channel = [0] * 16
-            # Keeps track of if a chord has been detected already on a channel
-            # (prevents the same chord from being counted multiple times)
-            found_chord = [False] * 16
-            # For each message in the mido track
-            for msg in read_track:
-
-                # This is the track currently being modified
-                track = None
-
-                # Add the delay between notes to the current time
-                current_time += msg.time
-
-                # Set the current track to the track with the same channel as the current message.
-                # If this track does not yet exist, create it.
-                if hasattr(msg, 'channel'):
-                    track = set_current_track_by_channel(msg=msg, tracks=tracks)
-
-                # If this message is a note and not metadata
-                if hasattr(msg, 'note') and hasattr(msg, 'velocity'):
-                    handle_note(msg=msg, notes=current_notes, time=current_time, track=track,
-                                num_notes_per_channel=num_notes_per_channel, found_chord=found_chord)
-
-                if msg.type == 'control_change' or msg.type == 'program_change' or msg.type == 'set_tempo':
-                    if msg.type == 'set_tempo':
-                        if len(tracks) > 0:
-                            track = tracks[0]  # set_tempo applies to the whole song, regardless of what track it's on
-                        else:
-                            track = Track(channel=0)  # If there are no tracks yet, create a new one
-                            tracks.append(track)
-
-                    handle_control(msg=msg, track=track, time=current_time)
-
-                # If this message is a program change, (tells the instrument being played on this track)
-                if msg.type == 'program_change':
-                    track.instrument = msg.program
-
-                # If this message is a track name
-                if msg.type == 'track_name':
-                    track_name = msg.name
-
-                # If this message is a track device
-                if msg.type == 'device_name':
-                    device_name = msg.name
-
-                # In case there are notes left in the "current_notes" list when the song ends
-                if msg.type == 'end_of_track':
-                    conv_remaining_notes(current_notes=current_notes, current_time=current_time, tracks=tracks)
-
-            # Add this track and its associated notes to the song (sorted by time)
-            for t in tracks:
-                t.track_name = str(track_name)
-                t.device_name = str(device_name)
-                t.notes.sort(key=lambda note: note.time)
-                t.generate_tags()
+            for t in read_track_messages(read_track, columnar=columnar):
                 song.add_track(t)
         return song
 
@@ -114,40 +142,315 @@ def read_midi_file(song, filename, print_file=False):
         raise NotImplementedError("'Type 2' Midi files are not supported at this time")
 
 
-def conv_remaining_notes(current_notes, current_time, tracks):
+def read_midi_file_streaming(song, filename, print_file=False, columnar=False, clip=False):
+    """Same as read_midi_file, but never holds the whole MIDI file in memory. The file is read one
+    MTrk chunk at a time, and each message is turned into notes, controls and chords as soon as it
+    is decoded, so only the Song being built and the raw bytes of one track (and not a second copy of
+    the file as mido messages) are kept in memory.
+
+    Args:
+        song (Song): Song object to store the MIDI file's song in
+        filename (String): filename of MIDI file
+        print_file (bool, optional): Whether or not to print the MIDI file
+            after reading it in. Defaults to False.
+        columnar (bool, optional): Whether to store the notes of each track in a NoteArray
+            (see Track.to_columnar). Defaults to False.
+        clip (bool, optional): Whether to clip data bytes above 127 to 127 instead of raising an
+            error, like mido.MidiFile. Defaults to False.
+
+    Raises:
+        IOError: If the file is not a MIDI file
+        NotImplementedError: If a Type 2 MIDI file is read
+
+    Returns:
+        song: The Song object containing the song in the MIDI file
+    """
+    if print_file:
+        print_midi(filename=filename, file=MidiFile(filename, clip=clip))
+
+    with open(filename, 'rb') as infile:
+        name, size = _read_chunk_header(infile)
+        header = infile.read(size)
+        if name != b'MThd' or len(header) < 6:
+            raise IOError('MThd not found. Probably not a MIDI file')
+        midi_type, num_tracks, ticks_per_beat = struct.unpack('>hhh', header[:6])
+
+        song.clear_song_data()
+        song.ticks_per_beat = ticks_per_beat
+
+        # File has multiple asynchronous tracks
+        if midi_type == 2:
+            raise NotImplementedError("'Type 2' Midi files are not supported at this time")
+
+        for _ in range(num_tracks):
+            for t in read_track_messages(stream_track_messages(infile, clip=clip), columnar=columnar):
+                song.add_track(t)
+    return song
+
+
+def stream_track_messages(infile, clip=False):
+    """ Generator that decodes the next MTrk chunk of an open MIDI file one message at a time.
+    This follows the same rules as mido's own track reader (running status, sysex and meta
+    messages), but yields each message as soon as it is decoded instead of storing the whole track.
+    The chunk and the delta times are parsed here, and the messages are built with mido's public
+    from_bytes constructors.
+
+    Args:
+        infile (file): Binary file object positioned at the start of an MTrk chunk
+        clip (bool, optional): Whether to clip data bytes above 127 to 127 instead of raising an
+            error, like mido.MidiFile. Defaults to False.
+
+    Raises:
+        IOError: If the chunk is not an MTrk chunk, it ends in the middle of a message, the track uses
+            running status before any status byte has been read, or a message is invalid
+        EOFError: If the file ends before the chunk does
+
+    Yields:
+        mido.Message or mido.MetaMessage: The messages of the track, in file order (with delta times)
+    """
+    name, size = _read_chunk_header(infile)
+    if name != b'MTrk':
+        raise IOError('no MTrk header at start of track')
+    data = infile.read(size)
+    if len(data) < size:
+        raise EOFError('MIDI file ends in the middle of a track')
+
+    position = 0
+    last_status = None
+    try:
+        while position < size:
+            delta, position = _read_variable_int(data, position)
+            status_byte = data[position]
+            position += 1
+
+            running_status = status_byte < 0x80
+            if running_status:
+                if last_status is None:
+                    raise IOError('running status without last_status')
+                # The byte is the first data byte of a message with the last status
+                position -= 1
+                status_byte = last_status
+            elif status_byte != 0xff:
+                # Meta messages don't set running status
+                last_status = status_byte
+
+            if status_byte == 0xff:
+                start = position - 1
+                length, position = _read_variable_int(data, position + 1)
+                position += length
+                if position > size:
+                    raise IndexError(position)
+                msg = mido.MetaMessage.from_bytes(list(data[start:position]))
+                msg.time = delta
+            elif status_byte == 0xf0 or status_byte == 0xf7:
+                # Like mido, a sysex message with running status skips the byte that was read as its status
+                length, position = _read_variable_int(data, position + running_status)
+                sysex = list(data[position:position + length])
+                position += length
+                if position > size:
+                    raise IndexError(position)
+                # mido stores sysex data without the start and end bytes
+                if sysex and sysex[0] == 0xf0:
+                    sysex = sysex[1:]
+                if sysex and sysex[-1] == 0xf7:
+                    sysex = sysex[:-1]
+                if clip:
+                    sysex = [byte if byte < 127 else 127 for byte in sysex]
+                msg = mido.Message('sysex', data=sysex, time=delta)
+            else:
+                length = _get_data_length(status_byte)
+                message_bytes = list(data[position:position + length])
+                position += length
+                if position > size:
+                    raise IndexError(position)
+                if clip:
+                    message_bytes = [byte if byte < 127 else 127 for byte in message_bytes]
+                elif any(byte > 127 for byte in message_bytes):
+                    raise IOError('data byte must be in range 0..127')
+                try:
+                    msg = mido.Message.from_bytes([status_byte] + message_bytes, time=delta)
+                except ValueError as e:
+                    raise IOError('invalid message: ' + str(e)) from e
+            yield msg
+    except IndexError:
+        raise IOError('MIDI track ends in the middle of a message') from None
+
+
+def _read_chunk_header(infile):
+    """
+    Args:
+        infile (file): Binary file object positioned at the start of a chunk
+
+    Raises:
+        EOFError: If the file ends before the header does
+
+    Returns:
+        The name of the chunk [0] (bytes) and the size of its data [1] (int)
+    """
+    header = infile.read(8)
+    if len(header) < 8:
+        raise EOFError('MIDI file ends in the middle of a chunk header')
+    return struct.unpack('>4sL', header)
+
+
+def _read_variable_int(data, position):
+    """ Reads a variable length quantity (7 bits per byte, the high bit set on every byte but the last)
+
+    Args:
+        data (bytes): The data to read from
+        position (int): Where the number starts
+
+    Raises:
+        IndexError: If the data ends before the number does
+
+    Returns:
+        The number [0] (int) and the position after it [1] (int)
+    """
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, position
+
+
+def _get_data_length(status_byte):
+    """
+    Args:
+        status_byte (int): The status byte of a channel or system message (not sysex or meta)
+
+    Returns:
+        int: The number of data bytes that follow the status byte
+    """
+    if status_byte < 0xf0:
+        # Program change and channel pressure have one data byte, the other channel messages two
+        return 1 if 0xc0 <= status_byte < 0xe0 else 2
+    return SYSTEM_DATA_LENGTHS.get(status_byte, 0)
+
+
+def read_track_messages(messages, columnar=False):
+    """ Converts the messages of one MIDI track into Track objects. Notes, controls and chords are
+    created as each message is read, so messages can come from any iterable (a mido MidiTrack, or
+    the stream_track_messages generator).
+
+    Args:
+        messages (iterable): The mido messages of one MIDI track, in file order (with delta times)
+        columnar (bool, optional): Whether to store the notes of each track in a NoteArray
+            (see Track.to_columnar). Defaults to False.
+
+    Returns:
+        Track[]: The tracks (one per channel) found in this MIDI track, with their notes sorted by time
+    """
+    # The name of this track
+    track_name = None
+    # The name of the device this track is played on
+    device_name = None
+    # A list of tracks to be added to the song (Will only have one element for type 1 and 2 files)
+    tracks = []
+    # The track assigned to each channel (None until a message on that channel is read)
+    channel_tracks = [None] * NUM_CHANNELS
+    # Notes that have had their note_on message read, but don't yet have a note_off message
+    current_notes = OpenNotes()
+    # The current running time of the song (In absolute terms)
+    current_time = 0
+    # Keeps track of number of concurrent notes in a track or channel
+    num_notes_per_channel = [0] * NUM_CHANNELS
+    # Keeps track of if a chord has been detected already on a channel
+    # (prevents the same chord from being counted multiple times)
+    found_chord = [False] * NUM_CHANNELS
+    # For each message in the mido track
+    for msg in messages:
+
+        # This is the track currently being modified
+        track = None
+
+        # Add the delay between notes to the current time
+        current_time += msg.time
+
+        # Set the current track to the track with the same channel as the current message.
+        # If this track does not yet exist, create it.
+        if hasattr(msg, 'channel'):
+            track = set_current_track_by_channel(msg=msg, tracks=tracks, channel_tracks=channel_tracks)
+
+        # If this message is a note and not metadata
+        if hasattr(msg, 'note') and hasattr(msg, 'velocity'):
+            handle_note(msg=msg, notes=current_notes, time=current_time, track=track,
+                        num_notes_per_channel=num_notes_per_channel, found_chord=found_chord)
+
+        if msg.type == 'control_change' or msg.type == 'program_change' or msg.type == 'set_tempo':
+            if msg.type == 'set_tempo':
+                if len(tracks) > 0:
+                    track = tracks[0]  # set_tempo applies to the whole song, regardless of what track it's on
+                else:
+                    track = Track(channel=0)  # If there are no tracks yet, create a new one
+                    tracks.append(track)
+                    channel_tracks[0] = track
+
+            handle_control(msg=msg, track=track, time=current_time)
+
+        # If this message is a program change, (tells the instrument being played on this track)
+        if msg.type == 'program_change':
+            track.instrument = msg.program
+
+        # If this message is a track name
+        if msg.type == 'track_name':
+            track_name = msg.name
+
+        # If this message is a track device
+        if msg.type == 'device_name':
+            device_name = msg.name
+
+        # In case there are notes left in the "current_notes" list when the song ends
+        if msg.type == 'end_of_track':
+            conv_remaining_notes(current_notes=current_notes, current_time=current_time, tracks=tracks,
+                                 channel_tracks=channel_tracks)
+
+    # Name this track and sort its associated notes by time
+    for t in tracks:
+        t.track_name = str(track_name)
+        t.device_name = str(device_name)
+        t.notes.sort(key=lambda note: note.time)
+        if columnar:
+            t.to_columnar()
+        t.use_detected_tag()
+    return tracks
+
+
+def conv_remaining_notes(current_notes, current_time, tracks, channel_tracks):
     """ In the case that a midi song has note_on messages that do not have a closing note_off message, this method
     will end those notes when the end_of_track message is read in for that particular track. This should not occur,
     but adding this method increases the program's robustness and allows us to fix malformed midi files
 
     Args:
-        current_notes (Note[]): An array of notes for which a note_on message was received, but no note_off message was
+        current_notes (OpenNotes): The notes for which a note_on message was received, but no note_off message was
         current_time (int): Current absolute time in the song
         tracks (Track[]): An array of track objects (generated from the current midi track being read in)
+        channel_tracks (Track[]): The track assigned to each channel (None if there isn't one yet)
     """
-    for n in current_notes:
+    for n in list(current_notes):
         n.duration = current_time - n.time
         if n.duration == 0:
             n.duration = 1  # A note can't have zero duration (This breaks the file output)
-        current_notes.remove(n)
-        track = set_current_track_by_channel(msg=n, tracks=tracks)
+        current_notes.pop(channel=n.channel, pitch=n.pitch)
+        track = set_current_track_by_channel(msg=n, tracks=tracks, channel_tracks=channel_tracks)
         track.add_note(n)
 
 
-def set_current_track_by_channel(msg, tracks):
+def set_current_track_by_channel(msg, tracks, channel_tracks):
     """ Returns the track that is assigned to the same channel as the given message/note. If this track does not
     exist, create a new track and set it to this channel.
 
     Args:
         msg (Message or Note): A Mido Message object, or a Note object for which the associated track needs to be found
-        tracks (Track[]): An array of possible tracks that could match the channel of the message or note
+        tracks (Track[]): An array of the tracks created so far. New tracks are appended to it
+        channel_tracks (Track[]): The track assigned to each channel (None if there isn't one yet)
     """
-    track = None
-    for t in tracks:
-        if t.channel == msg.channel:
-            track = t
+    track = channel_tracks[msg.channel]
     if track is None:
         track = Track(channel=msg.channel)
         tracks.append(track)
+        channel_tracks[msg.channel] = track
     return track
 
 
@@ -162,38 +465,139 @@ def write_midi_file(song, filename, print_file=False):
         print_file (bool, optional): Whether or not to print the midi
             file. Defaults to False.
     """
-    # Generate new type 1 midi file with the original song's metadata
-    midi = MidiFile(type=1)
-    midi.ticks_per_beat = song.ticks_per_beat
-
-    # For each track in the song
-    for i, t in enumerate(song.tracks):
-        # Get an ordered list of messages
-        msgs = order_messages(t)
-        # Create a new midi track and add these messages to the track
-        midi.add_track(name=None)
-
-        # Set the name, device, and instrument for the new track
-        name_msg = mido.MetaMessage(type='track_name', name=str(t.track_name), time=0)
-        midi.tracks[i].append(name_msg)
-        device_msg = mido.MetaMessage(type='device_name', name=str(t.device_name), time=0)
-        midi.tracks[i].append(device_msg)
-
-        for m in msgs:
-            midi.tracks[i].append(m)
-
-        # TODO: This change is temporary for instrument change
-        # midi.tracks[i].append(mido.Message(type='program_change', channel=0, program=46, time=0))
-        # Add an End of Track message. Time is 500 to allow a small buffer zone from the last note
-        eot_msg = mido.MetaMessage(type='end_of_track', time=500)
-        midi.tracks[i].append(eot_msg)
-
-    # midi.tracks[0].append(mido.Message(type='program_change', channel=0, program=46, time=0))
+    data = encode_midi_file(song)
     # Save this midi file
-    midi.save(filename)
+    with open(filename, 'wb') as outfile:
+        outfile.write(data)
 
     if print_file:
-        print_midi(filename, midi)
+        print_midi(filename, MidiFile(filename))
+
+
+def encode_midi_file(song):
+    """ Encodes a song as a type 1 midi file, writing the bytes directly from the notes and controls of each track.
+    The result is the same file mido would write for the messages from order_messages, with the track's name and
+    device messages first and an end of track message last.
+
+    Args:
+        song (Song): Song object containing the song to be encoded
+
+    Raises:
+        ValueError: If a note or control has a value that can't be stored in a midi file
+
+    Returns:
+        bytearray: The contents of the midi file
+    """
+    data = bytearray(b'MThd')
+    data += struct.pack('>Lhhh', 6, 1, len(song.tracks), song.ticks_per_beat)
+    for track in song.tracks:
+        track_data = encode_track(track)
+        data += b'MTrk'
+        data += struct.pack('>L', len(track_data))
+        data += track_data
+    return data
+
+
+def encode_track(track):
+    """ Encodes the events of a track as the data of a midi track chunk. Consecutive messages with the
+    same status byte are written using running status, like mido does.
+
+    Args:
+        track (Track): Track to encode
+
+    Raises:
+        ValueError: If a note or control has a value that can't be stored in a midi file
+
+    Returns:
+        bytearray: The data of the track chunk
+    """
+    channel = track.channel
+    if not 0 <= channel < NUM_CHANNELS:
+        raise ValueError('channel must be in range 0..' + str(NUM_CHANNELS - 1))
+
+    # Set the name and device for the new track
+    data = bytearray(b'\x00')
+    _append_meta_message(data, 0x03, str(track.track_name).encode(META_CHARSET))
+    data.append(0)
+    _append_meta_message(data, 0x09, str(track.device_name).encode(META_CHARSET))
+
+    running_status = None
+    time = 0
+    for msg_time, priority, i, event in ordered_events(track):
+        _append_variable_int(data, msg_time - time)
+        time = msg_time
+        if priority == CONTROL_PRIORITY:
+            if event.msg_type == 'set_tempo':
+                tempo = event.tempo
+                if not 0 <= tempo <= 0xFFFFFF:
+                    raise ValueError('tempo must be in range 0..16777215')
+                _append_meta_message(data, 0x51, bytes((tempo >> 16, tempo >> 8 & 0xFF, tempo & 0xFF)))
+                running_status = None
+                continue
+            elif event.msg_type == 'control_change':
+                status = CONTROL_CHANGE_STATUS | channel
+                values = (event.control, event.value)
+            else:  # implies this message is a program change
+                status = PROGRAM_CHANGE_STATUS | channel
+                values = (event.instrument,)
+        else:
+            status = (NOTE_OFF_STATUS if priority == NOTE_OFF_PRIORITY else NOTE_ON_STATUS) | channel
+            values = (event.pitch, event.velocity)
+
+        for value in values:
+            if value & ~0x7F:
+                raise ValueError('data byte must be in range 0..127')
+        if status != running_status:
+            data.append(status)
+            running_status = status
+        data.extend(values)
+
+    # Add an End of Track message. Time is 500 to allow a small buffer zone from the last note
+    _append_variable_int(data, 500)
+    _append_meta_message(data, 0x2F, b'')
+    return data
+
+
+def _append_meta_message(data, type_byte, payload):
+    """ Adds a meta message (without its delta time) to the end of the data of a track
+
+    Args:
+        data (bytearray): Data of the track
+        type_byte (int): Type of the meta message
+        payload (bytes): Contents of the meta message
+    """
+    data.append(0xFF)
+    data.append(type_byte)
+    _append_variable_int(data, len(payload))
+    data += payload
+
+
+def _append_variable_int(data, value):
+    """ Adds a variable length integer (used for delta times and lengths) to the end of the data of a track
+
+    Args:
+        data (bytearray): Data of the track
+        value (int): The integer to add
+
+    Raises:
+        ValueError: If value is not a non-negative integer
+    """
+    if type(value) is not int:
+        if not isinstance(value, Integral):
+            raise ValueError('message time must be a non-negative integer in MIDI file')
+        value = int(value)
+    if value < 0x80:
+        if value < 0:
+            raise ValueError('message time must be a non-negative integer in MIDI file')
+        data.append(value)
+        return
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    encoded.reverse()
+    data.extend(encoded)
 
 
 def order_messages(track):
@@ -208,110 +612,64 @@ def order_messages(track):
     Returns:
         String[]: Array of all messages in order
     """
-    note_on = []
-    note_off = []
-    controls = []
     msgs = []
     time = 0
-
-    track.notes.sort(key=lambda x: x.time)
-
-    # Generate three lists (control messages, note_on and note_off) that store the absolute
-    # times when each midi event occurs. These lists consist of tuples,
-    # [message, int] that stores a message and it's corresponding time (either
-    # starting or ending time in the case of notes)
-    for n in track.notes:
-        note_on.append([n, n.time])
-        note_off.append([n, n.time + n.duration])
-
-    for c in track.controls:
-        controls.append([c, c.time])
-
-    # Sort note on and off messages so they're in chronological order
-    note_on.sort(key=lambda note: note[1])
-    note_off.sort(key=lambda note: note[1])
-    controls.sort(key=lambda control: control[1])
-
-    # Compare the first element of the three lists. Write which ever one comes
-    # first to a midi message, and remove it from its list.
-    while len(note_on) > 0 or len(note_off) > 0 or len(controls) > 0:
-        # print("on " + str(len(note_on)) + " off " + str(len(note_off)) + " ctrl " + str(len(controls)))
-        if len(note_on) > 0:
-            next_note_on = note_on[0][0]
-            next_note_on_time = note_on[0][1]
-        else:
-            next_note_on = None
-            next_note_on_time = None
-
-        if len(note_off) > 0:
-            next_note_off = note_off[0][0]
-            next_note_off_time = note_off[0][1]
-        else:
-            next_note_off = None
-            next_note_off_time = None
-
-        if len(controls) > 0:
-            next_control = controls[0][0]
-            next_control_time = controls[0][1]
-        else:
-            next_control = None
-            next_control_time = None
-
-        # If the next event is a control change
-        if next_control_time is not None and \
-                (next_note_off_time is None or next_control_time <= next_note_off_time) and \
-                (next_note_on_time is None or next_control_time <= next_note_on_time):
-
-            c = next_control
-            msg_time = c.time
-            msg_type = 'control'
-
-            if c.msg_type == 'set_tempo':
-                msgs.append(mido.MetaMessage(type=c.msg_type, tempo=c.tempo,
+    for msg_time, priority, i, event in ordered_events(track):
+        if priority == CONTROL_PRIORITY:
+            if event.msg_type == 'set_tempo':
+                msgs.append(mido.MetaMessage(type=event.msg_type, tempo=event.tempo,
                                              time=msg_time - time))
-            elif c.msg_type == 'control_change':
-                msgs.append(mido.Message(type=c.msg_type, channel=track.channel, control=c.control, value=c.value,
-                                         time=msg_time - time))
+            elif event.msg_type == 'control_change':
+                msgs.append(mido.Message(type=event.msg_type, channel=track.channel, control=event.control,
+                                         value=event.value, time=msg_time - time))
             else:  # implies this message is a program change
-                msgs.append(mido.Message(type=c.msg_type, channel=track.channel, program=c.instrument,
+                msgs.append(mido.Message(type=event.msg_type, channel=track.channel, program=event.instrument,
                                          time=msg_time - time))
-
-            controls.remove(controls[0])
-
-        # If the next event is a note_on event
-        elif len(note_on) > 0 and next_note_on_time < next_note_off_time:
-            n = next_note_on
-            msg_type = 'note_on'
-            msg_time = next_note_on_time
-            note_on.remove(note_on[0])
-            msgs.append(mido.Message(type=msg_type, channel=track.channel, note=n.pitch, velocity=n.velocity,
-                                     time=msg_time - time))
-
-        # If the next event is a note_off event
         else:
-            n = next_note_off
-            msg_type = 'note_off'
-            msg_time = next_note_off_time
-            note_off.remove(note_off[0])
-            msgs.append(mido.Message(type=msg_type, channel=track.channel, note=n.pitch, velocity=n.velocity,
+            msgs.append(mido.Message(type='note_off' if priority == NOTE_OFF_PRIORITY else 'note_on',
+                                     channel=track.channel, note=event.pitch, velocity=event.velocity,
                                      time=msg_time - time))
-
         time = msg_time
 
     return msgs
 
 
+def ordered_events(track):
+    """ Returns the controls, note starts and note ends of a track in the order they are written to a midi file
+
+    Args:
+        track (Track): Track to order the events of
+
+    Returns:
+        iterator((int, int, int, Note or Control)): (time, priority, index, event) tuples in chronological order,
+        where priority is CONTROL_PRIORITY, NOTE_OFF_PRIORITY or NOTE_ON_PRIORITY
+    """
+    # Generate three streams of (time, priority, index, event) tuples, each in chronological order: control
+    # messages, note_off and note_on (using the start or end time of each note). Sorting doesn't change the order
+    # of events with the same time, and the notes are sorted into a new list so the track itself is left as it is.
+    notes = sorted(track.notes, key=lambda note: note.time)
+    controls = [(c.time, CONTROL_PRIORITY, i, c)
+                for i, c in enumerate(sorted(track.controls, key=lambda control: control.time))]
+    note_off = [(n.time + n.duration, NOTE_OFF_PRIORITY, i, n)
+                for i, n in enumerate(sorted(notes, key=lambda note: note.time + note.duration))]
+    note_on = [(n.time, NOTE_ON_PRIORITY, i, n) for i, n in enumerate(notes)]
+
+    # Merge the three streams in one pass. Events at the same time are written with control messages first,
+    # then note_off, then note_on, so a note that ends when another one starts is released first.
+    return heapq.merge(controls, note_off, note_on)
+
+
 def handle_note(msg, notes, time, track, num_notes_per_channel, found_chord):
     """ Handles the case where a note message is read in from a midi file
     If this is a note_on message, create a new Note object and store it
-    in the notes[] array (for now)
+    in notes (for now)
     If this is a note_off message, find the corresponding Note object in
-    the notes[] array, set the duration, and add this Note object to the
-    track being edited. Remove this note from notes[].
+    notes, set the duration, and add this Note object to the
+    track being edited. Remove this note from notes.
 
     Args:
         msg (mido.Message): Message being read in
-        notes (Note[]): List of notes that have been started but not ended
+        notes (OpenNotes): The notes that have been started but not ended
         time (int): Current timestamp where this note occurs
         track (Track): Track this note will be added to
         num_notes_per_channel (Int[]): An array noting how many notes are currently
@@ -324,7 +682,7 @@ def handle_note(msg, notes, time, track, num_notes_per_channel, found_chord):
     if msg.type == 'note_on' and msg.velocity > 0:
         # Create a new Note object and add it to the array of currently playing notes
 
-        notes.append(Note(pitch=msg.note, time=time, duration=0, velocity=msg.velocity, channel=msg.channel))
+        notes.add(Note(pitch=msg.note, time=time, duration=0, velocity=msg.velocity, channel=msg.channel))
         num_notes_per_channel[msg.channel] += 1
         found_chord[msg.channel] = False
 
@@ -332,26 +690,21 @@ def handle_note(msg, notes, time, track, num_notes_per_channel, found_chord):
     elif msg.type == 'note_off' or msg.velocity == 0:
         # Find a possible chord in this channel first
         if num_notes_per_channel[msg.channel] >= 3 and not found_chord[msg.channel]:
-            chord = []
-            for n in notes:
-                # Add every current playing note to chord object
-                if n.channel == msg.channel:
-                    chord.append(n)
-                    n.chord_note = True
+            chord = notes.get_notes_on_channel(msg.channel)
+            # Add every current playing note to chord object
+            for n in chord:
+                n.chord_note = True
             # Create new chord object and add it to the track list
             track.add_chord(Chord(notes=chord, time=time))
-            found_chord[n.channel] = True
-
-        # For each note that is currently playing
-        for n in notes:
-            # Check if the pitch and channel are the same (locate the correct note)
-            if n.pitch == msg.note and n.channel == msg.channel:
-                # Set the duration of this note based on current_time - start time, add it to the track
-                n.duration = time - n.time
-                notes.remove(n)
-                num_notes_per_channel[n.channel] -= 1
-                track.add_note(n)
-                break
+            found_chord[msg.channel] = True
+
+        # Locate the oldest playing note with the same pitch and channel
+        n = notes.pop(channel=msg.channel, pitch=msg.note)
+        if n is not None:
+            # Set the duration of this note based on current_time - start time, add it to the track
+            n.duration = time - n.time
+            num_notes_per_channel[n.channel] -= 1
+            track.add_note(n)
 
 
 def handle_control(msg, track, time):
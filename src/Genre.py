@@ -1,33 +1,136 @@
 import collections
+import collections.abc
+import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from Song import Song
 from Track import Track
 import FileIO as FileIO
 import matplotlib.pyplot as plt
 
+# The directory containing a folder of songs for each genre, laid out as genre/artist/song
+MIDI_FILES_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'MIDI Files'))
+# File extensions of the songs that are indexed (compared in lower case)
+MIDI_EXTENSIONS = ('.mid', '.midi')
+# Loaded songs are kept in memory until they take up more than this many bytes
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+# Approximate memory taken by each note, chord and control of a loaded song, in bytes
+EVENT_SIZE = 200
+
 
 class Genre:
 
-    def __init__(self, songs=None, type=None):
-        """ Constructor for the Genre object
+    def __init__(self, songs=None, type=None, directory=None, max_memory=DEFAULT_MAX_MEMORY, prefetch=0,
+                 skip_errors=False, song_cache=None):
+        """ Constructor for the Genre object. Only the paths of the genre's MIDI files are found here; each song is
+        loaded the first time it is used, and the most recently used songs are kept in memory (see get_song).
 
         Args:
             songs (Song[], optional): List of Songs in this genre. Defaults to None.
-            name (String): Name of this genre. Defaults to None.
+            type (String, optional): Name of this genre. Its songs are found in the folder of the same name in
+                MIDI_FILES_DIRECTORY. Defaults to None.
+            directory (String, optional): Folder to find the genre's songs in, instead of the folder of its type.
+                Defaults to None.
+            max_memory (int, optional): Approximate number of bytes the loaded songs may take up before the least
+                recently used ones are released. Defaults to DEFAULT_MAX_MEMORY.
+            prefetch (int, optional): Number of songs to load ahead in background threads while iterating over
+                the songs. Defaults to 0 (each song is loaded when it is reached).
+            skip_errors (bool, optional): If True, files that can't be loaded are left out when iterating over the
+                songs, and recorded in failed_files. If False, the error is raised. Defaults to False.
+            song_cache (SongCache, optional): On-disk cache passed to Song.load. Defaults to None.
         """
-        self.songs = []
         self.type = type
-        directory = '..\\..\\MIDI Files\\' + type
-        for artist in os.listdir(directory):
-            artist_directory = directory + '\\' + artist.title()
-            for song in os.listdir(artist_directory):
-                song_object = Song()
-                try:
-                    song_object.load(filename=artist_directory + '\\' + song.title())
-                except (IOError, AttributeError) as e:
-                    continue
-                assert isinstance(song_object, Song)
-                self.songs.append(song_object)
+        if directory is None and type is not None:
+            directory = os.path.join(MIDI_FILES_DIRECTORY, type)
+        self.directory = directory
+        self.filenames = find_midi_files(directory) if directory is not None else []
+        self.added_songs = list(songs) if songs is not None else []
+        self.max_memory = max_memory
+        self.prefetch = prefetch
+        self.skip_errors = skip_errors
+        self.song_cache = song_cache
+        # Files that couldn't be loaded, and their errors
+        self.failed_files = {}
+        # Loaded songs by file name, with their estimated size, from least to most recently used
+        self._loaded = collections.OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+
+    @property
+    def songs(self):
+        """
+        Returns:
+            GenreSongs: The songs of this genre. Songs are loaded as they are accessed.
+        """
+        return GenreSongs(self)
+
+    def __iter__(self):
+        return self.iter_songs()
+
+    def iter_songs(self, prefetch=None):
+        """ Iterates over the songs of this genre: first the songs in its directory, then the added songs.
+
+        Args:
+            prefetch (int, optional): Number of songs to load ahead in background threads. Defaults to the
+                genre's prefetch.
+
+        Yields:
+            Song: Each song of the genre
+        """
+        if prefetch is None:
+            prefetch = self.prefetch
+        if prefetch > 0:
+            songs = self._iter_prefetched(prefetch)
+        else:
+            songs = (self._load_or_skip(filename) for filename in self.filenames)
+        for song in songs:
+            if song is not None:
+                yield song
+        yield from self.added_songs
+
+    def get_song(self, filename):
+        """ Loads a song of this genre, or finds it among the recently loaded songs
+
+        Args:
+            filename (String): Path of the song's MIDI file
+
+        Returns:
+            Song: The song
+        """
+        with self._lock:
+            entry = self._loaded.get(filename)
+            if entry is not None:
+                self._loaded.move_to_end(filename)
+                return entry[0]
+
+        song = Song()
+        song.load(filename=filename, cache=self.song_cache)
+
+        size = estimate_song_size(song)
+        with self._lock:
+            if filename not in self._loaded and size <= self.max_memory:
+                self._loaded[filename] = (song, size)
+                self._memory += size
+            while self._memory > self.max_memory:
+                evicted, (evicted_song, evicted_size) = self._loaded.popitem(last=False)
+                self._memory -= evicted_size
+        return song
+
+    def get_loaded_songs(self):
+        """
+        Returns:
+            Song[]: The songs that are currently held in memory, from least to most recently used
+        """
+        with self._lock:
+            return [song for song, size in self._loaded.values()]
+
+    def release_songs(self):
+        """ Releases every loaded song from memory. They are loaded again when they are next used.
+        """
+        with self._lock:
+            self._loaded.clear()
+            self._memory = 0
 
     def add_song(self, song):
         """ Adds a song to the genre's list of songs
@@ -36,22 +139,22 @@ class Genre:
             song (Song): The song to add to the Genre
         """
         assert isinstance(song, Song)
-        self.songs.append(song)
+        self.added_songs.append(song)
 
     def print_songs(self):
         """ Prints the list of songs in this genre
         TODO: make this private
-        """        
-        print(self.songs)
+        """
+        print(self.filenames + self.added_songs)
 
     def get_notes_frequency_graph(self):
         """ Creates and displays the visualization of the frequency of each note within
         Songs of this genre.
         TODO: make this return rather than 'print'
-        """        
+        """
         notes_list = Song.get_notes_array()
         all_notes = []
-        for song in self.songs:
+        for song in self:
             for track in song.tracks:
                 for note in track.notes:
                     all_notes.append(notes_list[note.pitch % 12])
@@ -60,3 +163,115 @@ class Genre:
                                  x_label="Note", y_label="Frequency", items=all_notes)
         plt.show()
 
+    def _load_or_skip(self, filename):
+        """
+        Returns:
+            Song: The loaded song, or None if it couldn't be loaded and errors are skipped
+        """
+        try:
+            return self.get_song(filename)
+        except Exception as e:
+            if not self.skip_errors:
+                raise
+            self._record_failure(filename, e)
+            return None
+
+    def _iter_prefetched(self, prefetch):
+        """ Loads the songs in the genre's directory in background threads, keeping up to prefetch songs ahead
+        of the one being used
+
+        Yields:
+            Song: Each song, or None for songs that couldn't be loaded when errors are skipped
+        """
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            pending = collections.deque()
+            filenames = iter(self.filenames)
+            try:
+                for filename in filenames:
+                    pending.append((filename, executor.submit(self.get_song, filename)))
+                    if len(pending) > prefetch:
+                        yield self._get_prefetched(*pending.popleft())
+                while pending:
+                    yield self._get_prefetched(*pending.popleft())
+            finally:
+                # Don't load the rest of the songs if iteration stopped early
+                for filename, future in pending:
+                    future.cancel()
+
+    def _get_prefetched(self, filename, future):
+        try:
+            return future.result()
+        except Exception as e:
+            if not self.skip_errors:
+                raise
+            self._record_failure(filename, e)
+            return None
+
+    def _record_failure(self, filename, error):
+        self.failed_files[filename] = error
+        logging.warning(msg="Couldn't load " + filename + ": " + type(error).__name__ + ": " + str(error))
+
+
+class GenreSongs(collections.abc.Sequence):
+
+    def __init__(self, genre):
+        """ The songs of a genre, as a read-only sequence. Songs are loaded when they are accessed, through the
+        genre's memory-bounded cache of loaded songs.
+
+        Args:
+            genre (Genre): The genre
+        """
+        self.genre = genre
+
+    def __len__(self):
+        return len(self.genre.filenames) + len(self.genre.added_songs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("song index out of range")
+        if index < len(self.genre.filenames):
+            return self.genre.get_song(self.genre.filenames[index])
+        return self.genre.added_songs[index - len(self.genre.filenames)]
+
+    def __iter__(self):
+        return self.genre.iter_songs()
+
+    def __contains__(self, song):
+        # Songs have no equality of their own, so only the songs that are in memory can be in the genre. This
+        # avoids loading every song to answer.
+        return any(s is song for s in self.genre.added_songs) or \
+            any(s is song for s in self.genre.get_loaded_songs())
+
+
+def find_midi_files(directory):
+    """
+    Args:
+        directory (String): The directory to search
+
+    Returns:
+        String[]: The paths of every MIDI file in the directory and its subdirectories, in sorted order
+    """
+    filenames = []
+    for (dirpath, dirnames, files) in os.walk(directory):
+        dirnames.sort()
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() in MIDI_EXTENSIONS:
+                filenames.append(os.path.join(dirpath, file))
+    if not filenames and not os.path.isdir(directory):
+        raise FileNotFoundError("No such genre directory: " + directory)
+    return filenames
+
+
+def estimate_song_size(song):
+    """
+    Args:
+        song (Song): A loaded song
+
+    Returns:
+        int: Approximate number of bytes the song takes up in memory
+    """
+    return EVENT_SIZE * sum(len(track.notes) + len(track.chords) + len(track.controls) for track in song.tracks)
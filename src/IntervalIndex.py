@@ -0,0 +1,170 @@
+class IntervalIndex:
+
+    def __init__(self, intervals):
+        """ A static centered interval tree. Finding every interval that contains a point, or overlaps a range,
+        takes O(log n + k) time, where k is the number of intervals found.
+
+        Args:
+            intervals ((int, int, object)[]): (begin, end, item) tuples. Intervals are closed, so they contain both
+                their begin and end points.
+        """
+        self.intervals = list(intervals)
+        self.size = len(self.intervals)
+        self.root = _build_node(self.intervals)
+
+    def __len__(self):
+        return self.size
+
+    def at(self, point):
+        """
+        Args:
+            point (int): The point to look up
+
+        Returns:
+            object[]: The items of every interval with begin <= point <= end (in no particular order)
+        """
+        found = []
+        node = self.root
+        while node is not None:
+            center, left, right, by_begin, by_end = node
+            if point < center:
+                for begin, end, item in by_begin:
+                    if begin > point:
+                        break
+                    found.append(item)
+                node = left
+            elif point > center:
+                for begin, end, item in by_end:
+                    if end < point:
+                        break
+                    found.append(item)
+                node = right
+            else:
+                found.extend(interval[2] for interval in by_begin)
+                node = None
+        return found
+
+    def overlapping(self, begin, end):
+        """
+        Args:
+            begin (int): Start of the range
+            end (int): End of the range (inclusive)
+
+        Returns:
+            object[]: The items of every interval that overlaps the range [begin, end] (in no particular order)
+        """
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, left, right, by_begin, by_end = node
+            if end < center:
+                for interval in by_begin:
+                    if interval[0] > end:
+                        break
+                    found.append(interval[2])
+                stack.append(left)
+            elif begin > center:
+                for interval in by_end:
+                    if interval[1] < begin:
+                        break
+                    found.append(interval[2])
+                stack.append(right)
+            else:
+                found.extend(interval[2] for interval in by_begin)
+                stack.append(left)
+                stack.append(right)
+        return found
+
+
+class GrowingIntervalIndex:
+
+    def __init__(self, intervals=()):
+        """ An interval index that intervals can be added to. The intervals are kept in a few static IntervalIndexes,
+        each at least twice as big as the next one. Adding intervals only rebuilds the indexes smaller than what is
+        added, like carrying in a binary counter, so adding n intervals one at a time takes O(n log^2 n) time in
+        total. Looking them up takes O(log^2 n + k) time, where k is the number of intervals found.
+
+        Args:
+            intervals ((int, int, object)[], optional): (begin, end, item) tuples to start with (see IntervalIndex)
+        """
+        self.levels = []
+        self.size = 0
+        self.extend(intervals)
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, intervals):
+        """
+        Args:
+            intervals ((int, int, object)[]): (begin, end, item) tuples to add (see IntervalIndex)
+        """
+        intervals = list(intervals)
+        if not intervals:
+            return
+        self.size += len(intervals)
+        while self.levels and len(self.levels[-1]) <= len(intervals):
+            intervals.extend(self.levels.pop().intervals)
+        self.levels.append(IntervalIndex(intervals))
+
+    def at(self, point):
+        """
+        Args:
+            point (int): The point to look up
+
+        Returns:
+            object[]: The items of every interval with begin <= point <= end (in no particular order)
+        """
+        found = []
+        for level in self.levels:
+            found.extend(level.at(point))
+        return found
+
+    def overlapping(self, begin, end):
+        """
+        Args:
+            begin (int): Start of the range
+            end (int): End of the range (inclusive)
+
+        Returns:
+            object[]: The items of every interval that overlaps the range [begin, end] (in no particular order)
+        """
+        found = []
+        for level in self.levels:
+            found.extend(level.overlapping(begin, end))
+        return found
+
+
+def _build_node(intervals):
+    """ Builds a node of the tree. Each node stores the intervals that contain its center point, sorted by begin
+    (ascending) and by end (descending). Intervals entirely left or right of the center go into the child nodes.
+
+    Args:
+        intervals ((int, int, object)[]): The intervals to store under this node
+
+    Returns:
+        tuple: (center, left node, right node, intervals sorted by begin, intervals sorted by end), or None if
+        there are no intervals
+    """
+    if not intervals:
+        return None
+    endpoints = sorted(interval[0] for interval in intervals)
+    center = endpoints[len(endpoints) // 2]
+
+    left = []
+    right = []
+    here = []
+    for interval in intervals:
+        if interval[1] < center:
+            left.append(interval)
+        elif interval[0] > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+
+    by_begin = sorted(here, key=lambda interval: interval[0])
+    by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+    return center, _build_node(left), _build_node(right), by_begin, by_end
@@ -1,5 +1,9 @@
 import string
 
+import numpy as np
+
+from Scale import SCALE_TYPES
+
 MAJOR = "major"
 IONIAN = "ionian"
 DORIAN = "dorian"
@@ -71,3 +75,118 @@ class Key:
                               "' needs to be the key and #/b if necessary. Examples: 'C#', 'Db', 'F' etc")
         return index
 
+
+def _build_scale_membership():
+    """ Builds the scale membership matrix described above SCALE_MEMBERSHIP
+
+    Returns:
+        numpy.ndarray: The 84x12 matrix
+    """
+    membership = np.zeros((len(KEYS) * len(SCALE_TYPES), len(KEYS)), dtype=np.int64)
+    for key_index in range(len(KEYS)):
+        for scale_index, scale_steps in enumerate(SCALE_TYPES.values()):
+            # semitones that a note in the scale is away from the key (starts at 0 because regardless of scale the
+            # tonic will be in the scale)
+            semitones_from_key = 0
+            membership[key_index * len(SCALE_TYPES) + scale_index, key_index] = 1
+            for semitones in scale_steps:
+                semitones_from_key += semitones
+                membership[key_index * len(SCALE_TYPES) + scale_index,
+                           (key_index + semitones_from_key) % len(KEYS)] = 1
+    return membership
+
+
+# Every (tonic, scale) pair, in the order of the rows of SCALE_MEMBERSHIP: all scales of 'C' first, then 'Db', etc.
+KEY_SCALE_PAIRS = [(tonic, scale) for tonic in KEYS for scale in SCALE_TYPES]
+# An 84x12 matrix with one row per (tonic, scale) pair in KEY_SCALE_PAIRS. Column i of a row is 1 if the c indexed
+# pitch class i is in that key/scale, and 0 if it isn't
+SCALE_MEMBERSHIP = _build_scale_membership()
+# The same matrix with 1s for notes that are NOT in the key/scale. Multiplying it by a song's c indexed note
+# frequencies gives the number of errors (notes outside the key/scale) for every key/scale at once
+SCALE_ERRORS = 1 - SCALE_MEMBERSHIP
+# The rows of SCALE_MEMBERSHIP that hold the major and minor scales, indexed by tonic
+MAJOR_ROWS = [KEY_SCALE_PAIRS.index((tonic, MAJOR)) for tonic in KEYS]
+MINOR_ROWS = [KEY_SCALE_PAIRS.index((tonic, MINOR)) for tonic in KEYS]
+
+
+def count_key_and_scale_errors(note_frequencies):
+    """ Counts how many notes fall outside each key/scale, for one or many songs at once.
+
+    Args:
+        note_frequencies (int[] or int[][]): c indexed note frequencies of one song (12 values), or a matrix with one
+            row of 12 c indexed note frequencies per song
+
+    Returns:
+        numpy.ndarray: The number of errors of every key/scale in KEY_SCALE_PAIRS (84 values), or one row of 84
+        values per song
+    """
+    return np.asarray(note_frequencies, dtype=np.int64) @ SCALE_ERRORS.T
+
+
+def detect_keys_and_scales(note_frequencies):
+    """ Detects the key of many songs in one call, using the same algorithm as Song.detect_key_and_scale. The
+    key/scales with the fewest errors are found for every song at once, and the relative major or minor of those
+    with the most common tonic is chosen.
+
+    Args:
+        note_frequencies (int[][]): A matrix with one row of 12 c indexed note frequencies per song (an Nx12 matrix)
+
+    Returns:
+        The detected keys [0] (Key[]), the minimum errors [1] (numpy int array) and the confidence levels [2]
+        (numpy float array), each with one entry per song
+    """
+    note_frequencies = np.asarray(note_frequencies, dtype=np.int64).reshape(-1, len(KEYS))
+    errors = count_key_and_scale_errors(note_frequencies)
+    minimum_errors = errors.min(axis=1)
+
+    # The relative major and minor keys with the fewest errors. When several tonics tie, the last one is used
+    major_ties = errors[:, MAJOR_ROWS] == minimum_errors[:, None]
+    minor_ties = errors[:, MINOR_ROWS] == minimum_errors[:, None]
+    major_tonics = len(KEYS) - 1 - np.argmax(major_ties[:, ::-1], axis=1)
+    minor_tonics = len(KEYS) - 1 - np.argmax(minor_ties[:, ::-1], axis=1)
+
+    # The tonic that is played more often decides between the relative major and minor
+    songs = np.arange(len(note_frequencies))
+    use_major = note_frequencies[songs, major_tonics] >= note_frequencies[songs, minor_tonics]
+    keys = [Key(KEYS[major], MAJOR) if is_major else Key(KEYS[minor], MINOR)
+            for major, minor, is_major in zip(major_tonics.tolist(), minor_tonics.tolist(), use_major.tolist())]
+
+    # determine confidence based on number of 1 - number of errors/ number of notes
+    num_notes = note_frequencies.sum(axis=1)
+    has_notes = num_notes != 0
+    confidences = np.zeros(len(note_frequencies))
+    confidences[has_notes] = 1 - minimum_errors[has_notes] / num_notes[has_notes]
+
+    return keys, minimum_errors, confidences
+
+
+def build_key_change_table(origin_key, destination_key):
+    """ Compiles a change of key into a table of how far each pitch class moves, as used by Song.change_song_key.
+    A note is moved by the difference between the tonics of the keys, and then to the same step of the destination
+    mode as it had in the origin mode (notes that aren't in the origin mode only move with the tonic).
+
+    Args:
+        origin_key (Key): Current key of the notes
+        destination_key (Key): Key to change the notes to
+
+    Returns:
+        numpy.ndarray: 12 values. A note with c indexed pitch class i moves by entry i (in half steps).
+    """
+    origin_index = origin_key.get_c_based_index_of_key()
+    offset = destination_key.get_c_based_index_of_key() - origin_index
+    origin_steps = SCALE_TYPES.get(str(origin_key.mode), [])
+    dest_steps = SCALE_TYPES.get(str(destination_key.mode), [])
+
+    # How far a note moves to get from each step of the origin mode to the same step of the destination mode, by
+    # its distance above the origin tonic
+    mode_changes = np.zeros(len(KEYS), dtype=np.int64)
+    origin_pitch = 0
+    dest_pitch = 0
+    for i in range(len(origin_steps)):
+        mode_changes[origin_pitch] = dest_pitch - origin_pitch
+        origin_pitch += origin_steps[i]
+        dest_pitch += dest_steps[i]
+
+    # The mode is changed after moving by the offset, measured from the origin tonic
+    pitch_classes = np.arange(len(KEYS))
+    return offset + mode_changes[(pitch_classes + offset - origin_index) % len(KEYS)]
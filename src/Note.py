@@ -4,8 +4,27 @@ MIDDLE_C = 60
 MAX_VELOCITY = 127
 
 
+def notify_owners(owners):
+    """ Tells the lists holding a note or control that it was changed in place (see TrackList)
+
+    Args:
+        owners: The '_owners' field of the note or control: None, a TrackList, or a tuple of TrackLists
+    """
+    if owners is None:
+        return
+    if type(owners) is tuple:
+        for owner in owners:
+            owner.version += 1
+    else:
+        owners.version += 1
+
+
 class Note:
 
+    # Corpus-wide analyses keep millions of notes alive, so the fields are stored in slots instead of a __dict__.
+    # '_owners' holds the TrackLists the note is in, which are told when the note changes (see notify_owners)
+    __slots__ = ('pitch', 'time', 'duration', 'velocity', 'channel', 'chord_note', '_owners')
+
     def __init__(self, pitch=MIDDLE_C, time=0, duration=1, velocity=MAX_VELOCITY, channel=0, chord_note=False):
         """ Constructor for the Note class.
 
@@ -16,16 +35,41 @@ class Note:
             velocity (int, optional): The intensity/loudness of the note. Defaults to MAX_VELOCITY (127).
             channel (int, optional): The channel this note was read from. Defaults to 0.
             chord_note (bool, optional): If this note is part of a chord
-        """        
-        self.pitch = pitch
-        self.time = time
-        self.duration = duration
-        self.velocity = velocity
-        self.channel = channel
-        self.chord_note = chord_note
-        # The pitch class the note belongs to, stored as an int from 0-11, with
-        # 0 being C. Octave information is lost in this calculation.
-        self.c_indexed_pitch_class = pitch % NUM_NOTES
+        """
+        # A new note isn't in any track yet, so there is no one to tell about its fields
+        set_field = object.__setattr__
+        set_field(self, '_owners', None)
+        set_field(self, 'pitch', pitch)
+        set_field(self, 'time', time)
+        set_field(self, 'duration', duration)
+        set_field(self, 'velocity', velocity)
+        set_field(self, 'channel', channel)
+        set_field(self, 'chord_note', chord_note)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if self._owners is not None:
+            notify_owners(self._owners)
+
+    def __reduce__(self):
+        # The lists holding the note aren't copied along with it
+        return Note, (self.pitch, self.time, self.duration, self.velocity, self.channel, self.chord_note)
+
+    @property
+    def c_indexed_pitch_class(self):
+        """ The pitch class the note belongs to, as an int from 0-11, with
+        0 being C. Octave information is lost in this calculation. Setting it
+        changes the pitch to that pitch class in the same octave.
+
+        Returns:
+            int: The pitch class of this note
+        """
+        return self.pitch % NUM_NOTES
+
+    @c_indexed_pitch_class.setter
+    def c_indexed_pitch_class(self, pitch_class):
+        pitch = self.pitch
+        self.pitch = pitch - pitch % NUM_NOTES + pitch_class % NUM_NOTES
 
     def duplicate_note(self):
         """
@@ -0,0 +1,323 @@
+import numpy as np
+
+from Note import Note
+
+# The columns stored for every note. One row of this structured dtype holds the same data as one Note object
+NOTE_DTYPE = np.dtype([('pitch', np.int16), ('time', np.int64), ('duration', np.int64), ('velocity', np.int16),
+                       ('channel', np.int8), ('chord_note', np.bool_)])
+# Number of rows allocated for a new, empty NoteArray. The storage doubles in size whenever it fills up
+INITIAL_CAPACITY = 16
+
+
+class NoteArray:
+
+    def __init__(self, notes=None):
+        """ A list-like container that stores notes column by column in a NumPy structured array instead of as a
+        list of Note objects. Indexing or iterating over a NoteArray creates lightweight NoteView objects on demand,
+        so code written for a list of notes keeps working, while analysis code can work on whole columns at once
+        through the 'columns' attribute.
+
+        Args:
+            notes (Note[], optional): Notes to fill the array with (see extend). Defaults to None.
+        """
+        # The note data, one row per note, in the same order a list of these notes would have
+        self.data = np.zeros(0, dtype=NOTE_DTYPE)
+        self.size = 0
+        # Every note gets a slot number that never changes, so NoteViews stay attached to the same note
+        # when notes are sorted or removed. positions[slot] is the row of that note (-1 if it was removed),
+        # and slots[row] is the slot of the note stored in that row.
+        self.positions = np.zeros(0, dtype=np.int64)
+        self.slots = np.zeros(0, dtype=np.int64)
+        self.next_slot = 0
+        # Incremented by every change to the notes, like TrackList.version. 'appended' counts the changes that only
+        # added notes to the end
+        self.version = 0
+        self.appended = 0
+        self._reserve(INITIAL_CAPACITY if notes is None else max(len(notes), INITIAL_CAPACITY))
+
+        if notes is not None:
+            self.extend(notes)
+
+    @property
+    def columns(self):
+        """
+        Returns:
+            numpy.ndarray: The rows of the notes in this array, as a read-only view (see edit_columns)
+        """
+        columns = self.data[:self.size]
+        columns.flags.writeable = False
+        return columns
+
+    def edit_columns(self):
+        """ Gives write access to the rows of the notes, for changing many notes at once. Counts as a change of the
+        notes (see version).
+
+        Returns:
+            numpy.ndarray: The rows of the notes in this array (a view, so changes to it change the notes)
+        """
+        self.version += 1
+        return self.data[:self.size]
+
+    def _reserve(self, capacity):
+        """ Makes sure there is room for at least 'capacity' notes
+
+        Args:
+            capacity (int): Number of notes the array needs to be able to hold
+        """
+        if capacity <= len(self.data):
+            return
+        capacity = max(capacity, 2 * len(self.data))
+        self.data = _grow(self.data, capacity)
+        self.slots = _grow(self.slots, capacity)
+
+    def _new_slot(self, row):
+        """ Assigns a new slot to the note stored in the given row
+
+        Args:
+            row (int): Row of the new note
+
+        Returns:
+            int: The new slot
+        """
+        slot = self.next_slot
+        self.next_slot += 1
+        if slot >= len(self.positions):
+            self.positions = _grow(self.positions, max(2 * len(self.positions), INITIAL_CAPACITY))
+        self.positions[slot] = row
+        self.slots[row] = slot
+        return slot
+
+    def _row(self, index):
+        """ Converts a (possibly negative) list index into a row number
+
+        Raises:
+            IndexError: If the index is out of range
+        """
+        if index < 0:
+            index += self.size
+        if index < 0 or index >= self.size:
+            raise IndexError("NoteArray index out of range")
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for slot in self.slots[:self.size].tolist():
+            yield NoteView(self, slot)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [NoteView(self, slot) for slot in self.slots[:self.size][index].tolist()]
+        return NoteView(self, int(self.slots[self._row(index)]))
+
+    def __setitem__(self, index, note):
+        row = self._row(index)
+        self.data[row] = _to_row(note)
+        self.version += 1
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def __contains__(self, note):
+        return any(note == n for n in self)
+
+    def append(self, note):
+        """ Adds a note to the end of this array
+
+        Args:
+            note (Note): The note to add. Its fields are copied into the array.
+        """
+        self._reserve(self.size + 1)
+        self.data[self.size] = _to_row(note)
+        self._new_slot(self.size)
+        self.size += 1
+        self.version += 1
+        self.appended += 1
+
+    def extend(self, notes):
+        """ Adds every note in the given list to the end of this array
+
+        Args:
+            notes (Note[]): The notes to add (a list, a NoteArray, or a structured array with NOTE_DTYPE rows)
+        """
+        if isinstance(notes, NoteArray):
+            rows = notes.columns.copy()
+        elif isinstance(notes, np.ndarray):
+            rows = notes.astype(NOTE_DTYPE)
+        else:
+            rows = notes_to_array(notes)
+        self._reserve(self.size + len(rows))
+        self.data[self.size:self.size + len(rows)] = rows
+        for row in range(self.size, self.size + len(rows)):
+            self._new_slot(row)
+        self.size += len(rows)
+        self.version += 1
+        self.appended += 1
+
+    def pop(self, index=-1):
+        """ Removes the note at the given index
+
+        Args:
+            index (int, optional): Index of the note to remove. Defaults to the last note.
+
+        Returns:
+            Note: A copy of the removed note
+        """
+        row = self._row(index)
+        removed = self[row].duplicate_note()
+        self.positions[self.slots[row]] = -1
+        self.data[row:self.size - 1] = self.data[row + 1:self.size]
+        self.slots[row:self.size - 1] = self.slots[row + 1:self.size]
+        self.size -= 1
+        self.positions[self.slots[row:self.size]] -= 1
+        self.version += 1
+        return removed
+
+    def remove(self, note):
+        """ Removes the given note from this array
+
+        Args:
+            note (Note): The note to remove
+
+        Raises:
+            ValueError: If the note is not in this array
+        """
+        self.pop(self.index(note))
+
+    def index(self, note):
+        """
+        Args:
+            note (Note): Note to look for
+
+        Raises:
+            ValueError: If the note is not in this array
+
+        Returns:
+            int: Index of the given note in this array
+        """
+        if isinstance(note, NoteView) and note.notes is self:
+            row = int(self.positions[note.slot])
+            if row >= 0:
+                return row
+        else:
+            for i, n in enumerate(self):
+                if n == note:
+                    return i
+        raise ValueError("Note is not in this NoteArray")
+
+    def clear(self):
+        """ Removes every note from this array
+        """
+        self.positions[self.slots[:self.size]] = -1
+        self.size = 0
+        self.version += 1
+
+    def sort(self, key=None, reverse=False):
+        """ Sorts the notes in place, the same way list.sort would. The sort is stable.
+
+        Args:
+            key (function): Function that takes a note and returns the value to sort by
+            reverse (bool, optional): Whether to sort in descending order. Defaults to False.
+        """
+        if key is None:
+            raise TypeError("NoteArray.sort() needs a key, notes can't be compared to each other")
+        keys = [key(note) for note in self]
+        order = sorted(range(self.size), key=keys.__getitem__, reverse=reverse)
+        self._reorder(np.array(order, dtype=np.int64))
+
+    def sort_by_column(self, column):
+        """ Sorts the notes in place by one of their fields, without creating any Note objects. The sort is stable.
+
+        Args:
+            column (String): Name of the field to sort by (ex. 'time' or 'pitch')
+        """
+        self._reorder(np.argsort(self.columns[column], kind='stable'))
+
+    def _reorder(self, order):
+        """ Puts the rows in the given order
+
+        Args:
+            order (numpy.ndarray): order[i] is the current row of the note that should end up in row i
+        """
+        self.data[:self.size] = self.data[:self.size][order]
+        self.slots[:self.size] = self.slots[:self.size][order]
+        self.positions[self.slots[:self.size]] = np.arange(self.size)
+        self.version += 1
+
+
+class NoteView(Note):
+
+    __slots__ = ('notes', 'slot')
+
+    def __init__(self, notes, slot):
+        """ A Note that doesn't store its own fields, but reads and writes them in a NoteArray. Changing a field of
+        a NoteView changes the note stored in the array. NoteViews are cheap to create and are created whenever a
+        note is taken out of a NoteArray.
+
+        Args:
+            notes (NoteArray): The array the note is stored in
+            slot (int): The slot of the note in the array
+        """
+        object.__setattr__(self, 'notes', notes)
+        object.__setattr__(self, 'slot', slot)
+        object.__setattr__(self, '_owners', None)
+
+    def _get(self, field):
+        row = self.notes.positions[self.slot]
+        if row < 0:
+            raise LookupError("This note has been removed from its NoteArray")
+        return self.notes.data[field][row]
+
+    def _set(self, field, value):
+        row = self.notes.positions[self.slot]
+        if row < 0:
+            raise LookupError("This note has been removed from its NoteArray")
+        self.notes.data[field][row] = value
+        self.notes.version += 1
+
+    pitch = property(lambda self: int(self._get('pitch')), lambda self, value: self._set('pitch', value))
+    time = property(lambda self: int(self._get('time')), lambda self, value: self._set('time', value))
+    duration = property(lambda self: int(self._get('duration')), lambda self, value: self._set('duration', value))
+    velocity = property(lambda self: int(self._get('velocity')), lambda self, value: self._set('velocity', value))
+    channel = property(lambda self: int(self._get('channel')), lambda self, value: self._set('channel', value))
+    chord_note = property(lambda self: bool(self._get('chord_note')),
+                          lambda self, value: self._set('chord_note', value))
+
+    def __eq__(self, other):
+        return isinstance(other, NoteView) and other.notes is self.notes and other.slot == self.slot
+
+    def __hash__(self):
+        return hash((id(self.notes), self.slot))
+
+
+def notes_to_array(notes):
+    """
+    Args:
+        notes (Note[]): A list of notes
+
+    Returns:
+        numpy.ndarray: A new structured array (with NOTE_DTYPE) holding the fields of the given notes, in order
+    """
+    return np.array([_to_row(note) for note in notes], dtype=NOTE_DTYPE)
+
+
+def _to_row(note):
+    """
+    Args:
+        note (Note): A note
+
+    Returns:
+        tuple: The fields of the note, in the order of NOTE_DTYPE
+    """
+    return note.pitch, note.time, note.duration, note.velocity, note.channel, note.chord_note
+
+
+def _grow(array, capacity):
+    """
+    Returns:
+        numpy.ndarray: A copy of the given array with room for 'capacity' elements
+    """
+    grown = np.zeros(capacity, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -1,16 +1,25 @@
 import logging
 from logging import info
 from Track import Track, TagEnum
-from Key import Key, KEYS
-from Scale import SCALE_TYPES
+from Key import Key, KEYS, KEY_SCALE_PAIRS, SCALE_ERRORS, build_key_change_table, count_key_and_scale_errors, \
+    detect_keys_and_scales
 from Note import NUM_NOTES
+from IntervalIndex import GrowingIntervalIndex
+from NoteArray import NoteArray
 import FileIO as FileIO
+from Chord import CHORD_NAMES, CHORD_NAME_TABLE
 
 import matplotlib.pyplot as plt
+import numpy as np
 import collections
+import hashlib
+import math
 import graphviz
 
 DEFAULT_TICKS_PER_BEAT = 48
+# Default length of the window used by Song.detect_key_timeline, and the step it moves by, in beats
+KEY_WINDOW_BEATS = 16
+KEY_HOP_BEATS = 4
 
 
 class SongLibrary:
@@ -67,10 +76,66 @@ class Song:
             self.ticks_per_beat = ticks_per_beat
         else:
             raise ValueError
+        # The key is either set directly (see the key property), or detected from the notes when it is first
+        # needed and detected again whenever the notes change (see use_detected_key)
+        self._key_detected = False
+        self._key_version = None
         if isinstance(key, Key):
             self.key = key
         else:
             self.key = None
+        # Index of the time span of every note in the song, used to find the notes playing at a given time.
+        # It is built the first time it is needed and rebuilt whenever the notes change, except that notes added
+        # to the end of a track are added to it
+        self._note_index = None
+        self._note_index_version = None
+
+    @property
+    def key(self):
+        """ The key of the song is either followed or pinned. A followed key (see use_detected_key) is detected from
+        the notes (see detect_key_and_scale) the first time it is needed, and again after the notes change. Songs
+        read from a file follow their key. Setting the key pins it: it stays the same whatever happens to the notes,
+        until use_detected_key is called.
+
+        Returns:
+            Key: The key of the song
+        """
+        if self._key_detected:
+            version = self.get_version()
+            if version != self._key_version:
+                self._key = detect_keys_and_scales([self.get_c_indexed_note_frequencies()])[0][0]
+                self._key_version = version
+        return self._key
+
+    @key.setter
+    def key(self, key):
+        self._key = key
+        self._key_detected = False
+
+    def use_detected_key(self, key=None):
+        """ Makes the key of this song follow its notes: it is detected the next time it is needed, and again
+        whenever the notes of the song change.
+
+        Args:
+            key (Key, optional): The key already detected for the current notes, if it is known (for example
+                when the song was cached). Defaults to None.
+        """
+        self._key_detected = True
+        self._key_version = None
+        if key is not None:
+            self._key = key
+            self._key_version = self.get_version()
+
+    def _set_followed_key(self, key):
+        """ Records the key of the current notes, if the key of this song follows its notes, so it isn't detected
+        again until the notes change. A pinned key is left as it is.
+
+        Args:
+            key (Key): The key of the current notes
+        """
+        if self._key_detected:
+            self._key = key
+            self._key_version = self.get_version()
 
     def add_track(self, t):
         """ Adds a new track to the song.
@@ -100,7 +165,7 @@ class Song:
         """
         FileIO.write_midi_file(self, filename=filename, print_file=print_file)
 
-    def load(self, filename, print_file=False):
+    def load(self, filename, print_file=False, streaming=False, columnar=False, cache=None, analyze=True):
         """ Loads a file into this song object. The new data overwrites any previous
         data stored in this song.
 
@@ -108,10 +173,31 @@ class Song:
             filename (String): Name of the file to load in
             print_file (bool, optional): Whether or not to print out the song. Mainly 
                 used for debugging purposes. Defaults to False.
+            streaming (bool, optional): Whether to decode the file one event at a time instead
+                of reading the whole MIDI file into memory first. Useful for very large files.
+                Defaults to False.
+            columnar (bool, optional): Whether to store the notes of each track in NumPy columns
+                (see Track.to_columnar) instead of as Note objects. Defaults to False.
+            cache (SongCache, optional): Cache of parsed songs. If the file (with the same contents) was
+                loaded with this cache before, the song is read from the cache instead of parsing and
+                analyzing the file again. Defaults to None (no cache).
+            analyze (bool, optional): Whether to detect the key of the song and name its chords right away.
+                If False, the key and the tag of each track are only detected when they are first used,
+                and chords are named by calling get_chord_names. Useful when the song is only transposed
+                or saved again. Defaults to True.
         """
-        FileIO.read_midi_file(self, filename=filename, print_file=print_file)
-        self.detect_key_and_scale()
-        self.get_chord_names()
+        if cache is not None:
+            key = cache.get_key(filename)
+            if not print_file and cache.load(self, key, columnar=columnar):
+                return
+        FileIO.read_midi_file(self, filename=filename, print_file=print_file, streaming=streaming,
+                              columnar=columnar)
+        self.use_detected_key()
+        # Cached songs always include the analysis, so a later load with analyze=True gets it too
+        if analyze or cache is not None:
+            self.get_chord_names()
+        if cache is not None:
+            cache.store(self, key)
 
     def clear_song_data(self):
         """ Deletes all of the data from this song object and resets its default values
@@ -152,6 +238,15 @@ class Song:
                     indexed_note_frequency[idx] += val
             return indexed_note_frequency
 
+    def get_version(self):
+        """ Returns a value that changes whenever a track is added to or removed from the song, or the contents
+        of one of its tracks change (see Track.get_version). Used to tell if cached results are stale.
+
+        Returns:
+            tuple: The current version of this song
+        """
+        return tuple(self.tracks), tuple(track.get_version() for track in self.tracks)
+
     def get_tracks_by_tag(self, tag: TagEnum):
         """
         Returns an array of tracks in the song that have the given tag attached
@@ -169,22 +264,33 @@ class Song:
         If num_half_steps is negative, the notes will be shifted down instead
         of up.
 
+        If the key of the song follows the notes and is already known, it is moved by the same number of half steps
+        instead of being detected again. A pinned key isn't changed (see key).
+
         Args:
             num_half_steps (int): Number of half steps to move the notes in the song by
 
         Returns:
             Song: The newly edited song.
         """
+        key = self._key if self._key_detected and self._key_version == self.get_version() else None
         for track in self.tracks:
             if not track.is_percussion:
                 for note in track.notes:
                     note.pitch += num_half_steps
+        if key is not None:
+            self._set_followed_key(Key(KEYS[(key.get_c_based_index_of_key() + num_half_steps) % NUM_NOTES],
+                                       key.mode))
 
-        self.get_chord_names()
+        # Rename the chords, unless they were never named (the song was loaded without analysis)
+        if any(chord.name is not None for track in self.tracks for chord in track.chords):
+            self.get_chord_names()
         return self
 
     def change_song_key(self, origin_key, destination_key, interval_begin=0, interval_end=float('inf')):
-        """ Changes the key of a song for a certain time interval during it.
+        """ Changes the key of a song for a certain time interval during it. If the whole song is changed and its key
+        follows the notes, destination_key becomes the key of the song instead of the key being detected again.
+        A pinned key isn't changed (see key).
         TODO: this will not need origin_key once key detection is fully implemented
 
         Args:
@@ -204,46 +310,24 @@ class Song:
         if not isinstance(origin_key, Key) or not isinstance(destination_key, Key):
             raise SyntaxError("Parameters are not of the right type.  They must be of type 'Key'")
 
-        # Get the index of the origin key
-        origin_index = origin_key.get_c_based_index_of_key()
+        # How far a note moves, by its pitch class
+        table = build_key_change_table(origin_key, destination_key)
+        moves = table.tolist()
 
-        # Get the index of the destination key
-        destination_index = destination_key.get_c_based_index_of_key()
-
-        # discover offset (this is the number of half steps to move each note to get to the destination key)
-        offset = destination_index - origin_index
-
-        origin_steps = []
-        dest_steps = []
-
-        # iterate over each scale and find the source and destination scales
-        for scale in SCALE_TYPES.items():
-            # Break the scale dict into source and destination values
-            if scale[0] == str(origin_key.mode):
-                origin_steps = scale[1]
-            if scale[0] == str(destination_key.mode):
-                dest_steps = scale[1]
-
-        # apply the offset to each note within the time interval
+        # apply the table to each note within the time interval
         for track in self.tracks:
             if not track.is_percussion:
-                for note in track.notes:
-                    if interval_begin <= note.time <= interval_end:
-                        note.pitch += offset
-
-                        # Reset c_indexed_pitch_class
-                        note.c_indexed_pitch_class = note.pitch % 12
-
-                        # Shift each note to its corresponding location in the destination mode
-                        origin_pitch = 0
-                        dest_pitch = 0
-                        for i in range(len(origin_steps)):
-
-                            if (note.c_indexed_pitch_class - origin_key.get_c_based_index_of_key()) % 12 == origin_pitch:
-                                note.pitch += (dest_pitch - origin_pitch)
-                            # Deal with accidentals here? or leave them where they are?
-                            origin_pitch += origin_steps[i]
-                            dest_pitch += dest_steps[i]
+                if isinstance(track.notes, NoteArray):
+                    columns = track.notes.edit_columns()
+                    selected = (columns['time'] >= interval_begin) & (columns['time'] <= interval_end)
+                    pitches = columns['pitch'][selected]
+                    columns['pitch'][selected] = pitches + table[pitches % NUM_NOTES]
+                else:
+                    for note in track.notes:
+                        if interval_begin <= note.time <= interval_end:
+                            note.pitch += moves[note.pitch % NUM_NOTES]
+        if interval_begin <= 0 and interval_end == float('inf'):
+            self._set_followed_key(destination_key)
         return self
 
     def get_note_velocity_graph(self, name):
@@ -331,8 +415,23 @@ class Song:
                         "\n")
         return message
 
+    def get_fingerprint(self):
+        """ Returns a hash of the ticks per beat of this song and the fingerprints of its tracks (see
+        Track.get_fingerprint). Songs with the same fingerprint are equal (barring hash collisions), so
+        fingerprints can be used to find duplicate songs.
+
+        Returns:
+            String: The fingerprint, as a hexadecimal string
+        """
+        fingerprint = hashlib.blake2b(digest_size=16)
+        fingerprint.update(repr(self.ticks_per_beat).encode())
+        for track in self.tracks:
+            fingerprint.update(track.get_fingerprint().encode())
+        return fingerprint.hexdigest()
+
     def equals(self, song):
-        """ Determines whether this song and the specified song are equivalent.
+        """ Determines whether this song and the specified song are equivalent. Tracks that already have
+        fingerprints are compared by fingerprint (see Track.equals).
 
         Args:
             song (Song): Song to check this song against
@@ -363,121 +462,127 @@ class Song:
         for every key and for every scale and checks the occurrences of the notes in the song against the valid
         key/scale notes.  It then finds how many errors (or misses) occurred.  It then finds the key/scale with the
         lowest number of errors (or the list of key/scale with the same minimum) and returns the result.
+        The valid notes of every key/scale are precomputed in Key.SCALE_MEMBERSHIP, so the errors of all 84
+        key/scales are counted with one matrix-vector product.
         :return: A list of Key objects that have the minimum number of errors [0], and the minimum errors [1]
         """
 
-        note_frequencies = self.get_c_indexed_note_frequencies()
-
-        key_and_scale_error_record = {}
-
-        # Iterate over each key
-        for key in KEYS:
-            # we have to rotate the frequency array to be 0 indexed at the key.
-            # get the index of the key we want the frequencies indexed by
-            key_index = Key(key).get_c_based_index_of_key()
-
-            # rotate the array left based on the index to have the 0th index contain the frequency of the tonic or key
-            key_indexed_note_frequencies = note_frequencies[key_index:] + note_frequencies[:key_index]
-
-            # iterate over each scale and count errors for each
-            for scale in SCALE_TYPES.items():
+        errors = count_key_and_scale_errors(self.get_c_indexed_note_frequencies())
 
-                # Break the scale dict into key and value
-                scale_name = scale[0]
-                scale_steps = scale[1]
-
-                # keep an error counter to increment each time a note is not in the key/scale
-                errors = 0
-
-                # generate an array with true in the indexes that are in the key/scale and false in the
-                # indexes that are notes that are out of the scale  (the array is key indexed at 0)
-                accepted_notes = [False] * NUM_NOTES
-
-                # semitones that a note in the scale is away from the key (starts at 0 because regardless of scale the
-                # tonic will be in the scale)
-                semitones_from_key = 0
-                accepted_notes[0] = True
-
-                # iterate through the scale semitones marking notes as valid for the key/scale
-                for semitones in scale_steps:
-                    semitones_from_key += semitones
-                    # % number of notes (12) because some signatures will count semitones back to tonic
-                    accepted_notes[semitones_from_key % NUM_NOTES] = True
-
-                # count all of the errors that occur (notes in the song that are not accepted by key/scale)
-                for idx in range(NUM_NOTES):
-                    if not accepted_notes[idx]:
-                        errors += key_indexed_note_frequencies[idx]
-
-                # store errors in a record dictionary
-                key_and_scale_error_record[key + ' ' + scale_name] = errors
-
-        # find the key/scales with the minimum values in the error dictionary
-        minimum_errors = min(key_and_scale_error_record.values())
-        result = [k for k, v in key_and_scale_error_record.items() if v == minimum_errors]
-
-        keys = []
-        for key in result:
-            keys.append(Key(key.split()[0], key.split()[1]))
+        # find the key/scales with the minimum values in the error array
+        minimum_errors = int(errors.min())
+        keys = [Key(KEY_SCALE_PAIRS[i][0], KEY_SCALE_PAIRS[i][1]) for i in np.flatnonzero(errors == minimum_errors)]
 
         return keys, minimum_errors
 
     def detect_key_and_scale(self):
         """
         Uses the generate possible keys and scales method to get a list of potential keys, determines which is
-        the most likely based on the most common notes in the song.
+        the most likely based on the most common notes in the song. (See Key.detect_keys_and_scales to detect the
+        keys of many songs at once.) The key of the song becomes the detected key, and follows the notes from now on
+        (see key).
 
         :return: The detected key [0], the minimum errors [1], and the confidence level [2]
         """
+        keys, minimum_errors, confidences = detect_keys_and_scales([self.get_c_indexed_note_frequencies()])
 
-        note_frequencies = self.get_c_indexed_note_frequencies()
-        num_notes = sum(note_frequencies)
-        keys, minimum_errors = self.generate_possible_keys_and_scales()
-
+        # set the key of the song, which keeps following the notes
+        self.use_detected_key(keys[0])
 
-        # now we have the relative major and minors, we can use the note frequencies to differentiate
-        # between the two based on the assumption that for most cases the tonic will be played more than
-        # other notes.  This lets us differentiate scales with the same notes such as D major and B Minor.
-
-        # get the resulting keys/scales
-        relative_major_key_scale = None
-        relative_minor_key_scale = None
-        for key in keys:
-            if key.mode == "major":
-                relative_major_key_scale = key
-            elif key.mode == "minor":
-                relative_minor_key_scale = key
-
-        # get the index of the key in order to find its frequency in the frequency array
-        idx_of_major_key = relative_major_key_scale.get_c_based_index_of_key()
-        idx_of_minor_key = relative_minor_key_scale.get_c_based_index_of_key()
-
-        # get the frequency of each tonic
-        major_frequency = note_frequencies[idx_of_major_key]
-        minor_frequency = note_frequencies[idx_of_minor_key]
+        # return the tuple
+        return keys[0], int(minimum_errors[0]), float(confidences[0])
 
-        # compare and return the most common key scale
-        if major_frequency >= minor_frequency:
-            detected_return_key = relative_major_key_scale
-        else:
-            detected_return_key = relative_minor_key_scale
+    def detect_key_timeline(self, window=None, hop=None):
+        """ Detects the key of each part of the song, to find where it modulates. A window slides over the song in
+        steps of hop ticks. The key of the notes that start in each window is detected (the same way as
+        detect_key_and_scale) and given to the hop-long span at the center of the window. Neighbouring spans with
+        the same key are joined into one segment.
 
-        # determine confidence based on number of 1 - number of errors/ number of notes
-        confidence = 0
-        if num_notes != 0:
-            confidence = 1 - minimum_errors / num_notes
+        The notes in each window are counted from the sorted start times of each pitch class, as the notes that
+        entered the window minus the notes that left it, and the keys of all windows are detected in one call to
+        Key.detect_keys_and_scales. So this takes O(n log n) time for n notes, instead of rescanning the song for
+        every window.
 
-        # set the key of the song
-        self.key = detected_return_key
+        Args:
+            window (int, optional): Length of the window in ticks. Defaults to KEY_WINDOW_BEATS beats.
+            hop (int, optional): Number of ticks the window moves by, which is also the length of the shortest
+                segment. Defaults to KEY_HOP_BEATS beats.
 
-        # return the tuple
-        return detected_return_key, minimum_errors, confidence
+        Raises:
+            ValueError: If window or hop isn't positive
 
-    def detect_key_by_phrase_endings(self):
+        Returns:
+            (int, int, Key, float)[]: The start, end, key and confidence of each segment, in order. Start and end
+            are both inclusive, like the interval of change_song_key. The confidence is the fraction of the notes
+            in the segment that are in its key. Spans whose window has no notes keep the key of the span before
+            them. Empty if the song has no notes (percussion is ignored).
+        """
+        if window is None:
+            window = KEY_WINDOW_BEATS * self.ticks_per_beat
+        if hop is None:
+            hop = KEY_HOP_BEATS * self.ticks_per_beat
+        if window <= 0 or hop <= 0:
+            raise ValueError("window and hop must be positive")
+
+        times = []
+        pitch_classes = []
+        for track in self.tracks:
+            if not track.is_percussion:
+                notes = track.get_note_array()
+                times.append(notes['time'])
+                pitch_classes.append(notes['pitch'] % NUM_NOTES)
+        if sum(len(track_times) for track_times in times) == 0:
+            return []
+        times = np.concatenate(times)
+        pitch_classes = np.concatenate(pitch_classes)
+        # The start times of the notes of each pitch class, sorted
+        onsets = [np.sort(times[pitch_classes == pitch_class]) for pitch_class in range(NUM_NOTES)]
+
+        # The spans cover every note start, and each window is centered on its span
+        first_span = int(times.min()) // hop
+        span_starts = (first_span + np.arange(int(times.max()) // hop - first_span + 1)) * hop
+        window_starts = span_starts - (window - hop) // 2
+        frequencies = _count_pitch_classes(onsets, window_starts, window_starts + window)
+
+        # Detect the key of every window with notes, then give the empty windows the key of the window before them
+        has_notes = frequencies.sum(axis=1) > 0
+        keys = detect_keys_and_scales(frequencies[has_notes])[0]
+        key_indexes = np.cumsum(has_notes) - 1
+        key_indexes[key_indexes < 0] = 0
+
+        segment_starts = []
+        segment_keys = []
+        for span, key_index in enumerate(key_indexes.tolist()):
+            key = keys[key_index]
+            if segment_keys and (segment_keys[-1].tonic, segment_keys[-1].mode) == (key.tonic, key.mode):
+                continue
+            segment_starts.append(int(span_starts[span]))
+            segment_keys.append(key)
+        segment_ends = segment_starts[1:] + [int(span_starts[-1]) + hop]
+
+        # The confidence of each segment, from the notes that start in it
+        segment_frequencies = _count_pitch_classes(onsets, np.array(segment_starts), np.array(segment_ends))
+        rows = [KEY_SCALE_PAIRS.index((key.tonic, key.mode)) for key in segment_keys]
+        errors = (segment_frequencies * SCALE_ERRORS[rows]).sum(axis=1)
+        num_notes = segment_frequencies.sum(axis=1)
+
+        timeline = []
+        for start, end, key, segment_errors, segment_notes in zip(segment_starts, segment_ends, segment_keys,
+                                                                  errors.tolist(), num_notes.tolist()):
+            confidence = 1 - segment_errors / segment_notes if segment_notes > 0 else 0.0
+            timeline.append((start, end - 1, key, confidence))
+        return timeline
+
+    def detect_key_by_phrase_endings(self, report=False):
         """
         Takes the song object and looks at the notes in the melody and bass tracks, and finds the notes with the longest
         pauses after them (likely the ends of melodic phrases). These notes are narrowed down until the set number of
         notes (as a percentage) are found.
+        The pause after every note is computed once, and the shortest pause (in steps of TIME_INTERVAL_INCREASE)
+        that leaves few enough notes is found from the sorted pauses, instead of trying every step in turn.
+        The detected key is set as the key of the song, which pins it (see key).
+        :param report: Whether to build the diagnostic message. It shows the notes found at every step, so it
+        takes much longer to build than the key itself. Defaults to False, in which case the message is empty.
         :return: Three objects in the format [key: Key, message: String, confidence: String]. The message contains
         lots of diagnostic information that explains what's going on behind the scenes, and shows a confidence value.
         Note: If the detected tonic is not a note in the detected scale,
@@ -494,61 +599,37 @@ class Song:
         for track in self.tracks:
             total_song_notes += len(track.notes)
 
-        total_found_notes = total_song_notes
-        # total_found_notes = 0
-
-        # Until you find less than the percentage in PERCENTAGE_TO_FIND
-        while total_found_notes > PERCENTAGE_TO_FIND * total_song_notes and total_found_notes > len(self.tracks):
-
-            total_found_notes = 0
-            time_interval += TIME_INTERVAL_INCREASE
-
-            c_indexed_total_note_frequency = [0] * NUM_NOTES
-            for track in self.tracks:
-                if track.tag == TagEnum.MELODY or track.tag == TagEnum.BASS:
-                    c_indexed_track_note_frequency = [0] * NUM_NOTES
-                    for idx, note in enumerate(track.notes):
-                        if idx != len(track.notes):
-                            # If this note is the last note of the song, or has a long pause after
-
-                            # if idx == len(track.notes) - 1 \
-                            #         or (track.notes[idx].time + track.notes[idx].duration) % \
-                            #         (4 * self.ticks_per_beat) < time_interval:
-                            if idx == len(track.notes) - 1 or track.notes[idx+1].time - note.time > time_interval:
-
-                                total_found_notes += 1
-                                c_indexed_track_note_frequency[note.c_indexed_pitch_class] += 1
-                                # print(track.track_name + " time: " + str(track.notes[idx-1].time) + " pitch: " +
-                                #       str(track.notes[idx-1].c_indexed_pitch_class) + " ch: " + str(track.channel))
-                            # if idx == len(track.notes) - 1:
-                                # print("Last note: " + str(note.c_indexed_pitch_class))
-                    message += (str(c_indexed_track_note_frequency) + ": " + str(track.tag) + " - " +
-                                str(track.track_name) + "\n")
-                    for i in range(12):
-                        c_indexed_total_note_frequency[i] += c_indexed_track_note_frequency[i]
-
-            message += (str(c_indexed_total_note_frequency) + ": totals"  + "\n")
-
-            max_val = 0
-            max_idx = -1
-            for i in range(len(c_indexed_total_note_frequency)):
-                if max_val < c_indexed_total_note_frequency[i]:
-                    max_val = c_indexed_total_note_frequency[i]
-                    max_idx = i
-
-            if total_found_notes == 0:
-                confidence = 0
+        # The pause after each note of the melody and bass tracks, and the note's pitch class. The last note of a
+        # track always ends a phrase, so the pause after it is infinite.
+        endings = []
+        for track in self.tracks:
+            if track.tag == TagEnum.MELODY or track.tag == TagEnum.BASS:
+                notes = track.get_note_array()
+                pauses = np.empty(len(notes))
+                pauses[:-1] = np.diff(notes['time'])
+                pauses[-1:] = np.inf
+                endings.append((track, pauses, notes['pitch'] % NUM_NOTES))
+
+        # Until you find less than the percentage in PERCENTAGE_TO_FIND (or no more notes than there are tracks)
+        if total_song_notes > PERCENTAGE_TO_FIND * total_song_notes and total_song_notes > len(self.tracks):
+            most_found_notes = max(math.floor(PERCENTAGE_TO_FIND * total_song_notes), len(self.tracks))
+            all_pauses = np.sort(np.concatenate([pauses for track, pauses, pitch_classes in endings] + [[]]))
+            # A note is found if the pause after it is longer than the time interval, so the interval has to reach
+            # the longest pause that must be left out
+            if len(all_pauses) > most_found_notes:
+                longest_pause_left_out = float(all_pauses[len(all_pauses) - 1 - most_found_notes])
+                steps = max(1, math.ceil(longest_pause_left_out / TIME_INTERVAL_INCREASE))
             else:
-                confidence = str(c_indexed_total_note_frequency[max_idx] / total_found_notes)
+                steps = 1
+            time_interval = steps * TIME_INTERVAL_INCREASE
 
-            message += ("Detected key: " + KEYS[max_idx] + "\n")
-            message += ("Time interval: " + str(time_interval) + "\n")
-            message += ("Found notes: " + str(total_found_notes) + "\n")
-            message += ("Confidence: " + confidence + "\n")
-            message += ("ticks per beat: " + str(self.ticks_per_beat) + "\n\n")
-
-            # The detected tonic of the song (NOT a Key object yet)
-            detected_tonic = KEYS[max_idx]
+            lines = [] if report else None
+            if report:
+                for interval in range(TIME_INTERVAL_INCREASE, time_interval, TIME_INTERVAL_INCREASE):
+                    self._detect_tonic_by_phrase_endings(endings, interval, lines)
+            detected_tonic, confidence = self._detect_tonic_by_phrase_endings(endings, time_interval, lines)
+            if report:
+                message = "".join(lines)
 
         # Convert detected_key into a Key object with the correct scale
         possible_keys = self.generate_possible_keys_and_scales()[0]
@@ -568,37 +649,59 @@ class Song:
 
         return [detected_key, message, confidence]
 
+    def _detect_tonic_by_phrase_endings(self, endings, time_interval, lines=None):
+        """
+        Counts the pitch classes of the notes that end a phrase, for one time interval of
+        detect_key_by_phrase_endings.
+        :param endings: (track, pauses, pitch classes) for each melody and bass track
+        :param time_interval: Notes with a longer pause after them end a phrase
+        :param lines: If given, the lines of the diagnostic message for this time interval are appended to it
+        :return: The detected tonic (the most common pitch class), and the confidence
+        """
+        c_indexed_total_note_frequency = np.zeros(NUM_NOTES, dtype=np.int64)
+        for track, pauses, pitch_classes in endings:
+            c_indexed_track_note_frequency = np.bincount(pitch_classes[pauses > time_interval], minlength=NUM_NOTES)
+            c_indexed_total_note_frequency += c_indexed_track_note_frequency
+            if lines is not None:
+                lines.append(str(c_indexed_track_note_frequency.tolist()) + ": " + str(track.tag) + " - " +
+                             str(track.track_name) + "\n")
+        total_found_notes = int(c_indexed_total_note_frequency.sum())
+
+        # The first of the most common pitch classes, or the last key if no notes were found
+        max_idx = int(np.argmax(c_indexed_total_note_frequency)) if total_found_notes > 0 else -1
+        if total_found_notes == 0:
+            confidence = 0
+        else:
+            confidence = str(int(c_indexed_total_note_frequency[max_idx]) / total_found_notes)
+
+        if lines is not None:
+            lines.append(str(c_indexed_total_note_frequency.tolist()) + ": totals" + "\n")
+            lines.append("Detected key: " + KEYS[max_idx] + "\n")
+            lines.append("Time interval: " + str(time_interval) + "\n")
+            lines.append("Found notes: " + str(total_found_notes) + "\n")
+            lines.append("Confidence: " + str(confidence) + "\n")
+            lines.append("ticks per beat: " + str(self.ticks_per_beat) + "\n\n")
+
+        # The detected tonic of the song (NOT a Key object yet)
+        return KEYS[max_idx], confidence
+
     def get_chord_names(self):
         """
-        Sets the name field inside chord based on the notes in the chord.
+        Sets the name field inside chord based on the notes in the chord. Chords are looked up in the chord naming
+        table by their pitch classes and the key of the song (see Chord.CHORD_NAME_TABLE).
         """
-        # It would be helpful for us here to have an accidental field on a key to know if its sharp or flat
-        # That's because then you know whether to use the keys or equivalent keys array
-        # I think this should work for all natural keys though
-        # This also doesn't account for diminished chords
-        major = [1, 4, 5]
-        minor = [2, 3, 6]
-        # Gets the key of the song, as an integer
-        key = self.key.get_c_based_index_of_key()
+        name_ids = self._get_chord_name_ids()
         # Iterate over every chord in every track
         for track in self.tracks:
             for chord in track.chords:
-                # Get the name of the first note in the chord which will
-                # commonly be the name of the chord.
-                first_note_index = chord.notes[0].c_indexed_pitch_class
-                first_note_name = KEYS[chord.notes[0].pitch % NUM_NOTES]
-                # The distance between our first note and the key will tell
-                # us if its major or minor.
-                distance_between_notes = first_note_index - key + 1
-                if distance_between_notes in major:
-                    if distance_between_notes == 5 and len(chord.notes) == 4:
-                        chord.name = first_note_name + " Dominant"
-                    else:
-                        chord.name = first_note_name + " Major"
-                else:
-                    chord.name = first_note_name + " Minor"
-                if len(chord.notes) == 4:
-                    chord.name = chord.name + " Seventh"
+                chord.name = CHORD_NAMES[name_ids[chord.mask]]
+
+    def _get_chord_name_ids(self):
+        """
+        Returns:
+            int[]: The index in CHORD_NAMES of the name of every pitch class mask in the key of the song
+        """
+        return CHORD_NAME_TABLE[:, self.key.get_c_based_index_of_key()].tolist()
 
     def get_transition_graph(self, name):
         # TODO: Change the way it iterates through tracks so the chords are always connected by the time
@@ -606,8 +709,6 @@ class Song:
         # Create a directed graph object and set dimensions
         graph = graphviz.Digraph(comment="Chord transitions in Song")
         graph.attr(ranksep='0.01', nodesep='0.1', label=name + " Chord Transitions", labelloc="t")
-        chord_set = set()
-        edges = []
         all_chords = []
         # Iterate over every track in song
         for track in self.tracks:
@@ -616,28 +717,20 @@ class Song:
             all_chords += track.chords
 
         all_chords.sort(key=lambda chord: chord.time)
-        # Hold the previous chord
-        prev_chord = all_chords[0]
-        graph.node(prev_chord.name)
-        chord_set.add(prev_chord.name)
-        # Iterate over every chord in track
-        for i in range(1, len(all_chords)):
-            curr = all_chords[i]
-            # Only add chords that are not already on graph
-            if curr.name not in chord_set:
-                graph.node(curr.name)
-                chord_set.add(curr.name)
-            edges.append([prev_chord.name, curr.name])
-            prev_chord = curr
-
-        counter = collections.Counter(tuple(edge) for edge in edges)
-        for edge, count in counter.items():
-            # print(str(edge[0]), count)
-            graph.edge(str(edge[0]), str(edge[1]), label=str(count))
+        # Chords are counted by the ids of their names, and only turned into names for the graph
+        name_ids = self._get_chord_name_ids()
+        chord_ids = [name_ids[chord.mask] for chord in all_chords]
+        for chord_id in dict.fromkeys(chord_ids):
+            graph.node(CHORD_NAMES[chord_id])
+
+        counter = collections.Counter(zip(chord_ids, chord_ids[1:]))
+        for (prev_id, curr_id), count in counter.items():
+            graph.edge(CHORD_NAMES[prev_id], CHORD_NAMES[curr_id], label=str(count))
         graph.view()
 
     def get_notes_at_time(self, time):
-        """ Returns all the notes in a song that are playing at a given time
+        """ Returns all the notes in a song that are playing at a given time. Uses an index of the notes in the
+        song, so this takes O(log n + k) time for k notes found.
 
         Args:
             time (int): Time to check
@@ -645,10 +738,59 @@ class Song:
         Returns:
             Note[]: array of notes that occur at the given time
         """        
-        notes = []
-        for track in self.tracks:
-            for note in track.notes:
-                if note.time <= time and note.time + note.duration >= time:
-                    notes.append(note)
+        index, notes = self._get_note_index()
+        return [notes[track][position] for track, position in sorted(index.at(time))]
 
-        return notes
+    def get_notes_in_range(self, interval_begin, interval_end):
+        """ Returns all the notes in a song that are playing at any point during a time interval
+
+        Args:
+            interval_begin (int): Start of the time interval
+            interval_end (int): End of the time interval (inclusive)
+
+        Returns:
+            Note[]: array of notes that are playing during the given interval, in the same order as the tracks
+            and notes of the song
+        """
+        index, notes = self._get_note_index()
+        return [notes[track][position] for track, position in sorted(index.overlapping(interval_begin, interval_end))]
+
+    def _get_note_index(self):
+        """ Returns the index of the notes in this song. It is built the first time it is needed, and again if the
+        tracks of the song or their notes changed since then. Notes that were only added to the end of a track
+        (like with Track.add_note) are added to the index instead.
+
+        Returns:
+            The index of the time span of every note [0] (GrowingIntervalIndex), and the notes of each track of the
+            song [1] (Note[][]). The index stores (track, note) positions in the lists of notes.
+        """
+        tracks = tuple(self.tracks)
+        versions = [track.get_notes_version() for track in tracks]
+        if self._note_index is None or self._note_index_version != (tracks, versions):
+            self._note_index = (GrowingIntervalIndex(), [[] for _ in tracks])
+            self._note_index_version = (tracks, versions)
+        index, notes = self._note_index
+        for track_position, track in enumerate(tracks):
+            track_notes = notes[track_position]
+            if len(track.notes) > len(track_notes):
+                added = track.notes[len(track_notes):]
+                # Notes with a negative duration are never playing
+                index.extend((note.time, note.time + note.duration, (track_position, position))
+                             for position, note in enumerate(added, len(track_notes)) if note.duration >= 0)
+                track_notes.extend(added)
+        return self._note_index
+
+
+def _count_pitch_classes(onsets, starts, ends):
+    """ Counts the notes of each pitch class that start in each of a list of time intervals
+
+    Args:
+        onsets (numpy.ndarray[]): The sorted start times of the notes of each pitch class
+        starts (numpy.ndarray): The start of each interval (inclusive)
+        ends (numpy.ndarray): The end of each interval (exclusive)
+
+    Returns:
+        numpy.ndarray: A matrix with one row of 12 c indexed note frequencies per interval
+    """
+    return np.stack([np.searchsorted(pitch_class_onsets, ends) - np.searchsorted(pitch_class_onsets, starts)
+                     for pitch_class_onsets in onsets], axis=1)
@@ -0,0 +1,265 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from Chord import Chord
+from Control import Control
+from Key import Key
+from Note import Note
+from NoteArray import NoteArray, NoteView, notes_to_array
+from Track import Track, TagEnum
+
+# Part of every cache key. Increase it whenever the layout of the cache entries changes, so songs cached by an older
+# version are parsed again instead of being loaded
+LIBRARY_VERSION = 2
+# Modules whose code decides what is read from a MIDI file and how it is analyzed. A hash of their source is also part
+# of every cache key, so any change to reading or analyzing songs makes the old entries unused
+ANALYSIS_MODULES = ('Chord', 'Control', 'FileIO', 'IntervalIndex', 'Key', 'Note', 'NoteArray', 'Scale', 'Song',
+                    'SongCache', 'Track')
+# Where songs are cached if no directory is given
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'janus', 'songs')
+# The cache deletes the least recently used songs when its files take up more than this many bytes
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# When the cache grows past its maximum size, songs are deleted until it is down to this fraction of it, so the next
+# songs stored don't make it scan the directory again right away
+EVICTION_TARGET = 0.9
+# File extension of the cache entries
+ENTRY_EXTENSION = '.song'
+# Hash of the source of ANALYSIS_MODULES, set by get_code_hash
+_code_hash = None
+
+
+class SongCache:
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        """ An on-disk cache of parsed and analyzed songs, used by Song.load. Each entry holds the tracks, notes,
+        controls, chords, tags and key of one MIDI file, and is found using a hash of the file's contents, so an
+        edited file is never loaded from an old entry. Loading a song from the cache doesn't use mido at all.
+
+        Args:
+            directory (String, optional): Directory to store the cached songs in. Created if it doesn't exist.
+                Defaults to DEFAULT_CACHE_DIRECTORY.
+            max_size (int, optional): Maximum total size of the cached songs in bytes. Defaults to
+                DEFAULT_MAX_SIZE.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        # Total size of the cached songs in bytes, counted by the first store and then kept up to date by this
+        # object. Songs stored by other processes are only counted the next time the directory is scanned (see
+        # evict)
+        self._size = None
+
+    def get_key(self, filename):
+        """
+        Args:
+            filename (String): Path of a MIDI file
+
+        Returns:
+            String: The key of the file's cache entry, made from the hash of its contents, LIBRARY_VERSION and the
+            hash of the analysis code (see get_code_hash)
+        """
+        with open(filename, 'rb') as file:
+            digest = hashlib.sha1(file.read()).hexdigest()
+        return digest + '-' + str(LIBRARY_VERSION) + '-' + get_code_hash()
+
+    def load(self, song, key, columnar=False):
+        """ Fills a song with the cached song with the given key, if there is one
+
+        Args:
+            song (Song): The song to load into. Its previous data is overwritten.
+            key (String): Cache key of the song (see get_key)
+            columnar (bool, optional): Whether to store the notes of each track in a NoteArray. Defaults to False.
+
+        Returns:
+            bool: True if the song was in the cache, False if it wasn't (the song is left unchanged)
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        # Mark the entry as recently used, so it is the last to be evicted
+        os.utime(path)
+
+        song.clear_song_data()
+        song.ticks_per_beat = entry['ticks_per_beat']
+        for track_entry in entry['tracks']:
+            song.add_track(_unpack_track(track_entry, columnar))
+        song.use_detected_key(Key(*entry['key']) if entry['key'] is not None else None)
+        return True
+
+    def store(self, song, key):
+        """ Saves a song in the cache. If that makes the cache larger than max_size, the least recently used songs
+        are evicted until it is down to EVICTION_TARGET of max_size. The size of the cache is kept in memory, so
+        the directory is only scanned when songs need to be evicted.
+
+        Args:
+            song (Song): The song to save
+            key (String): Cache key of the song (see get_key)
+        """
+        entry = {'ticks_per_beat': song.ticks_per_beat,
+                 'key': (song.key.tonic, song.key.mode) if song.key is not None else None,
+                 'tracks': [_pack_track(track) for track in song.tracks]}
+        # Write to a temporary file first, so other processes never read a partly written entry
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(file_descriptor, 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            size = file.tell()
+        path = self._get_path(key)
+        if self._size is not None:
+            # An entry that is replaced (like one stored by another process meanwhile) stops counting
+            try:
+                self._size -= os.path.getsize(path)
+            except OSError:
+                pass
+        os.replace(temporary_path, path)
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += size
+        if self._size > self.max_size:
+            self.evict(int(self.max_size * EVICTION_TARGET))
+
+    def evict(self, target_size=None):
+        """ Deletes the least recently used songs until the cache is no larger than the target size
+
+        Args:
+            target_size (int, optional): The size in bytes to shrink the cache to. Defaults to max_size.
+        """
+        if target_size is None:
+            target_size = self.max_size
+        entries, total_size = self._scan()
+        entries.sort()
+        for last_used, size, name in entries:
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total_size -= size
+        self._size = total_size
+
+    def _scan(self):
+        """
+        Returns:
+            The (last used time, size, file name) of every song in the cache [0], and their total size in bytes [1]
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_EXTENSION):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total_size += stat.st_size
+        return entries, total_size
+
+    def clear(self):
+        """ Deletes every song in the cache
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_EXTENSION):
+                os.remove(os.path.join(self.directory, name))
+        self._size = 0
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+
+def get_code_hash():
+    """
+    Returns:
+        String: A short hash of the source of ANALYSIS_MODULES. It is computed once and then reused.
+    """
+    global _code_hash
+    if _code_hash is None:
+        code_hash = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in ANALYSIS_MODULES:
+            code_hash.update(module.encode())
+            try:
+                with open(os.path.join(directory, module + '.py'), 'rb') as file:
+                    code_hash.update(file.read())
+            except OSError:
+                # Without the source (like in a frozen install), only LIBRARY_VERSION tells the versions apart
+                pass
+        _code_hash = code_hash.hexdigest()[:12]
+    return _code_hash
+
+
+def _pack_track(track):
+    """ Converts a track into plain data that can be pickled quickly. Notes are stored as rows of a NumPy array,
+    and chords as the indexes of their notes (chord notes that aren't in the track are stored after its notes).
+
+    Args:
+        track (Track): The track to convert
+
+    Returns:
+        dict: The data of the track
+    """
+    notes = list(track.notes)
+    rows = {_identify(note): i for i, note in enumerate(notes)}
+    extra_notes = []
+    chords = []
+    for chord in track.chords:
+        indexes = []
+        for note in chord.notes:
+            row = rows.get(_identify(note))
+            if row is None:
+                row = len(notes) + len(extra_notes)
+                extra_notes.append(note)
+            indexes.append(row)
+        chords.append((chord.name, chord.time, indexes))
+
+    return {'track_name': track.track_name, 'device_name': track.device_name, 'channel': track.channel,
+            'tag': track.tag.value, 'num_notes': len(notes), 'notes': notes_to_array(notes + extra_notes),
+            'controls': [(c.msg_type, c.tempo, c.control, c.value, c.instrument, c.time) for c in track.controls],
+            'chords': chords}
+
+
+def _unpack_track(entry, columnar):
+    """ Rebuilds a track converted by _pack_track
+
+    Args:
+        entry (dict): The data of the track
+        columnar (bool): Whether to store the notes of the track in a NoteArray
+
+    Returns:
+        Track: The track
+    """
+    rows = entry['notes']
+    num_notes = entry['num_notes']
+    if columnar:
+        notes = NoteArray(rows[:num_notes])
+        extra_notes = [Note(*row) for row in rows[num_notes:].tolist()]
+    else:
+        notes = [Note(*row) for row in rows.tolist()]
+        extra_notes = notes[num_notes:]
+        del notes[num_notes:]
+
+    chords = [Chord(notes=[notes[i] if i < num_notes else extra_notes[i - num_notes] for i in indexes], name=name,
+                    time=time) for name, time, indexes in entry['chords']]
+    controls = [Control(msg_type=msg_type, tempo=tempo, control=control, value=value, instrument=instrument,
+                        time=time) for msg_type, tempo, control, value, instrument, time in entry['controls']]
+    track = Track(notes=notes, controls=controls, track_name=entry['track_name'], device_name=entry['device_name'],
+                  chords=chords, channel=entry['channel'])
+    track.use_detected_tag(TagEnum(entry['tag']))
+    return track
+
+
+def _identify(note):
+    """
+    Returns:
+        The same value for every object that refers to the same note. NoteViews are created whenever a note is
+        taken out of a NoteArray, so they are identified by their array and slot instead of by the object.
+    """
+    if isinstance(note, NoteView):
+        return id(note.notes), note.slot
+    return id(note)
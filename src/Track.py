@@ -1,6 +1,13 @@
+import hashlib
 import logging
+from array import array
+
+import numpy as np
 
 import Note
+from Arrangement import Arrangement
+from NoteArray import NoteArray, notes_to_array
+from TrackList import TrackList
 from enum import Enum
 
 # The channel percussion information will be on
@@ -9,11 +16,14 @@ PERCUSSION_CHANNEL = 9
 BASS_AVERAGE = 45
 # The chord to note ratio required to classify a track as "chords"
 CHORD_PERCENTAGE = 0.15
+# The fields of the notes that are compared by Track.equals, and hashed by Track.get_fingerprint
+FINGERPRINT_NOTE_FIELDS = ('pitch', 'time', 'duration', 'velocity', 'channel')
 
 
 class Track:
 
-    def __init__(self, notes=None, controls=None, track_name="", device_name="", chords=None, channel=0):
+    def __init__(self, notes=None, controls=None, track_name="", device_name="", chords=None, channel=0,
+                 columnar=False):
         """ Constructor for the Track object
 
         Args:
@@ -23,6 +33,8 @@ class Track:
             device_name (String, optional): Instrument used on this track. Defaults to None.
             chords (Chord[], optional): A list of chord objects present in this track
             channel (int, optional): Channel of this track. Defaults to 0.
+            columnar (bool, optional): Whether to store the notes in a NoteArray (see to_columnar) instead of a
+                list of Note objects. Defaults to False.
         """        
         if notes is None:
             notes = []
@@ -32,26 +44,140 @@ class Track:
         # but are not necessarily "events" in the file. These can occur at any point during a song
         if controls is None:
             controls = []
+        # Incremented by mark_modified
+        self._version = 0
         self.notes = notes
         self.controls = controls
         self.track_name = track_name
         self.device_name = device_name
         self.channel = channel
         self.chords = chords
-        self.tag = TagEnum.NONE
+        # The tag is either set directly (see the tag property), or detected from the notes when it is first
+        # needed and detected again whenever the track changes (see use_detected_tag)
+        self._tag = TagEnum.NONE
+        self._tag_detected = False
+        self._tag_version = None
+        # Totals of the notes and controls of this track (see _get_aggregates), and the version they were taken at
+        self._aggregates = None
+        self._aggregates_version = None
+        # The fingerprint of this track (see get_fingerprint), and the version and fields it was taken at
+        self._fingerprint = None
+        self._fingerprint_version = None
 
         if channel is PERCUSSION_CHANNEL:
             self.is_percussion = True
         else:
             self.is_percussion = False
 
+        if columnar:
+            self.to_columnar()
+
+    @property
+    def notes(self):
+        """
+        Returns:
+            Note[]: The notes of this track (a list, or a NoteArray for columnar tracks)
+        """
+        return self._notes
+
+    @notes.setter
+    def notes(self, notes):
+        self._notes = notes if isinstance(notes, (NoteArray, TrackList)) else TrackList(notes)
+        self.mark_modified()
+
+    @property
+    def controls(self):
+        """
+        Returns:
+            Control[]: The control messages of this track
+        """
+        return self._controls
+
+    @controls.setter
+    def controls(self, controls):
+        self._controls = controls if isinstance(controls, TrackList) else TrackList(controls)
+        self.mark_modified()
+
+    @property
+    def chords(self):
+        """
+        Returns:
+            Chord[]: The chords of this track
+        """
+        return self._chords
+
+    @chords.setter
+    def chords(self, chords):
+        self._chords = chords if isinstance(chords, TrackList) else TrackList(chords)
+        self.mark_modified()
+
+    def mark_modified(self):
+        """ Makes the results cached from the notes of this track, by this track or by the song it is in, be
+        recalculated the next time they are needed. Changes to notes, controls and the lists holding them are
+        noticed without calling this method; it is only needed after writing to the storage of a NoteArray
+        directly.
+        """
+        self._version += 1
+
+    def get_version(self):
+        """ Returns a value that changes whenever the notes, chords or controls of this track change, including
+        edits of single notes and controls in place (see TrackList). Only changes to this track change it, so
+        results cached from other tracks stay valid. Used to tell if cached results are stale.
+
+        Returns:
+            tuple: The current version of this track
+        """
+        return self._version, self._notes.version, self._chords.version, self._controls.version
+
+    def get_notes_version(self):
+        """ Returns a value that changes whenever the notes of this track change, except when notes are only added
+        to the end (see TrackList.appended). With the number of notes, this tells which notes were added since an
+        earlier version.
+
+        Returns:
+            tuple: The current version of the notes of this track
+        """
+        return self._version, self._notes.version - self._notes.appended
+
+    def to_columnar(self):
+        """ Moves the notes of this track into a NoteArray, which stores them as NumPy columns instead of Note
+        objects and takes a fraction of the memory. track.notes keeps working like a list of notes. The notes of
+        each chord in this track are replaced by views of the same notes in the array, so chords and the track
+        keep sharing their notes.
+        """
+        if isinstance(self.notes, NoteArray):
+            return
+        notes = NoteArray(self.notes)
+        rows = {id(note): i for i, note in enumerate(self.notes)}
+        for chord in self.chords:
+            chord.notes = [notes[rows[id(note)]] if id(note) in rows else note for note in chord.notes]
+        self.notes = notes
+
+    def get_note_array(self):
+        """ Returns the notes of this track as a NumPy structured array with the fields pitch, time, duration,
+        velocity, channel and chord_note (see NoteArray.NOTE_DTYPE).
+
+        Returns:
+            numpy.ndarray: The notes of this track, in order. For columnar tracks this is a read-only view of the
+            stored notes (see NoteArray.edit_columns), otherwise it is a new array.
+        """
+        if isinstance(self.notes, NoteArray):
+            return self.notes.columns
+        return notes_to_array(self.notes)
+
     def add_note(self, note=None):
-        """ Adds a note to the end of this track
+        """ Adds a note to the end of this track. The totals of the track are updated instead of being taken again.
 
         Args:
             note (Note): Note to append to the song. Defaults to None.
-        """        
+        """
+        up_to_date = self._aggregates is not None and self._aggregates_version == self.get_version()
         self.notes.append(note)
+        if up_to_date:
+            frequencies, pitch_total, end_time = self._aggregates
+            frequencies[note.c_indexed_pitch_class] += 1
+            self._aggregates = (frequencies, pitch_total + note.pitch, max(end_time, note.time + note.duration))
+            self._aggregates_version = self.get_version()
 
     def add_chord(self, chord=None):
         """ Adds a chord to the track array
@@ -59,7 +185,10 @@ class Track:
         Args:
             chord (Chord): Note to append to the song. Defaults to None.
         """
+        up_to_date = self._aggregates is not None and self._aggregates_version == self.get_version()
         self.chords.append(chord)
+        if up_to_date:
+            self._aggregates_version = self.get_version()
 
     def get_c_indexed_note_frequencies(self):
         """ Returns an array representing each note's number of appearances in this track, starting
@@ -67,13 +196,73 @@ class Track:
 
         Returns:
             int[]: Note frequencies array
-        """        
-        c_indexed_frequencies = [0] * Note.NUM_NOTES
+        """
+        return list(self._get_aggregates()[0])
 
-        for note in self.notes:
-            c_indexed_frequencies[note.c_indexed_pitch_class] += 1
+    def _get_aggregates(self):
+        """ Returns totals of the notes and controls of this track, taking them again only if the track changed
+        since they were last taken (see get_version). Notes added with add_note are added to the totals.
+
+        Returns:
+            The number of notes of each c indexed pitch class [0] (int[]), the sum of the pitches of the notes [1]
+            (int), and the time the last note ends or the last control happens [2] (int, at least 0)
+        """
+        version = self.get_version()
+        if self._aggregates is None or self._aggregates_version != version:
+            if isinstance(self.notes, NoteArray):
+                columns = self.notes.columns
+                pitches = columns['pitch'].astype(np.int64)
+                frequencies = np.bincount(pitches % Note.NUM_NOTES, minlength=Note.NUM_NOTES).tolist()
+                pitch_total = int(pitches.sum())
+                end_time = int((columns['time'] + columns['duration']).max(initial=0))
+            else:
+                frequencies = [0] * Note.NUM_NOTES
+                pitch_total = 0
+                end_time = 0
+                for note in self.notes:
+                    frequencies[note.c_indexed_pitch_class] += 1
+                    pitch_total += note.pitch
+                    if note.time + note.duration > end_time:
+                        end_time = note.time + note.duration
+            for control in self.controls:
+                if control.time > end_time:
+                    end_time = control.time
+            self._aggregates = (frequencies, pitch_total, end_time)
+            self._aggregates_version = version
+        return self._aggregates
+
+    @property
+    def tag(self):
+        """
+        Returns:
+            TagEnum: The role of this track in the song. Tracks read from a file detect their tag (see
+            detect_tag) the first time it is needed, and again after their notes change.
+        """
+        if self._tag_detected:
+            version = (self.get_version(), self.channel)
+            if version != self._tag_version:
+                self._tag = self.detect_tag()
+                self._tag_version = version
+        return self._tag
+
+    @tag.setter
+    def tag(self, tag):
+        self._tag = tag
+        self._tag_detected = False
+
+    def use_detected_tag(self, tag=None):
+        """ Makes the tag of this track follow its notes: it is detected the next time it is needed, and again
+        whenever the notes of the track change.
 
-        return c_indexed_frequencies
+        Args:
+            tag (TagEnum, optional): The tag already detected for the current notes, if it is known (for example
+                when the track was cached). Defaults to None.
+        """
+        self._tag_detected = True
+        self._tag_version = None
+        if tag is not None:
+            self._tag = tag
+            self._tag_version = (self.get_version(), self.channel)
 
     def generate_tags(self):
         """ Sets 'tag' field in the song to the appropriate tag based on its attributes
@@ -81,23 +270,29 @@ class Track:
         dramatically change roles during the song (ex, switch from guitar track to vocal
         track)
 
+        """
+        self.tag = self.detect_tag()
+
+    def detect_tag(self):
+        """ Finds the appropriate tag for this track based on its attributes (see generate_tags)
+
+        Returns:
+            TagEnum: The tag of this track
         """
         if len(self.notes) == 0:
-            self.tag = TagEnum.NONE
+            return TagEnum.NONE
 
         elif self.channel is PERCUSSION_CHANNEL:
-            self.tag = TagEnum.PERCUSSION
+            return TagEnum.PERCUSSION
 
         else:
-            pitch_total = 0
-            for note in self.notes:
-                pitch_total += note.pitch
+            pitch_total = self._get_aggregates()[1]
             if pitch_total / len(self.notes) < BASS_AVERAGE:
-                self.tag = TagEnum.BASS      # If the average note pitch is lower than BASS_AVERAGE
+                return TagEnum.BASS      # If the average note pitch is lower than BASS_AVERAGE
             elif len(self.chords) > CHORD_PERCENTAGE * len(self.notes):
-                self.tag = TagEnum.CHORDS
+                return TagEnum.CHORDS
             else:
-                self.tag = TagEnum.MELODY    # If nothing else fits, this is likely a melody track
+                return TagEnum.MELODY    # If nothing else fits, this is likely a melody track
 
     def get_all_chords(self):
         """
@@ -123,43 +318,16 @@ class Track:
         :return: A new track with the contents of the two tracks played consecutively.
         """
 
-        if track is None:
-            raise AttributeError("Track must not be None")
-
-        last_event_time = 0
-        for note in self.notes:
-            if note.time + note.duration > last_event_time:
-                last_event_time = note.time + note.duration
-        for control in self.controls:
-            if control.time > last_event_time:
-                last_event_time = control.time
-
-        new_self = self.duplicate_track()
-        new_track = track.duplicate_track()
-
-        for note in new_track.notes:
-            if not note.chord_note:
-                note.time += last_event_time
-                new_self.notes.append(note)
-
-        for control in new_track.controls:
-            control.time += last_event_time
-            new_self.controls.append(control)
-
-        for chord in new_track.chords:
-            chord.time += last_event_time
-            new_self.chords.append(chord)
-
-            for note in chord.notes:
-                note.time += last_event_time
-                new_self.notes.append(note)
-
-        return new_self
+        arrangement = Arrangement(self)
+        arrangement.append(track)
+        return arrangement.render()
 
     def append_tracks(self, pattern=None, sections=None):
         """Takes a pattern as an array of ints (Ex. [0, 0, 1, 1, 2, 1, 0]) and strings together
         tracks (supplied in sections) in the pattern given. For example, if the given pattern is [0, 1, 2, 1, 0] and
         the given sections are in the format [a, b, c], this will return a new track with the structure (a b c b a).
+        The sections are placed in an Arrangement and copied into the new track once, so this takes time linear in
+        the length of the new track.
 
         Params:
         pattern: An array of ints used to dictate the pattern of tracks to return. The highest value must be less
@@ -171,11 +339,17 @@ class Track:
         Returns:
             A new track with the given sections attached to it in the given pattern.
         """
-        new_track = self.duplicate_track()
-        for i in range(len(pattern)):
-            new_track = new_track.append_track(sections[pattern[i]])
+        arrangement = Arrangement(self)
+        arrangement.extend(pattern, sections)
+        return arrangement.render()
 
-        return new_track
+    def get_end_time(self):
+        """
+        Returns:
+            int: The time the last note of this track ends, or the last control happens if that is later. 0 for an
+            empty track.
+        """
+        return self._get_aggregates()[2]
 
     def duplicate_track(self):
         """
@@ -200,19 +374,64 @@ class Track:
                 notes.append(note.duplicate_note())
 
         return Track(notes=notes, controls=controls, track_name=self.track_name, device_name=self.device_name,
-                     chords=chords, channel=self.channel)
+                     chords=chords, channel=self.channel, columnar=isinstance(self.notes, NoteArray))
+
+    def get_fingerprint(self):
+        """ Returns a hash of everything equals compares: the channel, track name and device name of this track,
+        and the fields of its controls and notes. Tracks with the same fingerprint are equal (barring hash
+        collisions), so fingerprints can be used to find duplicate tracks. The fingerprint is cached until the
+        track changes (see get_version).
+
+        Returns:
+            String: The fingerprint, as a hexadecimal string
+        """
+        if not self._has_fingerprint():
+            fingerprint = hashlib.blake2b(digest_size=16)
+            fingerprint.update(repr((self.channel, self.track_name, self.device_name)).encode())
+            fingerprint.update(repr([(control.msg_type, control.control, control.value, control.tempo,
+                                      control.instrument, control.time) for control in self.controls]).encode())
+            # Each field of the notes is hashed as raw 64 bit integers, which is much faster than hashing text
+            for field in FINGERPRINT_NOTE_FIELDS:
+                if isinstance(self.notes, NoteArray):
+                    fingerprint.update(self.notes.columns[field].astype(np.int64).tobytes())
+                    continue
+                values = [getattr(note, field) for note in self.notes]
+                try:
+                    fingerprint.update(array('q', values).tobytes())
+                except (TypeError, OverflowError):
+                    # Not all 64 bit integers, so hash the text instead (and keep it apart from the integers)
+                    fingerprint.update(b'repr' + repr(values).encode())
+            self._fingerprint = fingerprint.hexdigest()
+            self._fingerprint_version = self._get_fingerprint_version()
+        return self._fingerprint
+
+    def _has_fingerprint(self):
+        """
+        Returns:
+            bool: Whether the cached fingerprint of this track is up to date
+        """
+        return self._fingerprint is not None and self._fingerprint_version == self._get_fingerprint_version()
+
+    def _get_fingerprint_version(self):
+        return self.get_version(), self.channel, self.track_name, self.device_name
 
     def equals(self, track):
         """
         Returns true if these two tracks are equal. If they are not equal, prints an info log message with more details
-        and return false
+        and return false. If both tracks already have an up to date fingerprint (see get_fingerprint), equal
+        fingerprints are enough to tell the tracks are equal. Fingerprints are up to date only if nothing was edited
+        since they were taken, including single notes and controls (see get_version). Otherwise the fields are
+        compared one by one, which is faster than hashing them.
 
         :param track: The track to compare this track to
         :return: True, if the contents of the track are equal. False otherwise.
         """
+        if self._has_fingerprint() and track._has_fingerprint() and self.get_fingerprint() == track.get_fingerprint():
+            return True
+
         if self.channel != track.channel:
             logging.info(msg="tracks " + track.track_name + " have different channel values")
-            logging.info(msg="This: " + self.channel + ", compare to: " + track.channel)
+            logging.info(msg="This: " + str(self.channel) + ", compare to: " + str(track.channel))
             return False
 
         if self.track_name != track.track_name:
@@ -270,7 +489,7 @@ class Track:
 
         if len(self.notes) != len(track.notes):
             logging.info(msg="tracks " + track.track_name + " have different numbers of notes")
-            logging.info(msg="This: " + str(len(track.notes)) + ", compare to: " + str(len(track.notes)))
+            logging.info(msg="This: " + str(len(self.notes)) + ", compare to: " + str(len(track.notes)))
             return False
 
         for j, note in enumerate(self.notes):
@@ -0,0 +1,99 @@
+class TrackList(list):
+    """ The list holding the notes, controls or chords of a track (or the notes of a chord). It keeps a version
+    number that changes whenever the list changes, and also whenever a note or control in it is changed in place:
+    notes and controls keep a reference to the lists they are in, and tell them when one of their fields is set
+    (see Note.notify_owners). The version of one list only changes with its own items, so editing one track doesn't
+    affect results cached from the others. Items removed from the list keep their reference to it, so changing
+    them afterwards still changes its version; this only makes cached results be recalculated once more.
+    """
+    __slots__ = ('version', 'appended')
+
+    def __init__(self, items=()):
+        list.__init__(self, items)
+        # Incremented by every change. 'appended' counts the changes that only added items to the end, so
+        # 'version - appended' only changes when items already in the list change
+        self.version = 0
+        self.appended = 0
+        for item in self:
+            self._adopt(item)
+
+    def __reduce__(self):
+        return TrackList, (list(self),)
+
+    def _adopt(self, item):
+        """ Makes a note or control tell this list when it changes. Other items are ignored.
+        """
+        try:
+            owners = item._owners
+        except AttributeError:
+            return
+        if owners is None:
+            object.__setattr__(item, '_owners', self)
+        elif owners is not self:
+            if type(owners) is not tuple:
+                owners = (owners,)
+            if not any(owner is self for owner in owners):
+                object.__setattr__(item, '_owners', owners + (self,))
+
+    def append(self, item):
+        list.append(self, item)
+        self._adopt(item)
+        self.version += 1
+        self.appended += 1
+
+    def extend(self, items):
+        items = list(items)
+        list.extend(self, items)
+        for item in items:
+            self._adopt(item)
+        self.version += 1
+        self.appended += 1
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, index, item):
+        list.insert(self, index, item)
+        self._adopt(item)
+        self.version += 1
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            for item in value:
+                self._adopt(item)
+        else:
+            self._adopt(value)
+        list.__setitem__(self, index, value)
+        self.version += 1
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.version += 1
+
+    def __imul__(self, count):
+        list.__imul__(self, count)
+        self.version += 1
+        return self
+
+    def pop(self, index=-1):
+        item = list.pop(self, index)
+        self.version += 1
+        return item
+
+    def remove(self, item):
+        list.remove(self, item)
+        self.version += 1
+
+    def clear(self):
+        list.clear(self)
+        self.version += 1
+
+    def sort(self, *, key=None, reverse=False):
+        list.sort(self, key=key, reverse=reverse)
+        self.version += 1
+
+    def reverse(self):
+        list.reverse(self)
+        self.version += 1
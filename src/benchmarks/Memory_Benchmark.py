@@ -0,0 +1,129 @@
+"""
+    Memory benchmark for the song model. Every MIDI file in the 'MIDI Files' corpus is loaded and kept alive, and
+    the memory allocated while loading is divided by the number of notes in the corpus, once with tracks of Note
+    objects and once with columnar tracks (NoteArray).
+
+    Note, Control and Chord store their fields in slots. To show what that saves, the notes, controls and chords of
+    the corpus are also copied into plain classes with a __dict__ (the way the model classes used to be written),
+    and the memory taken by those copies is compared with the memory taken by copies made with the model classes.
+
+    Run this from the src/benchmarks directory.
+"""
+import gc
+import os
+import tracemalloc
+
+import FileIO
+from Chord import Chord
+from Control import Control
+from Note import Note
+from Song import Song
+
+CORPUS_DIRECTORY = "../../MIDI Files"
+
+
+class DictNote:
+
+    def __init__(self, pitch, time, duration, velocity, channel, chord_note):
+        self.pitch = pitch
+        self.time = time
+        self.duration = duration
+        self.velocity = velocity
+        self.channel = channel
+        self.chord_note = chord_note
+
+
+class DictControl:
+
+    def __init__(self, msg_type, tempo, control, value, instrument, time):
+        self.msg_type = msg_type
+        self.tempo = tempo
+        self.control = control
+        self.value = value
+        self.instrument = instrument
+        self.time = time
+
+
+class DictChord:
+
+    def __init__(self, notes, name, time):
+        self.notes = notes
+        self.name = name
+        self.time = time
+
+
+def find_corpus_files():
+    file_paths = []
+    for (dirpath, dirnames, filenames) in os.walk(CORPUS_DIRECTORY):
+        dirnames.sort()
+        for file in sorted(filenames):
+            if os.path.splitext(file)[1] == ".mid":
+                file_paths.append(os.path.join(dirpath, file))
+    return file_paths
+
+
+def measure(function):
+    """
+    Returns:
+        The result of calling function [0], and the number of bytes it allocated that are still in use [1]
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, used
+
+
+def load_corpus(file_paths, columnar):
+    songs = []
+    for file_path in file_paths:
+        song = Song()
+        song.load(file_path, columnar=columnar, analyze=False)
+        songs.append(song)
+    return songs
+
+
+def copy_objects(songs, note_class, control_class, chord_class):
+    """ Copies every note, control and chord of the songs into objects of the given classes
+    """
+    copies = []
+    for song in songs:
+        for track in song.tracks:
+            copies.append([note_class(note.pitch, note.time, note.duration, note.velocity, note.channel,
+                                      note.chord_note) for note in track.notes])
+            copies.append([control_class(control.msg_type, control.tempo, control.control, control.value,
+                                         control.instrument, control.time) for control in track.controls])
+            copies.append([chord_class(list(chord.notes), chord.name, chord.time) for chord in track.chords])
+    return copies
+
+
+file_paths = find_corpus_files()
+songs, object_memory = measure(lambda: load_corpus(file_paths, columnar=False))
+num_notes = sum(len(track.notes) for song in songs for track in song.tracks)
+num_controls = sum(len(track.controls) for song in songs for track in song.tracks)
+num_chords = sum(len(track.chords) for song in songs for track in song.tracks)
+
+slotted, slotted_memory = measure(lambda: copy_objects(songs, Note, Control, Chord))
+del slotted
+unslotted, unslotted_memory = measure(lambda: copy_objects(songs, DictNote, DictControl, DictChord))
+del unslotted
+del songs
+columnar_songs, columnar_memory = measure(lambda: load_corpus(file_paths, columnar=True))
+del columnar_songs
+
+print("Files: " + str(len(file_paths)) + ", notes: " + str(num_notes) + ", controls: " + str(num_controls) +
+      ", chords: " + str(num_chords))
+print()
+print("Loaded corpus, Note objects:        %8.1f MB  %6.1f bytes/note" % (object_memory / 1e6,
+                                                                            object_memory / num_notes))
+print("Loaded corpus, columnar notes:      %8.1f MB  %6.1f bytes/note" % (columnar_memory / 1e6,
+                                                                            columnar_memory / num_notes))
+print()
+print("Notes, controls and chords only:")
+print("  with a __dict__ (before):         %8.1f MB  %6.1f bytes/note" % (unslotted_memory / 1e6,
+                                                                            unslotted_memory / num_notes))
+print("  with __slots__ (after):           %8.1f MB  %6.1f bytes/note" % (slotted_memory / 1e6,
+                                                                            slotted_memory / num_notes))
+print("  saved:                            %8.1f %%" % (100 * (1 - slotted_memory / unslotted_memory)))
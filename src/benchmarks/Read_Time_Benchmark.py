@@ -0,0 +1,47 @@
+"""
+    Benchmark for FileIO.read_midi_file. Every MIDI file in the 'MIDI Files' corpus is read a few times and the
+    best parse time is compared against the number of events (messages) in the file. If reading is linear in the
+    number of events, the time per event stays roughly constant and the slope of log(time) against log(events)
+    is close to 1. A quadratic reader would give a slope close to 2.
+
+    Run this from the src/benchmarks directory.
+"""
+import os
+import time
+
+import numpy as np
+from mido import MidiFile
+
+import FileIO
+from Song import Song
+
+CORPUS_DIRECTORY = "../../MIDI Files"
+REPEATS = 3
+
+results = []
+for (dirpath, dirnames, filenames) in os.walk(CORPUS_DIRECTORY):
+    for file in sorted(filenames):
+        if os.path.splitext(file)[1] != ".mid":
+            continue
+        file_path = os.path.join(dirpath, file)
+        num_events = sum(len(track) for track in MidiFile(file_path).tracks)
+
+        best_time = float('inf')
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            FileIO.read_midi_file(Song(), file_path)
+            best_time = min(best_time, time.perf_counter() - start)
+        results.append((num_events, best_time, file))
+
+results.sort()
+for num_events, parse_time, file in results:
+    print("%8d events  %8.2f ms  %6.2f us/event  %s" % (num_events, parse_time * 1000,
+                                                     parse_time * 1e6 / num_events, file))
+
+events = np.array([r[0] for r in results], dtype=float)
+times = np.array([r[1] for r in results])
+slope = np.polyfit(np.log(events), np.log(times), 1)[0]
+print()
+print("Files: " + str(len(results)) + ", events: " + str(int(events.sum())) + ", total time: %.2f s" % times.sum())
+print("Time per event: %.2f us (median)" % np.median(times * 1e6 / events))
+print("Slope of log(time) against log(events): %.2f (1.0 is linear)" % slope)
@@ -1,11 +1,23 @@
 from __future__ import division
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+import logging
+import os
 import sys
 
 from Track import Track, TagEnum
 from Note import Note, NUM_NOTES
 import numpy as py
 from Control import Control
+from Song import Song
+from Chord import mask_from_string, mask_to_string
+
+
+# Version of the file format written by DynamicMarkovChain.save
+FILE_FORMAT_VERSION = 3
+# The arrays save writes for the counts of the tokens of each length (see _pack_counts)
+PACKED_ARRAYS = ('states', 'state_offsets', 'successors', 'successor_offsets', 'counts', 'thresholds', 'aliases',
+                 'keys', 'key_rows')
 
 
 class chainType(Enum):
@@ -13,6 +25,11 @@ class chainType(Enum):
     CHORD = 1
 
 
+class EmptySongError(AttributeError):
+    """ Raised when a song has no notes (or chords) for a chain to learn from
+    """
+
+
 class DynamicMarkovChain:
 
     def __init__(self, name, chain_type=chainType.NOTE, token_length=1):
@@ -26,20 +43,372 @@ class DynamicMarkovChain:
         self.name = name
         self.token_length = token_length
         self.chain_type = chain_type
-        self.probabilities = {}
+        # Every note (c indexed pitch class) or chord (pitch class mask, Chord.mask) seen so far, in the order it was
+        # first seen. Tokens are stored as tuples of indexes into this list instead of strings
+        self.symbols = []
+        # The index of each note or chord in self.symbols
+        self.symbol_ids = {}
+        # The counts of the tokens (see transitions and backoff). A chain read with load keeps them in the arrays of
+        # the file instead (see _PackedCounts), and only builds the dictionaries when they are needed
+        self._transitions = {}
+        self._backoff = {}
+        self._packed = None
+        # Maps a token to the (symbol ids, probabilities, alias thresholds, aliases) that follow it, computed from the
+        # counts when first needed. Training removes the entries of the tokens it changes, so only those get
+        # computed again
+        self.distributions = {}
+        # Every token in self.transitions, used to pick a random token. Set to None when a new token is added
+        self.states = None
+
+    @property
+    def transitions(self):
+        """ Maps a token (a tuple of 'token_length' symbol ids) to a dictionary of {next symbol id: number of times
+        it followed the token}. These are exact counts, so training on more songs just adds to them.
+
+        Returns:
+            dict(tuple(int):dict(int:int)): The counts of the tokens
+        """
+        if self._transitions is None:
+            self._unpack()
+        return self._transitions
+
+    @property
+    def backoff(self):
+        """ The same counts as transitions for the shorter tokens made of the last 0 to 'token_length' - 1 symbols
+        of each token. They are used when generating from a token that was never seen, so the chain falls back to
+        the longest part of it that was seen instead of jumping to a random token.
+
+        Returns:
+            dict(tuple(int):dict(int:int)): The counts of the shorter tokens
+        """
+        if self._backoff is None:
+            self._unpack()
+        return self._backoff
+
+    def _unpack(self):
+        """ Builds the dictionaries of counts of a chain read with load, for training it or looking at its counts
+        """
+        self._transitions, self._backoff = [packed.unpack() for packed in self._packed]
+        self._packed = None
+
+    def _get_counts(self, state):
+        """
+        Args:
+            state (tuple(int)): A token as a tuple of symbol ids
+
+        Returns:
+            The counts of the tokens as long as this one: a dictionary (see transitions) or the arrays of a
+            chain read with load (_PackedCounts)
+        """
+        is_full = len(state) == self.token_length
+        if self._packed is not None:
+            return self._packed[0 if is_full else 1]
+        return self._transitions if is_full else self._backoff
+
+    @property
+    def probabilities(self):
+        """ The chain as a dictionary of string tokens, the format used before tokens were stored as integers.
+        Note tokens are space separated c indexed notes ("0 4 7"), and chord tokens are comma separated chords
+        ("0 4 7,2 5 9"). This builds a new dictionary, so use it for inspecting the chain, not in loops.
+
+        Returns:
+            dict(string:[[value, float]]): Dictionary of tokens as keys and lists of [note or chord, probability]
+        """
+        probabilities = {}
+        for state in self.transitions:
+            symbol_ids, percentages = self.get_distribution(state)
+            probabilities[self._state_to_token(state)] = [[self._get_value(symbol_id), percentage]
+                                                          for symbol_id, percentage in zip(symbol_ids, percentages)]
+        return probabilities
+
+    def get_distribution(self, state):
+        """ Returns the probability of every note or chord that can follow a token. The result is cached until
+        the chain is trained on a song that contains the token again.
+
+        Args:
+            state (tuple(int)): A token as a tuple of symbol ids. Tokens shorter than 'token_length' use the
+                back-off counts
+
+        Returns:
+            (int[], float[]): The ids of the notes or chords that can follow the token, and their probabilities,
+            or None if the token is not in this chain
+        """
+        distribution = self._get_compiled_distribution(state)
+        if distribution is None:
+            return None
+        return distribution[0], distribution[1]
+
+    def _get_compiled_distribution(self, state):
+        """
+        Args:
+            state (tuple(int)): A token as a tuple of symbol ids
+
+        Returns:
+            (int[], float[], float[], int[]): The ids of the notes or chords that can follow the token, their
+            probabilities and the alias table built from them, or None if the token is not in this chain
+        """
+        distribution = self.distributions.get(state)
+        if distribution is None:
+            counts = self._get_counts(state)
+            if isinstance(counts, _PackedCounts):
+                row = counts.find(state)
+                if row < 0:
+                    return None
+                distribution = self.distributions[state] = counts.get_distribution(row)
+                return distribution
+            successors = counts.get(state)
+            if successors is None:
+                return None
+            total = sum(successors.values())
+            probabilities = [count / total for count in successors.values()]
+            thresholds, aliases = build_alias_table(probabilities)
+            distribution = self.distributions[state] = (list(successors.keys()), probabilities, thresholds, aliases)
+        return distribution
+
+    def _sample(self, state):
+        """ Picks what follows a token at random, using the token's alias table, so it takes O(1) time no matter
+        how many different notes or chords can follow the token. A chain read with load samples straight from the
+        arrays of the file.
+
+        Args:
+            state (tuple(int)): A token in this chain, as a tuple of symbol ids
+
+        Returns:
+            int: The symbol id of the chosen note or chord
+        """
+        if self._packed is not None:
+            counts = self._get_counts(state)
+            return counts.sample(counts.find(state))
+        symbol_ids, probabilities, thresholds, aliases = self._get_compiled_distribution(state)
+        column = py.random.randint(len(symbol_ids))
+        if py.random.random_sample() < thresholds[column]:
+            return symbol_ids[column]
+        return symbol_ids[aliases[column]]
+
+    def _get_symbol_id(self, value):
+        """ Returns the id of a note or chord, adding it to self.symbols if it hasn't been seen before
+
+        Args:
+            value (int): A c indexed note, or the pitch class mask of a chord
+
+        Returns:
+            int: The id of the note or chord
+        """
+        symbol_id = self.symbol_ids.get(value)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[value] = len(self.symbols)
+            self.symbols.append(value)
+        return symbol_id
+
+    def _get_value(self, symbol_id):
+        """
+        Args:
+            symbol_id (int): The id of a note or chord in this chain
+
+        Returns:
+            The note as a c indexed pitch class (int), or the chord as space separated c indexed pitch classes
+            ("0 4 7")
+        """
+        if self.chain_type is chainType.NOTE:
+            return self.symbols[symbol_id]
+        return mask_to_string(self.symbols[symbol_id])
+
+    def _state_to_token(self, state):
+        """ Converts a tuple of symbol ids to the equivalent string token
+
+        Args:
+            state (tuple(int)): A token as a tuple of symbol ids
+
+        Returns:
+            String: The token as a string
+        """
+        if self.chain_type is chainType.NOTE:
+            return " ".join(str(self.symbols[symbol_id]) for symbol_id in state)
+        return ",".join(mask_to_string(self.symbols[symbol_id]) for symbol_id in state)
+
+    def _token_to_state(self, token):
+        """ Converts a string token to the equivalent tuple of symbol ids
+
+        Args:
+            token (String): A token as a string
+
+        Returns:
+            tuple(int): The token as a tuple of symbol ids, or None if it contains a note or chord this chain
+            has never seen
+        """
+        state = self._token_to_ids(token)
+        if None in state:
+            return None
+        return state
+
+    def _token_to_ids(self, token):
+        """
+        Args:
+            token (String): A token as a string
+
+        Returns:
+            tuple(int): The symbol id of each note or chord in the token, None for the ones this chain has never seen
+        """
+        if self.chain_type is chainType.NOTE:
+            values = [int(value) for value in token.split()]
+        else:
+            values = [mask_from_string(value) for value in token.split(',')]
+        return tuple(self.symbol_ids.get(value) for value in values)
+
+    def _find_state(self, token):
+        """ Finds the longest end of a token that this chain has counts for. This takes at most 'token_length'
+        dictionary lookups.
+
+        Args:
+            token (String): A token as a string
+
+        Returns:
+            tuple(int): The token itself as a tuple of symbol ids if the chain has seen it, otherwise the longest
+            suffix of it that was seen (the empty tuple if none of it was seen)
+        """
+        ids = self._token_to_ids(token)
+        if self._has_state(ids):
+            return ids
+        for length in range(min(len(ids), self.token_length - 1), 0, -1):
+            suffix = ids[len(ids) - length:]
+            if self._has_state(suffix):
+                return suffix
+        return ()
+
+    def _has_state(self, state):
+        """
+        Args:
+            state (tuple(int)): A token as a tuple of symbol ids (None for notes or chords the chain hasn't seen)
+
+        Returns:
+            bool: Whether this chain has counts for the token
+        """
+        counts = self._get_counts(state)
+        if isinstance(counts, _PackedCounts):
+            return counts.find(state) >= 0
+        return state in counts
+
+    def _random_token(self):
+        """
+        Returns:
+            String: A random token from this chain
+        """
+        if self._packed is not None:
+            transitions = self._packed[0]
+            return self._state_to_token(transitions.get_state(py.random.randint(len(transitions))))
+        if self.states is None:
+            self.states = list(self.transitions.keys())
+        return self._state_to_token(self.states[py.random.randint(len(self.states))])
+
+    def add_files(self, filenames, processes=None, skip_errors=False, failed_files=None):
+        """ Trains this chain on every MIDI file in the given list, reading and counting the files in parallel.
+        See train_chains.
+
+        Args:
+            filenames (String[]): Paths of the MIDI files to train on
+            processes (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            skip_errors (bool, optional): Whether to skip files that can't be read instead of raising the error.
+                Defaults to False.
+            failed_files (dict, optional): Filled with the skipped files and their errors. Defaults to None.
+
+        Returns:
+            DynamicMarkovChain: This chain
+        """
+        return train_chains([self], filenames, processes=processes, skip_errors=skip_errors,
+                            failed_files=failed_files)[0]
+
+    def save(self, path):
+        """ Saves the counts of this chain to a directory of uncompressed NumPy .npy files. Tokens and their counts
+        are stored in flat integer arrays (like a sparse matrix), together with the alias table of each token and
+        a sorted index of the tokens, so load can memory map the files and generate from them without reading
+        them into dictionaries first.
+
+        Args:
+            path (String): Path of the directory to write. It is created if it doesn't exist
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {'version': py.array(FILE_FORMAT_VERSION), 'name': py.array(self.name),
+                  'chain_type': py.array(self.chain_type.value), 'token_length': py.array(self.token_length),
+                  'symbols': py.array(self.symbols, dtype=py.int64)}
+        key_base = len(self.symbols) + 1
+        for prefix, counts in (('transitions', self.transitions), ('backoff', self.backoff)):
+            for key, array in zip(PACKED_ARRAYS, _pack_counts(counts, key_base, self.token_length)):
+                arrays[prefix + '_' + key] = array
+        for key, array in arrays.items():
+            py.save(os.path.join(path, key + '.npy'), array)
+
+    def load(self, path):
+        """ Loads a chain saved with save, replacing the name, type, token length and counts of this chain. The
+        arrays of counts are memory mapped, so loading takes about the same time for any size of chain, and
+        processes that load the same chain share the pages of the files. The dictionaries of counts are only built
+        if the chain is trained further or its counts are looked at (see transitions).
+
+        Args:
+            path (String): Path of the directory to read
+
+        Raises:
+            ValueError: If the files were written by an unsupported version of save
+        """
+        def read(key, mmap_mode=None):
+            return py.load(os.path.join(path, key + '.npy'), mmap_mode=mmap_mode)
+
+        version = int(read('version'))
+        if version != FILE_FORMAT_VERSION:
+            raise ValueError('Unsupported Markov chain file version ' + str(version))
+        self.name = str(read('name'))
+        self.chain_type = chainType(int(read('chain_type')))
+        self.token_length = int(read('token_length'))
+        self.symbols = read('symbols').tolist()
+        self.symbol_ids = {value: symbol_id for symbol_id, value in enumerate(self.symbols)}
+        self._packed = tuple(_PackedCounts(*(read(prefix + '_' + key, mmap_mode='r') for key in PACKED_ARRAYS),
+                                           key_base=len(self.symbols) + 1)
+                             for prefix in ('transitions', 'backoff'))
+        self._transitions = None
+        self._backoff = None
+        self.distributions = {}
+        self.states = None
+
+    def merge(self, other):
+        """ Adds the counts of another chain to this one, as if this chain had also been trained on every song the
+        other chain was trained on (after the songs this chain was trained on).
+
+        Args:
+            other (DynamicMarkovChain): A chain with the same chain type and token length as this one
+
+        Raises:
+            ValueError: If the other chain has a different chain type or token length
+        """
+        if other.chain_type is not self.chain_type or other.token_length != self.token_length:
+            raise ValueError('Only chains with the same chain type and token length can be merged.')
+        # The other chain numbered its notes or chords in its own order, so translate its ids to ours
+        symbol_map = [self._get_symbol_id(value) for value in other.symbols]
+        for counts, other_counts in ((self.transitions, other.transitions), (self.backoff, other.backoff)):
+            for other_state, other_successors in other_counts.items():
+                state = tuple(symbol_map[symbol_id] for symbol_id in other_state)
+                successors = counts.get(state)
+                if successors is None:
+                    successors = counts[state] = {}
+                    if counts is self.transitions:
+                        self.states = None
+                for symbol_id, count in other_successors.items():
+                    next_id = symbol_map[symbol_id]
+                    successors[next_id] = successors.get(next_id, 0) + count
+                self.distributions.pop(state, None)
 
     def add_song(self, song):
-        """Ingests a song and adds to the total dictionary. When all note changes are added,
-        divides all elements in the dictionary by the total amount of note changes recorded and
-        stores this in self.probabilities, which will give the probability matrix.
+        """Ingests a song and adds the number of times each note follows each token to the counts
+        in self.transitions. Songs can be added one after another, the probabilities are computed
+        from the combined counts when they are needed.
 
         Args:
             song (Song): Song to ingest and generate probabilities from
-            num_tokens (int): Tells the amount of tokens for each pattern
+
+        Raises:
+            EmptySongError: If the song has no notes (or chords) for this chain
 
         Returns:
-            dict(string:[(int, int)]): Dictionary of note tokens as keys and lists of tuples with a note
-            and percentage of occurrences
+            dict(tuple(int):dict(int:int)): Dictionary of tokens (tuples of symbol ids) as keys and
+            dictionaries of {next note id: count} as values
         """
         if self.chain_type is chainType.NOTE:
             return self.add_notes(song)
@@ -56,50 +425,16 @@ class DynamicMarkovChain:
             Returns:
                 int, String: An int of the next note and a string of the new pattern token.
         """
-        orig_token = current_note_token
-        # If this token is the end of the song, we need to begin in a new position
-        if self.probabilities.get(current_note_token) is None:
-            # Let's check if there are any other similar patterns in the song
-            for i in range(NUM_NOTES):
-                new_pattern = current_note_token[:len(current_note_token) - 2] + str(i)
-                if new_pattern in list(self.probabilities.keys()):
-                    current_note_token = new_pattern
-                    break
-            # If not, let's just randomly pick a new position to continue in the chain
-            if orig_token == current_note_token:
-                current_note_token = py.random.choice(list(self.probabilities.keys()))
-        note_follow = self.probabilities.get(current_note_token)
-        percentage = []
-        # print(note_follow)
-        # Create a 1-D array of the percentage of a given note with this pattern token
-        for i in range(NUM_NOTES):
-            found = False
-            for note in note_follow:
-                if i == note[0]:
-                    percentage.append(note[1])
-                    found = True
-            if not found:
-                percentage.append(0)
+        # If this token is the end of the song or was never seen, use the longest end of it that was seen
+        state = self._find_state(current_note_token)
         # Pick a random new note with the percentages and return the note and new pattern
-        print(percentage)
-        next_note = py.random.choice([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11], 1, p=percentage)
-        return next_note[0], current_note_token
+        return self.symbols[self._sample(state)], current_note_token
 
     def generate_next_chord(self, current_chord_token):
-        if self.probabilities.get(current_chord_token) is None:
-            # Let's just randomly pick a new position to continue in the chain
-            current_chord_token = py.random.choice(list(self.probabilities.keys()))
-        # Get all the chords that have followed our current token in a list
-        chord_follow = self.probabilities.get(current_chord_token)
-        percentage = []
-        available_chords = []
-        # Store the total chords and the percentage chance that they occur
-        for chord in chord_follow:
-            available_chords.append(chord[0])
-            percentage.append(chord[1])
-        # Choose a chord with the given percentages and return it
-        next_chord = py.random.choice(available_chords, 1, p=percentage)
-        return next_chord[0], current_chord_token
+        # If this token is the end of the song or was never seen, use the longest end of it that was seen
+        state = self._find_state(current_chord_token)
+        # Choose a chord with the percentages of the chords that have followed our current token and return it
+        return self._get_value(self._sample(state)), current_chord_token
 
     def generate_pattern(self, song, num_notes, instrument=0, arpeggio=False, octave=3):
         """ Given a new song object and the number of notes to generate, this method will load that
@@ -121,7 +456,7 @@ class DynamicMarkovChain:
         half_note = int(song.ticks_per_beat * 2)
         t = Track()
         # Start at a random place in the markov chain
-        current_token = py.random.choice(list(self.probabilities.keys()))
+        current_token = self._random_token()
         if self.chain_type is chainType.NOTE:
             current_token_array = current_token.split()
             # Add the beginning notes
@@ -141,12 +476,11 @@ class DynamicMarkovChain:
                         if abs(next_note_tone - note.c_indexed_pitch_class) <= 1:
                             # Then the note will be dissonant
                             new_note_needed = True
-                            if len(self.probabilities.get(current_token)) == 1:
-                                current_token = py.random.choice(list(self.probabilities.keys()))
+                            if len(self.get_distribution(self._find_state(current_token))[0]) == 1:
+                                current_token = self._random_token()
 
                     if not new_note_needed:
                         break
-                print(next_note_tone)
                 # Create the new pattern with the new note
                 if self.token_length == 1:
                     current_token = str(next_note_tone)
@@ -186,11 +520,11 @@ class DynamicMarkovChain:
                     for note in curr_notes:
                         curr_chord = next_chord.split()
                         for chord_note in curr_chord:
-                            if abs(chord_note - note.c_indexed_pitch_class) <= 1:
+                            if abs(int(chord_note) - note.c_indexed_pitch_class) <= 1:
                                 # The chord is dissonant
                                 new_note_needed = True
-                                if len(self.probabilities.get(current_token_array)) == 1:
-                                    current_token_array = py.random.choice(list(self.probabilities.keys()))
+                                if len(self.get_distribution(self._find_state(current_token))[0]) == 1:
+                                    current_token = self._random_token()
 
                     if not new_note_needed:
                         break
@@ -199,6 +533,7 @@ class DynamicMarkovChain:
                     current_token = next_chord
                 else:
                     # We need to change the token so it has the new chord in it
+                    current_token_array = current_token.split(',')
                     current_token = current_token_array[1]
                     for j in range(2, self.token_length):
                         current_token += "," + current_token_array[j]
@@ -218,18 +553,20 @@ class DynamicMarkovChain:
         return t
 
     def add_chords(self, song):
-        """Given a song object, this will add all the chords to our probability dictionary AKA
-        markov chain and create the percentages for them.
+        """Given a song object, this will add the number of times each chord follows each token to
+        the counts in self.transitions.
 
         Args:
             song (Song): Song to ingest and generate probabilities from
-            num_tokens (int): Tells the amount of tokens for each pattern
+
+        Raises:
+            EmptySongError: If the song has no chords
 
         Returns:
-            dict(string:[(int, int)]): Dictionary of note tokens as keys and lists of tuples with a note
-            and percentage of occurrences
+            dict(tuple(int):dict(int:int)): Dictionary of tokens (tuples of symbol ids) as keys and
+            dictionaries of {next chord id: count} as values
         """
-        # Get all notes from song in one list
+        # Get all chords from song in one list
         all_chords = []
         for track in song.tracks:
             if not track.chords or track.tag == TagEnum.PERCUSSION:
@@ -237,69 +574,25 @@ class DynamicMarkovChain:
             all_chords += track.chords
 
         if not all_chords:
-            raise AttributeError('There are no chords in this song.')
-        # Get first x notes of song
-        previous_pattern = all_chords[0].to_string()
-        previous_pattern += ","
-        for i in range(1, self.token_length):
-            previous_pattern += all_chords[i].to_string()
-            previous_pattern += ","
-        previous_pattern = previous_pattern[:len(previous_pattern) - 1]
-        print(previous_pattern)
-
-        # Create dictionary
-        pattern_dict = self.probabilities
-        # for the rest of the song, look at next chord
-        for i in range(self.token_length, len(all_chords)):
-            next_chord = all_chords[i].to_string()
-            # Add that and the new note as a key/value entry.
-            if pattern_dict.get(previous_pattern) is None:
-
-                pattern_dict[previous_pattern] = [[next_chord, 1]]
-            # We need to check if the pattern and chord combo exists already
-            else:
-                found = False
-                for chord in pattern_dict.get(previous_pattern):
-                    if chord[0] == next_chord:
-                        chord[1] = chord[1] + 1
-                        found = True
-                        break
-                if not found:
-                    pattern_dict.get(previous_pattern).append([next_chord, 1])
-            # Finally, we create the new token to continue
-            previous_pattern = all_chords[i - self.token_length].to_string()
-            previous_pattern += ","
-            for j in range(i - self.token_length + 1, i):
-                previous_pattern += " " + all_chords[j].to_string()
-                previous_pattern += ","
-            previous_pattern = previous_pattern[:len(previous_pattern) - 1]
-
-        # Value would be a list of lists with note and count [(0, 1), (1, 2)]
-        # If the key/value pair already exists, add one to count
-        for value in pattern_dict.values():
-            total = 0.0
-            for chord in value:
-                total += chord[1]
-            for chord in value:
-                chord[1] = (chord[1] / total)
-
-        self.probabilities = pattern_dict
-        #print(pattern_dict)
-        return pattern_dict
-        # Key is the same pattern, value is a list of all the percentages. [0, 0.5, 0.05, 0.25, ...]
+            raise EmptySongError('There are no chords in this song.')
+
+        self._add_sequence([chord.mask for chord in all_chords])
+        return self.transitions
 
     def add_notes(self, song):
-        """Ingests a song and adds to the total dictionary. When all note changes are added,
-        divides all elements in the dictionary by the total amount of note changes recorded and
-        stores this in self.probabilities, which will give the probability matrix.
+        """Ingests a song and adds the number of times each note follows each token to the counts
+        in self.transitions. Songs can be added one after another, the probabilities are computed
+        from the combined counts when they are needed.
 
         Args:
             song (Song): Song to ingest and generate probabilities from
-            num_tokens (int): Tells the amount of tokens for each pattern
+
+        Raises:
+            EmptySongError: If the song has no notes (other than chord and percussion notes)
 
         Returns:
-            dict(string:[(int, int)]): Dictionary of note tokens as keys and lists of tuples with a note
-            and percentage of occurrences
+            dict(tuple(int):dict(int:int)): Dictionary of tokens (tuples of symbol ids) as keys and
+            dictionaries of {next note id: count} as values
         """
         # Get all notes from song in one list
         all_notes = []
@@ -310,47 +603,311 @@ class DynamicMarkovChain:
                 if note.chord_note is True:
                     continue
                 all_notes.append(note)
+
+        if not all_notes:
+            raise EmptySongError('There are no notes in this song.')
         all_notes.sort(key=lambda notes: notes.time)
-        # Get first x notes of song
-        previous_pattern = str(all_notes[0].c_indexed_pitch_class)
-        for i in range(1, self.token_length):
-            note = all_notes[i]
-            previous_pattern += " " + str(note.c_indexed_pitch_class)
-
-        # Create dictionary
-        pattern_dict = self.probabilities
-        # for the rest of the song, look at next note
-        for i in range(self.token_length, len(all_notes)):
-            next_note = all_notes[i].c_indexed_pitch_class
-            # Add that and the new note as a key/value entry.
-            if pattern_dict.get(previous_pattern) is None:
-
-                pattern_dict[previous_pattern] = [[next_note, 1]]
-            else:
-                found = False
-                for note in pattern_dict.get(previous_pattern):
-                    if note[0] == next_note:
-                        note[1] = note[1] + 1
-                        found = True
-                        break
-                if not found:
-                    pattern_dict.get(previous_pattern).append([next_note, 1])
-
-            previous_pattern = str(all_notes[i - self.token_length].c_indexed_pitch_class)
-            for j in range(i - self.token_length + 1, i):
-                note = all_notes[j]
-                previous_pattern += " " + str(note.c_indexed_pitch_class)
-
-        # Value would be a list of lists with note and count [(0, 1), (1, 2)]
-        # If the key/value pair already exists, add one to count
-        for value in pattern_dict.values():
-            total = 0.0
-            for note in value:
-                total += note[1]
-            for note in value:
-                note[1] = (note[1] / total)
-
-        self.probabilities = pattern_dict
-        print(pattern_dict)
-        return pattern_dict
-        # Key is the same pattern, value is a list of all the percentages. [0, 0.5, 0.05, 0.25, ...]
+
+        self._add_sequence([note.c_indexed_pitch_class for note in all_notes])
+        return self.transitions
+
+    def _add_sequence(self, values):
+        """Counts every token of 'token_length' consecutive notes or chords in the given sequence, together
+        with the note or chord that follows it, and does the same for the shorter back-off tokens. Only the
+        counts are updated, the probabilities of the tokens that changed are computed again the next time
+        they are needed.
+
+        Args:
+            values (int[] or String[]): c indexed notes or chord strings, in the order they are played
+        """
+        symbol_ids = [self._get_symbol_id(value) for value in values]
+        transitions = self.transitions
+        backoff = self.backoff
+        distributions = self.distributions
+        for i in range(len(symbol_ids)):
+            next_id = symbol_ids[i]
+            # Count the full token if there is one, then every shorter token down to the empty one
+            for length in range(min(i, self.token_length), -1, -1):
+                state = tuple(symbol_ids[i - length:i])
+                counts = transitions if length == self.token_length else backoff
+                successors = counts.get(state)
+                if successors is None:
+                    successors = counts[state] = {}
+                    if length == self.token_length:
+                        self.states = None
+                successors[next_id] = successors.get(next_id, 0) + 1
+                distributions.pop(state, None)
+
+
+def build_alias_table(probabilities):
+    """ Builds an alias table (Vose's method) for a discrete distribution, so it can be sampled in O(1) time:
+    pick a random column i, then return i with probability thresholds[i], otherwise return aliases[i].
+
+    Args:
+        probabilities (float[]): The probability of each outcome. They should add up to 1
+
+    Returns:
+        (float[], int[]): The threshold and alias of each column
+    """
+    size = len(probabilities)
+    scaled = [probability * size for probability in probabilities]
+    thresholds = [1.0] * size
+    aliases = list(range(size))
+    small = [i for i, probability in enumerate(scaled) if probability < 1]
+    large = [i for i, probability in enumerate(scaled) if probability >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        thresholds[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1 - scaled[less]
+        if scaled[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    # Whatever is left is 1 up to rounding errors, so it keeps a threshold of 1
+    return thresholds, aliases
+
+
+def _state_key(state, key_base):
+    """ Numbers a token so that tokens of any length up to the token length get different numbers
+
+    Args:
+        state (tuple(int)): A token as a tuple of symbol ids
+        key_base (int): One more than the number of symbols of the chain
+
+    Returns:
+        int: The number of the token, or -1 if it contains a symbol id of None
+    """
+    key = 0
+    for symbol_id in state:
+        if symbol_id is None:
+            return -1
+        key = key * key_base + symbol_id + 1
+    return key
+
+
+def _pack_counts(counts, key_base, token_length):
+    """ Flattens a dictionary of {token: {next symbol id: count}} into arrays. The symbol ids of token i are
+    states[state_offsets[i]:state_offsets[i + 1]], and what followed it is in the same range of successor_offsets
+    in the successors, counts, thresholds and aliases arrays, the last two being its alias table (see
+    build_alias_table). keys holds the numbers of the tokens (see _state_key) in ascending order, and key_rows the
+    token each of them belongs to. If the numbers don't fit in 63 bits, both are empty.
+
+    Args:
+        counts (dict(tuple(int):dict(int:int))): Token counts of a chain
+        key_base (int): One more than the number of symbols of the chain
+        token_length (int): The token length of the chain
+
+    Returns:
+        numpy.ndarray[]: The arrays named in PACKED_ARRAYS, in that order
+    """
+    states = []
+    state_offsets = [0]
+    successors = []
+    successor_offsets = [0]
+    successor_counts = []
+    thresholds = []
+    aliases = []
+    for state, state_successors in counts.items():
+        states.extend(state)
+        state_offsets.append(len(states))
+        successors.extend(state_successors.keys())
+        successor_counts.extend(state_successors.values())
+        successor_offsets.append(len(successors))
+        total = sum(state_successors.values())
+        state_thresholds, state_aliases = build_alias_table([count / total for count in state_successors.values()])
+        thresholds.extend(state_thresholds)
+        aliases.extend(state_aliases)
+    if key_base ** token_length < 1 << 63:
+        keys = py.array([_state_key(state, key_base) for state in counts], dtype=py.int64)
+        key_rows = py.argsort(keys, kind='stable')
+        keys = keys[key_rows]
+    else:
+        keys = py.zeros(0, dtype=py.int64)
+        key_rows = py.zeros(0, dtype=py.int64)
+    return (py.array(states, dtype=py.int32), py.array(state_offsets, dtype=py.int64),
+            py.array(successors, dtype=py.int32), py.array(successor_offsets, dtype=py.int64),
+            py.array(successor_counts, dtype=py.int64), py.array(thresholds, dtype=py.float64),
+            py.array(aliases, dtype=py.int32), keys, key_rows.astype(py.int64))
+
+
+class _PackedCounts:
+
+    def __init__(self, states, state_offsets, successors, successor_offsets, counts, thresholds, aliases, keys,
+                 key_rows, key_base):
+        """ The token counts of a chain read with DynamicMarkovChain.load, left in the (memory mapped) arrays
+        written by _pack_counts. Tokens are found by binary search of their numbers, and what follows them is
+        sampled with their stored alias tables, so nothing has to be read into dictionaries.
+
+        Args:
+            key_base (int): One more than the number of symbols of the chain. The other arguments are the arrays
+                named in PACKED_ARRAYS
+        """
+        self.states = states
+        self.state_offsets = state_offsets
+        self.successors = successors
+        self.successor_offsets = successor_offsets
+        self.counts = counts
+        self.thresholds = thresholds
+        self.aliases = aliases
+        self.keys = keys
+        self.key_rows = key_rows
+        self.key_base = key_base
+        # Used instead of keys when the numbers of the tokens didn't fit in them. Built when first needed
+        self.rows = None
+
+    def __len__(self):
+        return len(self.state_offsets) - 1
+
+    def find(self, state):
+        """
+        Args:
+            state (tuple(int)): A token as a tuple of symbol ids
+
+        Returns:
+            int: The row of the token, or -1 if it isn't in the counts
+        """
+        if len(self.keys) == 0 and len(self) > 0:
+            if self.rows is None:
+                self.rows = {self.get_state(row): row for row in range(len(self))}
+            return self.rows.get(state, -1)
+        key = _state_key(state, self.key_base)
+        position = int(py.searchsorted(self.keys, key))
+        if position == len(self.keys) or self.keys[position] != key:
+            return -1
+        return int(self.key_rows[position])
+
+    def get_state(self, row):
+        """
+        Args:
+            row (int): The row of a token
+
+        Returns:
+            tuple(int): The token as a tuple of symbol ids
+        """
+        return tuple(self.states[self.state_offsets[row]:self.state_offsets[row + 1]].tolist())
+
+    def get_distribution(self, row):
+        """
+        Args:
+            row (int): The row of a token
+
+        Returns:
+            (int[], float[], float[], int[]): The same as DynamicMarkovChain._get_compiled_distribution
+        """
+        begin, end = int(self.successor_offsets[row]), int(self.successor_offsets[row + 1])
+        counts = self.counts[begin:end].tolist()
+        total = sum(counts)
+        return (self.successors[begin:end].tolist(), [count / total for count in counts],
+                self.thresholds[begin:end].tolist(), self.aliases[begin:end].tolist())
+
+    def sample(self, row):
+        """ Picks what follows a token at random, the same way as DynamicMarkovChain._sample
+
+        Args:
+            row (int): The row of a token
+
+        Returns:
+            int: The symbol id of the chosen note or chord
+        """
+        begin, end = int(self.successor_offsets[row]), int(self.successor_offsets[row + 1])
+        column = begin + py.random.randint(end - begin)
+        if py.random.random_sample() < self.thresholds[column]:
+            return int(self.successors[column])
+        return int(self.successors[begin + self.aliases[column]])
+
+    def unpack(self):
+        """
+        Returns:
+            dict(tuple(int):dict(int:int)): The counts as a dictionary, like DynamicMarkovChain.transitions
+        """
+        states = self.states.tolist()
+        state_offsets = self.state_offsets.tolist()
+        successors = self.successors.tolist()
+        successor_offsets = self.successor_offsets.tolist()
+        counts = self.counts.tolist()
+        unpacked = {}
+        for i in range(len(state_offsets) - 1):
+            begin, end = successor_offsets[i], successor_offsets[i + 1]
+            unpacked[tuple(states[state_offsets[i]:state_offsets[i + 1]])] = dict(zip(successors[begin:end],
+                                                                                      counts[begin:end]))
+        return unpacked
+
+
+def train_chains(chains, filenames, processes=None, skip_errors=False, failed_files=None):
+    """ Trains every given chain on every MIDI file in the list. The files are split into one contiguous batch of
+    files per task, and a pool of worker processes reads each batch and counts its tokens into new chains. The
+    counts of each batch are then merged into the given chains in file order, so the result is the same as calling
+    add_song on each file one after another. Songs without any notes (or chords) for a chain to learn from are
+    left out of that chain.
+
+    Args:
+        chains (DynamicMarkovChain[]): The chains to train. They can already contain counts from other songs
+        filenames (String[]): Paths of the MIDI files to train on
+        processes (int, optional): Number of worker processes. Defaults to the number of CPUs. With 1, everything
+            is done in this process.
+        skip_errors (bool, optional): If True, files that can't be read are skipped, logged, and recorded in
+            failed_files. If False, the error is raised. Defaults to False.
+        failed_files (dict, optional): If given, the skipped files are added to it, with their errors.
+            Defaults to None.
+
+    Returns:
+        DynamicMarkovChain[]: The given chains
+    """
+    filenames = list(filenames)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    settings = [(chain.chain_type, chain.token_length) for chain in chains]
+
+    if processes == 1 or len(filenames) <= 1:
+        batches = [_train_batch(settings, filenames, skip_errors)]
+    else:
+        # Several batches per process, so a few slow files don't leave the other processes idle
+        batch_size = max(1, -(-len(filenames) // (processes * 4)))
+        batch_files = [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            batches = list(executor.map(_train_batch, [settings] * len(batch_files), batch_files,
+                                        [skip_errors] * len(batch_files)))
+
+    for trained_chains, failures in batches:
+        for chain, trained in zip(chains, trained_chains):
+            chain.merge(trained)
+        for filename, error in failures:
+            logging.warning(msg="Couldn't load " + filename + ": " + type(error).__name__ + ": " + str(error))
+            if failed_files is not None:
+                failed_files[filename] = error
+    return chains
+
+
+def _train_batch(settings, filenames, skip_errors):
+    """ Trains new chains on a batch of files. This runs in the worker processes of train_chains.
+
+    Args:
+        settings ((chainType, int)[]): The chain type and token length of each chain to train
+        filenames (String[]): Paths of the MIDI files to train on
+        skip_errors (bool): Whether to skip files that can't be read instead of raising the error
+
+    Returns:
+        One trained chain for each setting [0] (DynamicMarkovChain[]), and the files that were skipped with their
+        errors [1] ((String, Exception)[])
+    """
+    chains = [DynamicMarkovChain('batch', chain_type=chain_type, token_length=token_length)
+              for chain_type, token_length in settings]
+    failures = []
+    for filename in filenames:
+        song = Song()
+        try:
+            # The chains don't use the key or the chord names, so the song isn't analyzed
+            song.load(filename=filename, analyze=False)
+        except Exception as e:
+            if not skip_errors:
+                raise
+            failures.append((filename, e))
+            continue
+        for chain in chains:
+            try:
+                chain.add_song(song)
+            except EmptySongError:
+                continue
+    return chains, failures
@@ -7,7 +7,7 @@ song = Song()
 song.load(filename=SongLibrary.MEGADETH_SYMPHONY_OF_DESTRUCTION)    # Actual Key: E Phrygian
 
 # Run the Detect Key method on the song object, capture the returned object
-key, report, confidence = song.detect_key_by_phrase_endings()
+key, report, confidence = song.detect_key_by_phrase_endings(report=True)
 
 # Prints the full report
 print(report)
@@ -1,30 +1,33 @@
+import os
 from Song import Song, SongLibrary
 from Track import Track
-from dynamic_markov_chain import DynamicMarkovChain, chainType
-from Genre import Genre
+from dynamic_markov_chain import DynamicMarkovChain, chainType, train_chains
 
-# Create a Genre object
-genre = Genre(type="Rock")
+# Worker processes import this file again on some platforms, so only train when it is run directly
+if __name__ == '__main__':
+    # Find every song in the genre
+    genre_directory = os.path.join('..', '..', 'MIDI Files', 'Rock')
+    filenames = [os.path.join(dirpath, file) for dirpath, dirnames, files in sorted(os.walk(genre_directory))
+                 for file in sorted(files) if file.endswith('.mid')]
 
-# Create a chord and note markov chain with the given attributes
-chord_chain = DynamicMarkovChain("chord chain", token_length=3, chain_type=chainType.CHORD)
-note_chain = DynamicMarkovChain("note chain", token_length=4, chain_type=chainType.NOTE)
+    # Create a chord and note markov chain with the given attributes
+    chord_chain = DynamicMarkovChain("chord chain", token_length=3, chain_type=chainType.CHORD)
+    note_chain = DynamicMarkovChain("note chain", token_length=4, chain_type=chainType.NOTE)
 
-# Train the new markov chains with the desired genre
-for training_song in genre.songs:
-    chord_chain.add_song(training_song)
-    note_chain.add_song(training_song)
+    # Train the new markov chains with the desired genre, reading the songs in parallel. Files that can't be read
+    # are skipped (and logged)
+    train_chains([chord_chain, note_chain], filenames, skip_errors=True)
 
-# Create a new song to write to
-output_song = Song()
+    # Create a new song to write to
+    output_song = Song()
 
-# Create a chord and melody track
-chords = chord_chain.generate_pattern(output_song, num_notes=16, instrument=24, octave=4)
-melody = note_chain.generate_pattern(output_song, num_notes=64, instrument=32, octave=5)
+    # Create a chord and melody track
+    chords = chord_chain.generate_pattern(output_song, num_notes=16, instrument=24, octave=4)
+    melody = note_chain.generate_pattern(output_song, num_notes=64, instrument=32, octave=5)
 
-# Add the generated tracks to a new song
-output_song.add_track(chords)
-output_song.add_track(melody)
+    # Add the generated tracks to a new song
+    output_song.add_track(chords)
+    output_song.add_track(melody)
 
-# Save the new written song
-output_song.save(filename='../../MIDI Files/Demo Output/Basic_Markov.mid')
\ No newline at end of file
+    # Save the new written song
+    output_song.save(filename='../../MIDI Files/Demo Output/Basic_Markov.mid')
\ No newline at end of file
@@ -3,5 +3,8 @@ from BatchReporting import generate_batch_key_detection_report
 # Using this method you can generate a CSV file which will run key detection on an
 # entire file directory formatted with sub directories as genre/artist/song.mid
 # This CSV file will be created in a new directory (under the same PWD as the calling
-# script)
-generate_batch_key_detection_report(top_directory_path="../../MIDI Files")
+# script). Songs are analyzed in parallel, and running it again only analyzes the songs that
+# were added or changed since the last report.
+# Worker processes import this file again on some platforms, so only run when it is run directly
+if __name__ == '__main__':
+    generate_batch_key_detection_report(top_directory_path="../../MIDI Files")
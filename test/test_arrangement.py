@@ -0,0 +1,35 @@
+import FileIO
+from Arrangement import Arrangement
+from Chord import Chord
+from Control import Control
+from Note import Note
+from Track import Track
+
+
+def test_arrangement():
+    verse = Track(notes=[Note(pitch=60, time=0, duration=100), Note(pitch=62, time=100, duration=100)])
+    chord_notes = [Note(pitch=p, time=0, duration=300, chord_note=True) for p in [60, 64, 67]]
+    chorus = Track(notes=list(chord_notes), chords=[Chord(notes=chord_notes, name="C Major", time=0)],
+                   controls=[Control(msg_type='control_change', control=3, value=10, time=50)])
+
+    arrangement = Arrangement(Track(track_name="melody", channel=2))
+    arrangement.extend([0, 1, 0], [verse, chorus])
+    assert len(arrangement) == 3
+    assert [start for section, start in arrangement.placements] == [0, 200, 500]
+    # Nothing is copied until the track is rendered
+    assert arrangement.placements[0][0] is verse
+
+    track = arrangement.render()
+    assert track.track_name == "melody" and track.channel == 2
+    assert [(note.pitch, note.time) for note in track.notes] == [(60, 0), (62, 100), (60, 200), (64, 200),
+                                                                   (67, 200), (60, 500), (62, 600)]
+    assert [(chord.name, chord.time) for chord in track.chords] == [("C Major", 200)]
+    # Chords share their notes with the track
+    assert all(any(note is n for n in track.notes) for note in track.chords[0].notes)
+    assert [control.time for control in track.controls] == [250]
+    # The sections are unchanged
+    assert [note.time for note in verse.notes] == [0, 100]
+    assert chorus.chords[0].time == 0
+
+    assert track.get_end_time() == 700
+    assert Arrangement().render().notes == []
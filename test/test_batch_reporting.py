@@ -0,0 +1,93 @@
+import csv
+import os
+import shutil
+
+import BatchReporting
+from BatchReporting import generate_batch_key_detection_report, REPORT_HEADER, MODIFIED_COLUMN
+
+
+def read_report(report_path):
+    with open(report_path, newline="") as report:
+        rows = list(csv.reader(report))
+    assert rows[0] == REPORT_HEADER
+    return {row[REPORT_HEADER.index("Song")]: row for row in rows[1:]}
+
+
+def test_generate_batch_key_detection_report(tmp_path, monkeypatch):
+    top_directory = tmp_path / "MIDI Files"
+    artist_directory = top_directory / "Classical" / "Scales"
+    os.makedirs(str(artist_directory))
+    shutil.copy("test MIDI/C_major_scale.mid", str(artist_directory))
+    shutil.copy("test MIDI/D_major_scale.mid", str(artist_directory))
+    with open(str(artist_directory / "broken.mid"), "wb") as broken:
+        broken.write(b"not a midi file")
+    report_path = str(tmp_path / "report.csv")
+
+    generate_batch_key_detection_report(top_directory_path=str(top_directory), report_path=report_path,
+                                        processes=1)
+    rows = read_report(report_path)
+    assert sorted(rows) == ["C_major_scale", "D_major_scale", "broken"]
+    assert rows["C_major_scale"][:5] == ["Classical", "Scales", "C_major_scale", "C", "major"]
+    assert rows["D_major_scale"][3:5] == ["D", "major"]
+    assert rows["C_major_scale"][-1] == ""
+    # A file that can't be read is recorded instead of stopping the report
+    assert rows["broken"][-1] != ""
+
+    # Only new or modified files are analyzed again
+    analyzed = []
+    analyze_file = BatchReporting._analyze_file
+
+    def record(top_directory_path, file_path):
+        analyzed.append(os.path.basename(file_path))
+        return analyze_file(top_directory_path, file_path)
+    monkeypatch.setattr(BatchReporting, "_analyze_file", record)
+    modified = str(artist_directory / "D_major_scale.mid")
+    os.utime(modified, (os.path.getmtime(modified) + 10, os.path.getmtime(modified) + 10))
+    generate_batch_key_detection_report(top_directory_path=str(top_directory), report_path=report_path,
+                                        processes=1)
+    assert analyzed == ["D_major_scale.mid"]
+    resumed_rows = read_report(report_path)
+    assert resumed_rows["C_major_scale"] == rows["C_major_scale"]
+    assert resumed_rows["broken"] == rows["broken"]
+    assert resumed_rows["D_major_scale"][:10] == rows["D_major_scale"][:10]
+    monkeypatch.undo()
+
+    # Worker processes give the same report
+    generate_batch_key_detection_report(top_directory_path=str(top_directory), report_path=report_path,
+                                        processes=2, resume=False)
+    assert read_report(report_path) == resumed_rows
+
+
+def test_file_changed_during_analysis(tmp_path, monkeypatch):
+    top_directory = tmp_path / "MIDI Files"
+    artist_directory = top_directory / "Classical" / "Scales"
+    os.makedirs(str(artist_directory))
+    shutil.copy("test MIDI/C_major_scale.mid", str(artist_directory))
+    file_path = str(artist_directory / "C_major_scale.mid")
+    original_time = os.path.getmtime(file_path)
+    report_path = str(tmp_path / "report.csv")
+
+    # The file is modified while it is being analyzed
+    load = BatchReporting.Song.load
+
+    def load_and_modify(song, *args, **kwargs):
+        result = load(song, *args, **kwargs)
+        os.utime(file_path, (original_time + 10, original_time + 10))
+        return result
+    monkeypatch.setattr(BatchReporting.Song, "load", load_and_modify)
+    generate_batch_key_detection_report(top_directory_path=str(top_directory), report_path=report_path,
+                                        processes=1)
+    monkeypatch.undo()
+    # The row records the file as it was read, so the next report analyzes it again
+    assert float(read_report(report_path)["C_major_scale"][MODIFIED_COLUMN]) == original_time
+
+    analyzed = []
+    analyze_file = BatchReporting._analyze_file
+
+    def record(top_directory_path, file_path):
+        analyzed.append(os.path.basename(file_path))
+        return analyze_file(top_directory_path, file_path)
+    monkeypatch.setattr(BatchReporting, "_analyze_file", record)
+    generate_batch_key_detection_report(top_directory_path=str(top_directory), report_path=report_path,
+                                        processes=1)
+    assert analyzed == ["C_major_scale.mid"]
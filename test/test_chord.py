@@ -5,6 +5,7 @@ from Note import Note
 from Song import Song
 from Track import Track
 from Key import Key
+from Chord import Chord, mask_from_string, mask_to_string
 import mido
 
 
@@ -45,4 +46,63 @@ def test_duplicate_chord():
     duplicate = orig.tracks[1].chords[0].duplicate_chord()
     assert duplicate.notes[0].pitch == orig.tracks[1].chords[0].notes[0].pitch
     assert duplicate.notes[1].pitch == orig.tracks[1].chords[0].notes[1].pitch
-    assert duplicate.notes[2].pitch == orig.tracks[1].chords[0].notes[2].pitch
\ No newline at end of file
+    assert duplicate.notes[2].pitch == orig.tracks[1].chords[0].notes[2].pitch
+
+def test_chord_mask_and_root():
+    orig = Song()
+    orig.load(filename="test MIDI/C_major_chords.mid")
+    chords = orig.tracks[1].chords
+    assert chords[0].mask == 0b10010001  # C, E and G
+    assert chords[0].root == 0
+    assert chords[3].root == 2  # D Minor Seventh
+
+    # Inversions are named after their root position, and the key picks the root of symmetric chords
+    inversion = Chord(notes=[Note(pitch=52), Note(pitch=55), Note(pitch=60)])
+    assert inversion.get_name(key=0) == "C Major"
+    assert inversion.root == 0
+    augmented = Chord(notes=[Note(pitch=48), Note(pitch=52), Note(pitch=56)])
+    assert augmented.get_name(key=0) == "C Augmented"
+    assert augmented.get_name(key=4) == "E Augmented"
+    assert Chord(notes=[Note(pitch=59), Note(pitch=62), Note(pitch=65)]).get_name(key=0) == "B Diminished"
+    assert Chord(notes=[Note(pitch=55), Note(pitch=59), Note(pitch=62), Note(pitch=65)]).get_name(key=0) == \
+        "G Dominant Seventh"
+    # Masks without a known chord are named after their notes
+    power_chord = Chord(notes=[Note(pitch=48), Note(pitch=55)])
+    assert power_chord.get_name(key=0) == "C G"
+    assert power_chord.root == -1
+
+
+def test_chord_mask_follows_notes():
+    chord = Chord(notes=[Note(pitch=60), Note(pitch=64), Note(pitch=67)])
+    assert chord.mask == 0b10010001
+    # The mask is kept until the notes change
+    version = chord._pitches_version
+    assert chord.mask == 0b10010001 and chord._pitches_version is version
+    chord.notes[1].pitch = 63
+    assert chord.get_name() == "C Minor"
+    chord.notes.append(Note(pitch=70))
+    assert chord.get_name() == "C Minor Seventh"
+
+    # The root of a symmetric chord is picked from its lowest note, wherever that note is in the list
+    augmented = Chord(notes=[Note(pitch=48), Note(pitch=52), Note(pitch=56)])
+    augmented.notes[0].pitch = 60
+    assert augmented.root == 4
+    augmented.notes = [Note(pitch=56), Note(pitch=48), Note(pitch=52)]
+    assert augmented.root == 0
+
+    # Chords holding views of the notes of a columnar track follow edits made through the track
+    track = Track(notes=[Note(pitch=62), Note(pitch=65), Note(pitch=69)])
+    track.add_chord(Chord(notes=list(track.notes), time=0))
+    track.to_columnar()
+    chord = track.chords[0]
+    assert chord.get_name() == "D Minor"
+    track.notes[1].pitch = 66
+    assert chord.get_name() == "D Major"
+    track.notes.edit_columns()['pitch'][2] = 70
+    assert chord.get_name() == "D Augmented"
+
+
+def test_mask_strings():
+    assert mask_to_string(0b10010001) == "0 4 7"
+    assert mask_from_string("7 4 0 12") == 0b10010001
+    assert mask_from_string(mask_to_string(0b101010101010)) == 0b101010101010
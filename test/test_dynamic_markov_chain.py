@@ -7,6 +7,7 @@ from Song import Song, SongLibrary
 from Track import Track
 from Key import Key, Mode
 import mido
+import numpy as np
 from dynamic_markov_chain import DynamicMarkovChain, chainType
 
 
@@ -66,3 +67,148 @@ def test_generate_pattern():
     melody = note_chain.generate_pattern(note_output, num_notes=64, instrument=32, octave=5)
     note_output.add_track(melody)
     note_output.save(filename='test MIDI/note_output.mid')
+
+
+def test_integer_tokens():
+    note_song = Song()
+    note_song.load(filename="test MIDI/C_major_scale.mid")
+    note_chain = DynamicMarkovChain("note chain", token_length=2, chain_type=chainType.NOTE)
+    note_chain.add_song(note_song)
+    # Every token is a tuple of ids into the list of notes seen
+    for state, successors in note_chain.transitions.items():
+        assert len(state) == 2
+        assert all(0 <= symbol_id < len(note_chain.symbols) for symbol_id in state)
+        assert all(isinstance(count, int) for count in successors.values())
+    # C D is always followed by E in a C major scale
+    assert note_chain.probabilities.get("0 2") == [[4, 1.0]]
+    assert note_chain._state_to_token(note_chain._token_to_state("0 2")) == "0 2"
+    assert note_chain._token_to_state("1 3") is None
+
+
+def test_incremental_training():
+    note_song = Song()
+    note_song.load(filename="test MIDI/C_major_scale.mid")
+    once = DynamicMarkovChain("once", token_length=1, chain_type=chainType.NOTE)
+    once.add_song(note_song)
+    twice = DynamicMarkovChain("twice", token_length=1, chain_type=chainType.NOTE)
+    twice.add_song(note_song)
+    probabilities = twice.probabilities
+    twice.add_song(note_song)
+    # Counts add up exactly, so training on the same song twice gives the same probabilities
+    for state, successors in once.transitions.items():
+        assert twice.transitions[state] == {symbol_id: 2 * count for symbol_id, count in successors.items()}
+    assert twice.probabilities == probabilities == once.probabilities
+    for state in twice.transitions:
+        assert sum(twice.get_distribution(state)[1]) == pytest.approx(1)
+    assert twice.get_distribution((len(twice.symbols),)) is None
+
+
+def test_alias_table():
+    import numpy
+    from dynamic_markov_chain import build_alias_table
+    probabilities = [0.5, 0.25, 0.125, 0.125]
+    thresholds, aliases = build_alias_table(probabilities)
+    # Each column gives 1/n of its threshold to itself and the rest to its alias
+    rebuilt = [0.0] * len(probabilities)
+    for column, (threshold, alias) in enumerate(zip(thresholds, aliases)):
+        rebuilt[column] += threshold / len(probabilities)
+        rebuilt[alias] += (1 - threshold) / len(probabilities)
+    assert rebuilt == pytest.approx(probabilities)
+
+    note_song = Song()
+    note_song.load(filename="test MIDI/C_major_scale.mid")
+    note_chain = DynamicMarkovChain("note chain", token_length=2, chain_type=chainType.NOTE)
+    note_chain.add_song(note_song)
+    numpy.random.seed(0)
+    for token, follow in note_chain.probabilities.items():
+        next_note, token_used = note_chain.generate_next_note(token)
+        assert token_used == token
+        assert next_note in [note for note, percentage in follow]
+
+
+def test_backoff():
+    note_song = Song()
+    note_song.load(filename="test MIDI/C_major_scale.mid")
+    note_chain = DynamicMarkovChain("note chain", token_length=3, chain_type=chainType.NOTE)
+    note_chain.add_song(note_song)
+    # Every note is counted by the empty token, and every pair by the one note tokens
+    assert sum(note_chain.backoff[()].values()) == sum(len(track.notes) for track in note_song.tracks)
+    assert all(len(state) < 3 for state in note_chain.backoff)
+    # Only the last note of this token is in the scale, so it falls back to what follows E
+    assert note_chain._find_state("1 3 4") == (note_chain.symbol_ids[4],)
+    assert note_chain.generate_next_note("1 3 4") == (5, "1 3 4")
+    assert note_chain._find_state("1 1 1") == ()
+    assert note_chain._find_state("0 2 4") == note_chain._token_to_state("0 2 4")
+
+
+def test_train_chains():
+    from dynamic_markov_chain import train_chains
+    filenames = ["test MIDI/C_major_scale.mid", "test MIDI/C_major_chords.mid", "test MIDI/missing.mid",
+                 "test MIDI/D_major_scale.mid"]
+    sequential = [DynamicMarkovChain("chord chain", token_length=2, chain_type=chainType.CHORD),
+                  DynamicMarkovChain("note chain", token_length=2, chain_type=chainType.NOTE)]
+    for filename in filenames:
+        song = Song()
+        try:
+            song.load(filename=filename)
+        except IOError:
+            continue
+        for chain in sequential:
+            try:
+                chain.add_song(song)
+            except AttributeError:
+                continue
+    failed_files = {}
+    parallel = train_chains([DynamicMarkovChain("chord chain", token_length=2, chain_type=chainType.CHORD),
+                             DynamicMarkovChain("note chain", token_length=2, chain_type=chainType.NOTE)],
+                            filenames, processes=2, skip_errors=True, failed_files=failed_files)
+    assert list(failed_files) == ["test MIDI/missing.mid"]
+    assert isinstance(failed_files["test MIDI/missing.mid"], IOError)
+    for expected, chain in zip(sequential, parallel):
+        assert chain.symbols == expected.symbols
+        assert chain.transitions == expected.transitions
+        assert chain.backoff == expected.backoff
+        assert chain.probabilities == expected.probabilities
+    with pytest.raises(ValueError):
+        parallel[0].merge(parallel[1])
+
+    # Files that can't be read are an error unless they are skipped
+    for processes in (1, 2):
+        with pytest.raises(IOError):
+            train_chains([DynamicMarkovChain("note chain", token_length=2, chain_type=chainType.NOTE)], filenames,
+                         processes=processes)
+
+
+def test_save_load(tmp_path):
+    chord_song = Song()
+    chord_song.load(filename="test MIDI/C_major_chords.mid")
+    note_song = Song()
+    note_song.load(filename="test MIDI/C_major_scale.mid")
+    for chain_type, song in ((chainType.CHORD, chord_song), (chainType.NOTE, note_song)):
+        chain = DynamicMarkovChain("chain", token_length=2, chain_type=chain_type)
+        chain.add_song(song)
+        path = str(tmp_path / "chain")
+        chain.save(path)
+        loaded = DynamicMarkovChain("loaded")
+        loaded.load(path)
+        assert loaded.name == "chain"
+        assert loaded.chain_type is chain_type
+        assert loaded.token_length == 2
+        assert loaded.symbols == chain.symbols
+        # The loaded chain generates straight from the files, the same way the chain it was saved from does
+        for state in list(chain.transitions) + list(chain.backoff):
+            assert loaded.get_distribution(state) == chain.get_distribution(state)
+            np.random.seed(len(state))
+            expected = [chain._sample(state) for _ in range(20)]
+            np.random.seed(len(state))
+            assert [loaded._sample(state) for _ in range(20)] == expected
+        token = chain._state_to_token(next(iter(chain.transitions)))
+        assert loaded._find_state(token) == chain._find_state(token)
+        assert loaded._find_state(token.replace("0", "11")) == chain._find_state(token.replace("0", "11"))
+        assert loaded._packed is not None
+        assert loaded.transitions == chain.transitions
+        assert loaded.backoff == chain.backoff
+        assert loaded.probabilities == chain.probabilities
+        # The loaded chain can keep training
+        loaded.add_song(song)
+        assert sum(loaded.backoff[()].values()) == 2 * sum(chain.backoff[()].values())
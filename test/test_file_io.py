@@ -1,3 +1,5 @@
+import io
+
 import mido
 import pytest
 
@@ -79,12 +81,64 @@ def test_order_messages():
     assert msgs[10] == mido.Message(type='note_off', channel=2, note=103, velocity=50, time=100)
 
 
+def test_order_messages_ties():
+    """
+    Test that order_messages writes controls, then note_offs, then note_ons at the same time,
+    and leaves the order of the track's notes alone
+    """
+    track = Track()
+    track.notes.append(Note(pitch=62, time=100, duration=100, velocity=50))
+    track.notes.append(Note(pitch=60, time=0, duration=100, velocity=50))
+    track.notes.append(Note(pitch=64, time=100, duration=50, velocity=50))
+    track.controls.append(Control(msg_type="program_change", instrument=20, time=100))
+
+    msgs = FileIO.order_messages(track)
+
+    assert [note.pitch for note in track.notes] == [62, 60, 64]
+    assert [(msg.type, msg.time) for msg in msgs] == [('note_on', 0), ('program_change', 100), ('note_off', 0),
+                                                      ('note_on', 0), ('note_on', 0), ('note_off', 50),
+                                                      ('note_off', 50)]
+    assert [msg.note for msg in msgs if msg.type == 'note_on'] == [60, 62, 64]
+    assert [msg.note for msg in msgs if msg.type == 'note_off'] == [60, 64, 62]
+
+
+def test_encode_midi_file():
+    """
+    Test that encode_midi_file writes the same bytes mido writes for the messages of order_messages
+    """
+    song = Song()
+    track = Track(track_name="Piano", channel=3)
+    track.notes.append(Note(pitch=60, time=0, duration=480, velocity=90))
+    track.notes.append(Note(pitch=64, time=0, duration=480, velocity=90))
+    track.notes.append(Note(pitch=67, time=200000, duration=96, velocity=0))
+    track.controls.append(Control(msg_type="set_tempo", tempo=500000, time=0))
+    track.controls.append(Control(msg_type="control_change", control=7, value=100, time=480))
+    track.controls.append(Control(msg_type="program_change", instrument=20, time=480))
+    song.add_track(track)
+
+    midi = mido.MidiFile(type=1)
+    midi.ticks_per_beat = song.ticks_per_beat
+    midi.add_track()
+    midi.tracks[0].append(mido.MetaMessage(type='track_name', name="Piano", time=0))
+    midi.tracks[0].append(mido.MetaMessage(type='device_name', name="", time=0))
+    midi.tracks[0].extend(FileIO.order_messages(track))
+    midi.tracks[0].append(mido.MetaMessage(type='end_of_track', time=500))
+    expected = io.BytesIO()
+    midi.save(file=expected)
+
+    assert FileIO.encode_midi_file(song) == expected.getvalue()
+
+    track.notes.append(Note(pitch=128, time=0, duration=10, velocity=90))
+    with pytest.raises(ValueError):
+        FileIO.encode_midi_file(song)
+
+
 def test_handle_note():
     """
         Tests the handle_note() method
     """    
     track = Track()
-    current_notes = []
+    current_notes = FileIO.OpenNotes()
     num_notes_per_channel = [0] * 16
     found_chord = [False] * 16
 
@@ -224,3 +278,48 @@ def test_handle_control():
             and ctrl.instrument == 0 and ctrl.time == 1000)
 
     assert len(track.controls) == 6
+
+
+def test_read_midi_file_streaming():
+    """
+    Test that the streaming reader builds the same song as the regular reader
+    """
+    for filename in ["Resources/My-Name-Is.mid", "Resources/GoodRiddance(TimeOfYourLife).mid"]:
+        song = Song()
+        streamed_song = Song()
+
+        song.load(filename=filename)
+        streamed_song.load(filename=filename, streaming=True)
+
+        assert song.equals(streamed_song)
+        assert streamed_song.ticks_per_beat == song.ticks_per_beat
+        for i, track in enumerate(song.tracks):
+            assert len(streamed_song.tracks[i].chords) == len(track.chords)
+            assert streamed_song.tracks[i].tag == track.tag
+
+    # Both readers decode every message the same way as mido
+    with open("Resources/My-Name-Is.mid", 'rb') as infile:
+        infile.read(14)
+        midi = mido.MidiFile("Resources/My-Name-Is.mid")
+        for mido_track in midi.tracks:
+            assert list(FileIO.stream_track_messages(infile)) == list(mido_track)
+
+
+def test_read_midi_file_clip(tmp_path):
+    """
+    Test that both readers clip data bytes above 127 only if asked to
+    """
+    # One track with a running status note on (velocity 200), a note off and the end of the track
+    events = bytes([0x00, 0x90, 60, 200, 0x10, 62, 100, 0x60, 0x80, 60, 0, 0x00, 0x80, 62, 0, 0x00, 0xff, 0x2f, 0x00])
+    path = str(tmp_path / "clip.mid")
+    with open(path, 'wb') as file:
+        file.write(b'MThd' + (6).to_bytes(4, 'big') + (0).to_bytes(2, 'big') + (1).to_bytes(2, 'big') +
+                   (96).to_bytes(2, 'big'))
+        file.write(b'MTrk' + len(events).to_bytes(4, 'big') + events)
+
+    for streaming in (False, True):
+        with pytest.raises(IOError):
+            FileIO.read_midi_file(Song(), path, streaming=streaming)
+        song = FileIO.read_midi_file(Song(), path, streaming=streaming, clip=True)
+        assert [(note.pitch, note.velocity, note.time, note.duration) for note in song.tracks[0].notes] == \
+            [(60, 127, 0, 112), (62, 100, 16, 96)]
@@ -15,7 +15,9 @@ def test_genre_constructor():
     """
     genre = Genre(type="Rock")
     assert genre.type == "Rock"
-    assert len(genre.songs) == 6
+    assert len(genre.songs) == 17
+    # Songs aren't loaded until they are used
+    assert genre.get_loaded_songs() == []
 
 
 def test_add_song():
@@ -28,3 +30,33 @@ def test_add_song():
 def test_note_frequency_graph():
     genre = Genre(type="Rock")
     genre.get_notes_frequency_graph()
+
+
+def test_lazy_loading(tmp_path):
+    genre = Genre(directory="test MIDI", max_memory=0)
+    assert len(genre.songs) == len(genre.filenames)
+    song = genre.songs[0]
+    assert song.tracks
+    # Nothing fits in the memory budget, so nothing is kept
+    assert genre.get_loaded_songs() == []
+
+    genre = Genre(directory="test MIDI")
+    first = genre.songs[0]
+    assert genre.songs[0] is first
+    assert genre.get_loaded_songs() == [first]
+    genre.max_memory = 1
+    genre.songs[1]
+    assert genre.get_loaded_songs() == []
+
+    # Prefetching in threads gives the same songs in the same order
+    names = [[track.track_name for track in song.tracks] for song in Genre(directory="test MIDI")]
+    assert [[track.track_name for track in song.tracks]
+            for song in Genre(directory="test MIDI", prefetch=2)] == names
+
+    with open(str(tmp_path / "broken.mid"), "wb") as broken:
+        broken.write(b"not a midi file")
+    with pytest.raises(OSError):
+        list(Genre(directory=str(tmp_path)))
+    genre = Genre(directory=str(tmp_path), prefetch=1, skip_errors=True)
+    assert list(genre) == []
+    assert list(genre.failed_files) == [str(tmp_path / "broken.mid")]
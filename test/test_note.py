@@ -0,0 +1,28 @@
+import pytest
+
+from Note import Note
+from NoteArray import NoteArray
+from Track import Track
+
+
+def test_c_indexed_pitch_class():
+    """
+        Tests that setting the pitch class of a note moves it within its octave,
+        for notes stored in a NoteArray too
+    """
+    note = Note(pitch=62)
+    assert note.c_indexed_pitch_class == 2
+    note.c_indexed_pitch_class = 11
+    assert note.pitch == 71
+    note.c_indexed_pitch_class = 12
+    assert note.pitch == 60
+
+    track = Track(notes=[Note(pitch=64)])
+    frequencies = track.get_c_indexed_note_frequencies()
+    track.notes[0].c_indexed_pitch_class = 7
+    assert track.notes[0].pitch == 67
+    assert track.get_c_indexed_note_frequencies() != frequencies
+
+    notes = NoteArray([Note(pitch=40)])
+    notes[0].c_indexed_pitch_class = 0
+    assert notes[0].pitch == 36
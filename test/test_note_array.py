@@ -0,0 +1,88 @@
+import pytest
+
+from Chord import Chord
+from Note import Note
+from NoteArray import NoteArray
+from Song import Song
+from Track import Track
+
+
+def test_note_array():
+    """
+        Tests that a NoteArray behaves like a list of notes
+    """
+    notes = NoteArray([Note(pitch=62, time=200, duration=100, velocity=90, channel=1),
+                       Note(pitch=60, time=0, duration=100, velocity=80, channel=1, chord_note=True)])
+    notes.append(Note(pitch=64, time=100, duration=50))
+
+    assert len(notes) == 3
+    assert notes[0].pitch == 62
+    assert notes[1].chord_note is True
+    assert notes[-1].time == 100
+    assert notes[0].c_indexed_pitch_class == 2
+    assert [note.pitch for note in notes] == [62, 60, 64]
+    assert [note.pitch for note in notes[1:]] == [60, 64]
+
+    # Changing a note changes the stored data
+    notes[0].pitch += 2
+    assert notes[0].pitch == 64
+    assert notes.columns['pitch'].tolist() == [64, 60, 64]
+
+    # Views keep pointing at the same note after sorting and removing notes
+    first_note = notes[0]
+    notes.sort(key=lambda note: note.time)
+    assert [note.time for note in notes] == [0, 100, 200]
+    assert first_note.time == 200
+    assert notes.index(first_note) == 2
+
+    notes.remove(notes[0])
+    assert len(notes) == 2
+    assert first_note.time == 200
+    assert notes.index(first_note) == 1
+
+    notes.sort_by_column('pitch')
+    assert [note.pitch for note in notes] == [64, 64]
+
+    removed = notes.pop()
+    assert removed.time == 200
+    assert len(notes) == 1
+    with pytest.raises(LookupError):
+        first_note.pitch
+    with pytest.raises(IndexError):
+        notes[1]
+
+
+def test_columnar_track():
+    """
+        Tests that a columnar track keeps its chords attached to its notes
+    """
+    chord_notes = [Note(pitch=60, chord_note=True), Note(pitch=64, chord_note=True), Note(pitch=67, chord_note=True)]
+    track = Track(notes=[Note(pitch=72, time=10)], chords=[Chord(notes=list(chord_notes))])
+    for note in chord_notes:
+        track.add_note(note)
+    track.to_columnar()
+
+    assert isinstance(track.notes, NoteArray)
+    assert track.get_note_array()['pitch'].tolist() == [72, 60, 64, 67]
+    assert track.get_c_indexed_note_frequencies() == [2, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]
+
+    for note in track.notes:
+        note.pitch += 2
+    assert track.chords[0].to_string() == "2 6 9"
+    assert track.duplicate_track().equals(track)
+
+
+def test_load_columnar():
+    """
+        Tests that loading a song into columnar tracks gives the same song
+    """
+    song = Song()
+    columnar_song = Song()
+    song.load(filename="Resources/GoodRiddance(TimeOfYourLife).mid")
+    columnar_song.load(filename="Resources/GoodRiddance(TimeOfYourLife).mid", columnar=True)
+
+    assert columnar_song.equals(song)
+    for i, track in enumerate(song.tracks):
+        assert isinstance(columnar_song.tracks[i].notes, NoteArray)
+        assert columnar_song.tracks[i].tag == track.tag
+        assert [chord.name for chord in columnar_song.tracks[i].chords] == [chord.name for chord in track.chords]
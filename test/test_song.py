@@ -2,9 +2,10 @@ import pytest
 import FileIO as FileIO
 from Control import Control
 from Note import Note
+from NoteArray import NoteArray
 from Song import Song
 from Track import Track
-from Key import Key, Mode
+from Key import Key, Mode, detect_keys_and_scales
 import mido
 
 
@@ -49,6 +50,61 @@ def test_change_song_key_by_half_steps():
     assert new_song.tracks[1].notes[3].pitch == d_scale.tracks[1].notes[3].pitch
 
 
+def test_load_without_analysis():
+    """
+        Tests that loading a song with analyze=False leaves the analysis for later,
+        and that the detected key follows changes to the notes
+    """
+    analyzed = Song()
+    analyzed.load(filename="test MIDI/C_major_chords.mid")
+    lazy = Song()
+    lazy.load(filename="test MIDI/C_major_chords.mid", analyze=False)
+
+    assert all(chord.name is None for track in lazy.tracks for chord in track.chords)
+    assert lazy.key.tonic == analyzed.key.tonic == "C"
+    assert [track.tag for track in lazy.tracks] == [track.tag for track in analyzed.tracks]
+
+    # The key is detected again after the notes change, and chords are only named if asked for
+    lazy.change_song_key_by_half_steps(2)
+    assert lazy.key.tonic == "D"
+    assert all(chord.name is None for track in lazy.tracks for chord in track.chords)
+    lazy.get_chord_names()
+    assert lazy.tracks[1].chords[0].name == "D Major"
+
+    # A key that is set directly doesn't change with the notes
+    lazy.key = Key("E", Mode.MINOR)
+    lazy.change_song_key_by_half_steps(2)
+    assert lazy.key.tonic == "E"
+
+
+def test_key_follows_notes_after_detection():
+    """
+        Tests that detecting the key leaves it following the notes, and that
+        key changes use the key they were given instead of detecting it again
+    """
+    song = Song()
+    song.load(filename="test MIDI/C_major_chords.mid", analyze=False)
+    assert song.detect_key_and_scale()[0].tonic == "C"
+    # Detect, then edit the notes, then read the key
+    for track in song.tracks:
+        for note in track.notes:
+            note.pitch += 2
+    assert song.key.tonic == "D"
+
+    # Changing the key of the whole song gives it the destination key, without detecting it from the notes
+    detected = []
+    song.get_c_indexed_note_frequencies = lambda: detected.append(1) or Song.get_c_indexed_note_frequencies(song)
+    song.change_song_key(origin_key=Key('D', Mode.MAJOR), destination_key=Key('D', Mode.DORIAN))
+    assert song.key.tonic == "D" and song.key.mode == Mode.DORIAN
+    song.change_song_key_by_half_steps(-2)
+    assert song.key.tonic == "C" and song.key.mode == Mode.DORIAN
+    assert detected == []
+    # But the key still follows later edits
+    song.tracks[1].notes[0].pitch += 1
+    assert song.key.mode != Mode.DORIAN
+    assert detected == [1]
+
+
 def test_change_song_key():
     """
         Tests the functionality of changing song key from one key to another
@@ -149,6 +205,19 @@ def test_change_song_key():
     assert orig.tracks[1].notes[7].pitch == 60
 
 
+def test_change_song_key_columnar():
+    """ Columnar tracks are changed in place by the same table as tracks of Note objects
+    """
+    songs = [Song(), Song()]
+    songs[0].load(filename="test MIDI/C_major_scale.mid")
+    songs[1].load(filename="test MIDI/C_major_scale.mid", columnar=True)
+    for song in songs:
+        song.change_song_key(origin_key=Key('C', Mode.MAJOR), destination_key=Key('E', Mode.DORIAN),
+                             interval_begin=100, interval_end=500)
+    assert [note.pitch for note in songs[0].tracks[1].notes] == [note.pitch for note in songs[1].tracks[1].notes]
+    assert [note.pitch for note in songs[0].tracks[1].notes][:2] == [48, 54]
+
+
 def test_transition_graph():
     """
         Tests the functionality of creating a transition
@@ -206,6 +275,55 @@ def test_get_notes_at_time():
     assert zero_notes[1].pitch == 52
     assert zero_notes[2].pitch == 48
 
+    # The notes found should match a scan over every note in the song
+    for time in range(0, 2000, 7):
+        expected = [note for track in song.tracks for note in track.notes
+                    if note.time <= time <= note.time + note.duration]
+        assert song.get_notes_at_time(time) == expected
+
+    expected = [note for track in song.tracks for note in track.notes
+                if note.time <= 500 and note.time + note.duration >= 100]
+    assert song.get_notes_in_range(100, 500) == expected
+
+    # Changing the song rebuilds the index
+    song.tracks[1].add_note(Note(pitch=70, time=15, duration=10))
+    assert song.get_notes_at_time(15)[-1].pitch == 70
+    song.tracks[1].notes[-1].time = 1000
+    assert song.get_notes_at_time(15)[-1].pitch != 70
+    assert song.get_notes_at_time(1005)[-1].pitch == 70
+
+
+def test_get_notes_at_time_while_adding_notes():
+    """
+        Tests that notes added to the tracks of a song between lookups are found, in the same order
+        as a scan over every note, without rebuilding the index of the notes every time
+    """
+    song = Song()
+    song.load(filename="test MIDI/C_major_chords.mid")
+    song.tracks[0].notes = NoteArray(song.tracks[0].notes)
+    generated = Track()
+    song.get_notes_at_time(0)
+    index = song._get_note_index()[0]
+
+    for i in range(200):
+        # Like generate_pattern: a lookup, then a note added to a track that isn't in the song
+        time = i * 13
+        expected = [note for track in song.tracks for note in track.notes
+                    if note.time <= time <= note.time + note.duration]
+        assert song.get_notes_at_time(time) == expected
+        generated.add_note(Note(pitch=60 + i % 12, time=time, duration=13))
+        # And notes added to the end of the tracks of the song
+        song.tracks[i % len(song.tracks)].add_note(Note(pitch=40 + i % 30, time=2 * time, duration=20))
+        expected = [note for track in song.tracks for note in track.notes
+                    if note.time <= 2 * time + 5 and note.time + note.duration >= 2 * time]
+        assert song.get_notes_in_range(2 * time, 2 * time + 5) == expected
+    assert song._get_note_index()[0] is index
+
+    # Other changes to the notes rebuild the index
+    song.tracks[0].notes[0].time = 5000
+    assert song.get_notes_at_time(5000)[0].pitch == song.tracks[0].notes[0].pitch
+    assert song._get_note_index()[0] is not index
+
 
 def test_equals():
     """
@@ -281,6 +399,24 @@ def test_equals():
     assert song9.equals(song1) is False
     assert song10.equals(song1) is False
 
+    # Songs can be deduplicated by fingerprint, and equals uses the fingerprints once they are known
+    songs = [song1, song2, song3, song4, song5, song6, song7, song8, song9, song10]
+    fingerprints = [song.get_fingerprint() for song in songs]
+    assert fingerprints[0] == fingerprints[1]
+    assert len(set(fingerprints)) == len(songs) - 1
+    assert song1.equals(song2)
+    assert song1.equals(song3) is False
+    # Editing a note after the fingerprints were taken makes the songs differ (song1 and song2 share their notes,
+    # so song2 gets its own copy of the note first)
+    song2.tracks[0].notes[0] = song2.tracks[0].notes[0].duplicate_note()
+    assert song1.get_fingerprint() == song2.get_fingerprint()
+    song2.tracks[0].notes[0].pitch += 1
+    assert song1.equals(song2) is False
+    assert song2.get_fingerprint() != fingerprints[1]
+    # The edit only touched song2, so the fingerprints cached for the tracks of song1 are still used
+    assert all(track._has_fingerprint() for track in song1.tracks)
+    assert song1.get_fingerprint() == fingerprints[0]
+
 
 def test_detect_key_by_phrase_endings():
     d_mix = Song()
@@ -300,6 +436,14 @@ def test_detect_key_by_phrase_endings():
 
     assert d_mix.detect_key_by_phrase_endings()[0].tonic == "D"
     assert d_mix.detect_key_by_phrase_endings()[0].mode == Mode.MIXOLYDIAN
+    # The diagnostic message is only built on request, with a block for every time interval tried
+    key, message, confidence = d_mix.detect_key_by_phrase_endings()
+    assert message == ""
+    key, message, report_confidence = d_mix.detect_key_by_phrase_endings(report=True)
+    assert report_confidence == confidence
+    blocks = message.strip().split("\n\n")
+    assert [block.split("\n")[-4] for block in blocks] == ["Time interval: " + str(20 * (i + 1))
+                                                           for i in range(len(blocks))]
 
     song2 = Song()
     tonic_not_in_scale = Track()
@@ -325,3 +469,63 @@ def test_detect_key_by_phrase_endings():
 
     assert song2.detect_key_by_phrase_endings()[0].tonic == "C"
     assert song2.detect_key_by_phrase_endings()[0].mode == Mode.MAJOR
+
+
+def test_detect_key_timeline():
+    song = Song()
+    track = Track()
+    # 64 beats of C major, then 64 beats of E major (one note per beat, 48 ticks per beat)
+    c_major = [60, 62, 64, 65, 67, 69, 71, 60]
+    e_major = [64, 66, 68, 69, 71, 73, 75, 64]
+    for beat in range(128):
+        scale = c_major if beat < 64 else e_major
+        track.notes.append(Note(pitch=scale[beat % len(scale)], time=beat * 48, duration=48))
+    song.tracks.append(track)
+
+    timeline = song.detect_key_timeline()
+    assert (timeline[0][2].tonic, timeline[0][2].mode) == ("C", Mode.MAJOR)
+    assert (timeline[-1][2].tonic, timeline[-1][2].mode) == ("E", Mode.MAJOR)
+    assert timeline[0][0] == 0
+    assert timeline[-1][1] == 128 * 48 - 1
+    # The segments follow each other, and the modulation is found near where it happens (windows that hold both
+    # scales may find a key in between)
+    assert all(timeline[i + 1][0] == timeline[i][1] + 1 for i in range(len(timeline) - 1))
+    assert abs(timeline[1][0] - 64 * 48) <= 8 * 48
+    assert abs(timeline[-1][0] - 64 * 48) <= 8 * 48
+    assert all(0 < confidence <= 1 for start, end, key, confidence in timeline)
+
+    assert Song().detect_key_timeline() == []
+    with pytest.raises(ValueError):
+        song.detect_key_timeline(hop=0)
+
+
+def test_detect_keys_and_scales():
+    """
+        Tests that detecting the keys of many songs at once gives the same
+        results as detecting the key of each song separately
+    """
+    filenames = ["test MIDI/C_major_scale.mid", "test MIDI/D_major_scale.mid", "test MIDI/C_major_chords.mid",
+                 "Resources/My-Name-Is.mid"]
+    songs = []
+    for filename in filenames:
+        song = Song()
+        song.load(filename=filename)
+        songs.append(song)
+
+    keys, errors, confidences = detect_keys_and_scales([song.get_c_indexed_note_frequencies() for song in songs])
+    assert len(keys) == len(songs)
+    for i, song in enumerate(songs):
+        key, minimum_errors, confidence = song.detect_key_and_scale()
+        assert keys[i].tonic == key.tonic
+        assert keys[i].mode == key.mode
+        assert errors[i] == minimum_errors
+        assert confidences[i] == pytest.approx(confidence)
+
+    assert keys[0].tonic == "C" and keys[0].mode == Mode.MAJOR
+    assert keys[1].tonic == "D" and keys[1].mode == Mode.MAJOR
+    assert errors[0] == 0
+
+    # A song with no notes has no errors and no confidence
+    keys, errors, confidences = detect_keys_and_scales([[0] * 12])
+    assert errors[0] == 0
+    assert confidences[0] == 0
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import FileIO as FileIO
+from Song import Song
+import SongCache as SongCache_module
+from SongCache import SongCache, ENTRY_EXTENSION
+
+
+def song_contents(song):
+    return (song.ticks_per_beat, song.key.tonic, song.key.mode,
+            [(track.track_name, track.device_name, track.channel, track.tag,
+              [(n.pitch, n.time, n.duration, n.velocity, n.channel, n.chord_note) for n in track.notes],
+              [(c.msg_type, c.tempo, c.control, c.value, c.instrument, c.time) for c in track.controls],
+              [(chord.name, chord.time, [note.pitch for note in chord.notes]) for chord in track.chords])
+             for track in song.tracks])
+
+
+def test_load_cached(tmp_path, monkeypatch):
+    cache = SongCache(directory=str(tmp_path))
+    expected = Song()
+    expected.load(filename="test MIDI/C_major_chords.mid")
+
+    cold = Song()
+    cold.load(filename="test MIDI/C_major_chords.mid", cache=cache)
+    assert len(os.listdir(str(tmp_path))) == 1
+
+    # A warm load doesn't read the MIDI file at all
+    def fail(*args, **kwargs):
+        raise AssertionError("read_midi_file should not be called")
+    monkeypatch.setattr(FileIO, "read_midi_file", fail)
+    warm = Song()
+    warm.load(filename="test MIDI/C_major_chords.mid", cache=cache)
+    columnar = Song()
+    columnar.load(filename="test MIDI/C_major_chords.mid", cache=cache, columnar=True)
+
+    assert song_contents(cold) == song_contents(warm) == song_contents(columnar) == song_contents(expected)
+    # Chords share their notes with the track
+    for track in warm.tracks:
+        for chord in track.chords:
+            assert all(any(note is n for n in track.notes) for note in chord.notes)
+
+
+def test_evict(tmp_path):
+    cache = SongCache(directory=str(tmp_path))
+    for filename in ["test MIDI/C_major_scale.mid", "test MIDI/C_major_chords.mid"]:
+        Song().load(filename=filename, cache=cache)
+    entries = [name for name in os.listdir(str(tmp_path)) if name.endswith(ENTRY_EXTENSION)]
+    assert len(entries) == 2
+
+    # Only the most recently used song fits
+    oldest, newest = entries
+    os.utime(os.path.join(str(tmp_path), oldest), (1000, 1000))
+    os.utime(os.path.join(str(tmp_path), newest), (2000, 2000))
+    cache.max_size = os.path.getsize(os.path.join(str(tmp_path), newest))
+    cache.evict()
+    assert os.listdir(str(tmp_path)) == [newest]
+
+    cache.clear()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_key_follows_analysis_code(tmp_path, monkeypatch):
+    cache = SongCache(directory=str(tmp_path))
+    key = cache.get_key("test MIDI/C_major_chords.mid")
+    assert key == cache.get_key("test MIDI/C_major_chords.mid")
+
+    # Songs cached before the code that analyzes them changed are parsed again
+    monkeypatch.setattr(SongCache_module, "_code_hash", "changed")
+    assert cache.get_key("test MIDI/C_major_chords.mid") != key
+
+
+def test_store_tracks_size(tmp_path, monkeypatch):
+    cache = SongCache(directory=str(tmp_path))
+    song = Song()
+    song.load(filename="test MIDI/C_major_chords.mid")
+    cache.store(song, "first")
+    entry_size = os.path.getsize(os.path.join(str(tmp_path), "first" + ENTRY_EXTENSION))
+    cache.max_size = int(entry_size * 3.5)
+
+    # The cache keeps count of its size, so storing songs doesn't scan the directory until it is full
+    scans = []
+    scan = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or scan())
+    cache.store(song, "second")
+    cache.store(song, "second")
+    cache.store(song, "third")
+    assert scans == []
+    assert cache._size == 3 * entry_size
+
+    # Going over max_size evicts the least recently used songs, down to EVICTION_TARGET of max_size
+    os.utime(os.path.join(str(tmp_path), "first" + ENTRY_EXTENSION), (1000, 1000))
+    os.utime(os.path.join(str(tmp_path), "second" + ENTRY_EXTENSION), (2000, 2000))
+    cache.store(song, "fourth")
+    assert scans == [1]
+    assert sorted(os.listdir(str(tmp_path))) == [name + ENTRY_EXTENSION for name in ("fourth", "second", "third")]
+    assert cache._size == 3 * entry_size
+
+
+def test_import_alone():
+    # SongCache (and the modules it imports) can be imported before anything else
+    for module in ("SongCache", "Chord"):
+        subprocess.run([sys.executable, "-c", "import " + module], check=True,
+                       env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
@@ -50,6 +50,14 @@ def test_track():
     track.generate_tags()
     assert track.tag == TagEnum.MELODY
 
+    # A detected tag follows the notes of the track
+    tagged = Track(notes=[Note(pitch=70, time=0, duration=10)])
+    assert tagged.tag == TagEnum.NONE
+    tagged.use_detected_tag()
+    assert tagged.tag == TagEnum.MELODY
+    tagged.notes[0].pitch = 30
+    assert tagged.tag == TagEnum.BASS
+
     track_actual_append_1 = track.append_track(track=track2)
 
     assert track_actual_append_1.equals(track_expected)
@@ -66,6 +74,73 @@ def test_track():
     assert track.equals(track2) is False
 
 
+def test_track_aggregates():
+    track = Track(notes=[Note(pitch=60, time=0, duration=100)],
+                  controls=[Control(msg_type='control_change', control=3, value=10, time=50)])
+    assert track.get_c_indexed_note_frequencies() == [1] + [0] * 11
+    assert track.get_end_time() == 100
+
+    # Notes added with add_note update the totals
+    track.add_note(Note(pitch=64, time=100, duration=200))
+    assert track.get_c_indexed_note_frequencies() == [1, 0, 0, 0, 1] + [0] * 7
+    assert track.get_end_time() == 300
+
+    # Other changes make the track take its totals again
+    track.notes.append(Note(pitch=67, time=300, duration=100))
+    track.controls.append(Control(msg_type='control_change', control=3, value=10, time=1000))
+    assert track.get_c_indexed_note_frequencies() == [1, 0, 0, 0, 1, 0, 0, 1] + [0] * 4
+    assert track.get_end_time() == 1000
+    # Including edits of single notes, and of the list of notes, that keep the number of notes the same
+    track.notes[0].pitch = 30
+    assert track.get_c_indexed_note_frequencies() == [0, 0, 0, 0, 1, 0, 1, 1] + [0] * 4
+    assert track.detect_tag() == TagEnum.MELODY
+    track.notes[0] = Note(pitch=61, time=0, duration=100)
+    assert track.get_c_indexed_note_frequencies() == [0, 1, 0, 0, 1, 0, 0, 1] + [0] * 4
+    track.notes.pop()
+    track.notes.append(Note(pitch=62, time=300, duration=2000))
+    assert track.get_c_indexed_note_frequencies() == [0, 1, 1, 0, 1] + [0] * 7
+    assert track.get_end_time() == 2300
+    track.controls[-1].time = 5000
+    assert track.get_end_time() == 5000
+
+    columnar = Track(notes=[note.duplicate_note() for note in track.notes], controls=track.controls, columnar=True)
+    assert columnar.get_c_indexed_note_frequencies() == track.get_c_indexed_note_frequencies()
+    assert columnar.get_end_time() == track.get_end_time()
+    columnar.notes[0].pitch = 60
+    assert columnar.get_c_indexed_note_frequencies() == [1, 0, 1, 0, 1] + [0] * 7
+
+
+def test_track_versions_are_separate():
+    track_a = Track(notes=[Note(pitch=60, time=0, duration=100)])
+    track_b = Track(notes=[Note(pitch=64, time=0, duration=100)], columnar=True)
+    track_a.use_detected_tag()
+    track_b.use_detected_tag()
+    assert track_b.get_c_indexed_note_frequencies() == [0, 0, 0, 0, 1] + [0] * 7
+    assert track_b.tag == TagEnum.MELODY
+    version_b = track_b.get_version()
+    aggregates_b = track_b._aggregates
+
+    # Edits of track A don't touch the version of track B, so its cached results stay valid
+    track_a.notes[0].pitch = 30
+    track_a.notes.append(Note(pitch=31, time=100, duration=100))
+    track_a.controls.append(Control(msg_type='control_change', control=3, value=10, time=100))
+    assert track_a.tag == TagEnum.BASS
+    assert track_b.get_version() == version_b
+    assert track_b._aggregates is aggregates_b
+    assert track_b._tag_version == (version_b, track_b.channel)
+
+    # A note held by two tracks changes both of them, but a columnar track holds its own copy
+    shared = Note(pitch=67, time=200, duration=100)
+    track_c = Track(notes=[shared])
+    track_a.notes.append(shared)
+    track_b.notes.append(shared)
+    versions = track_a.get_version(), track_b.get_version(), track_c.get_version()
+    shared.velocity = 50
+    assert track_a.get_version() != versions[0]
+    assert track_b.get_version() == versions[1]
+    assert track_c.get_version() != versions[2]
+
+
 def test_track_equals():
     notes_1 = [Note(pitch=60, time=100, duration=100, velocity=100, channel=0, chord_note=False),
                Note(pitch=61, time=200, duration=100, velocity=100, channel=0, chord_note=False),]
@@ -90,3 +165,45 @@ def test_track_equals():
     assert track1.equals(track2) is False
     assert track1.equals(track3) is False
     assert track3.equals(track4) is False
+
+    # Tracks on different channels are not equal (and logging the difference doesn't fail on int channels)
+    assert track1.equals(Track(notes=notes_1, controls=controls_1, channel=1)) is False
+
+
+def test_track_fingerprint():
+    notes = [Note(pitch=60, time=100, duration=100, velocity=100), Note(pitch=61, time=200, duration=100)]
+    track = Track(notes=[note.duplicate_note() for note in notes], track_name="melody")
+    same = Track(notes=[note.duplicate_note() for note in notes], track_name="melody", columnar=True)
+    assert track.get_fingerprint() == same.get_fingerprint()
+    assert track.equals(same)
+
+    # The fingerprint follows changes to the track
+    same.notes[1].velocity = 90
+    assert track.get_fingerprint() != same.get_fingerprint()
+    assert track.equals(same) is False
+    same.notes[1].velocity = track.notes[1].velocity
+    assert track.equals(same)
+    # Fingerprints taken before an edit are never used to call the tracks equal
+    same.notes[0].pitch += 1
+    assert track.equals(same) is False
+    same.notes[0].pitch -= 1
+    same.track_name = "bass"
+    assert track.get_fingerprint() != same.get_fingerprint()
+    same.track_name = "melody"
+    assert track.get_fingerprint() == same.get_fingerprint()
+    same.controls.append(Control(msg_type='control_change', control=3, value=10, time=100))
+    assert track.get_fingerprint() != same.get_fingerprint()
+    track.controls.append(Control(msg_type='control_change', control=3, value=10, time=100))
+    assert track.get_fingerprint() == same.get_fingerprint()
+    same.controls[0].value = 11
+    assert track.equals(same) is False
+
+    # A cached fingerprint stays valid while only other tracks are edited
+    fingerprint = track.get_fingerprint()
+    same.notes[0].pitch = 70
+    same.notes.append(Note(pitch=72, time=300, duration=100))
+    same.controls[0].value = 12
+    other = Track(notes=[Note(pitch=60, time=100, duration=100)])
+    other.notes[0].duration = 50
+    assert track._has_fingerprint()
+    assert track.get_fingerprint() == fingerprint